@@ -0,0 +1 @@
+"""Banco de pruebas de rendimiento de H‑ANCHOR, ejecutable sin API Key."""
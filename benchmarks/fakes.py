@@ -0,0 +1,170 @@
+"""
+Sustitutos locales y deterministas de los servicios de OpenAI.
+
+Permiten medir el rendimiento del pipeline sin red ni API Key: los
+embeddings se derivan de un hashing de palabras (textos parecidos dan
+vectores parecidos) y el chat devuelve sub‑preguntas JSON o veredictos
+fijos, con una latencia simulada configurable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from cd_modules.core.lexical_index import tokenize
+
+
+class FakeEmbeddings:
+    """Embeddings deterministas por *feature hashing* de los tokens."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0) -> None:
+        """
+        :param dim: Dimensión de los vectores.
+        :param latency: Segundos simulados por petición (no por texto).
+        """
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        for token in tokenize(text) or [text]:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+_PARENT_RE = re.compile(r'Desglosar la pregunta "(.*?)" en (\d+)', re.DOTALL)
+
+# Piezas de las sub‑preguntas simuladas. Se combinan de forma determinista
+# a partir de la pregunta padre, así que las hermanas difieren en varias
+# palabras y no se fusionan por similitud salvo coincidencia real.
+_PLANTILLAS = [
+    "¿Qué establece la norma sobre {aspecto} de {sujeto}?",
+    "¿Cómo regula la norma {aspecto} de {sujeto}?",
+    "¿Cuándo resultan exigibles {aspecto} para {sujeto}?",
+    "¿Quién supervisa {aspecto} de {sujeto}?",
+]
+_ASPECTOS = [
+    "las obligaciones de transparencia", "los plazos de adaptación",
+    "las sanciones económicas", "las excepciones previstas",
+    "los requisitos de documentación técnica", "las evaluaciones de conformidad",
+    "los deberes de registro", "las garantías de supervisión humana",
+    "las medidas de ciberseguridad", "los derechos de reclamación",
+]
+_SUJETOS = [
+    "los proveedores", "los importadores", "los distribuidores",
+    "los responsables del despliegue", "los organismos notificados",
+    "las autoridades nacionales", "los usuarios finales", "las pymes",
+]
+
+
+def _sub_question(parent: str, index: int) -> str:
+    """Sub‑pregunta ``index`` de ``parent``, siempre la misma para ambos."""
+    digest = hashlib.blake2b(f"{parent}\x00{index}".encode("utf-8"), digest_size=8).digest()
+    plantilla = _PLANTILLAS[(digest[0] + index) % len(_PLANTILLAS)]
+    aspecto = _ASPECTOS[(digest[1] + index) % len(_ASPECTOS)]
+    sujeto = _SUJETOS[digest[2] % len(_SUJETOS)]
+    return plantilla.format(aspecto=aspecto, sujeto=sujeto)
+
+
+class FakeRateLimitError(Exception):
+    """Equivalente local de ``openai.RateLimitError`` (HTTP 429)."""
+
+    status_code = 429
+
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeChatClient") -> None:
+        self._owner = owner
+
+    def create(self, model: str, messages: list[dict], **kwargs):
+        return self._owner._complete(model, messages, **kwargs)
+
+
+class FakeChatClient:
+    """
+    Cliente compatible con ``OpenAI().chat.completions.create``.
+
+    - Con ``response_format`` JSON responde ``{"questions": [...]}`` con
+      tantas sub‑preguntas como pida el prompt, derivadas de la pregunta
+      padre y redactadas de forma distinta entre sí.
+    - En otro caso responde ``verdict`` (``"VALIDADA"`` por defecto).
+    - Con ``requests_per_second`` se comporta como un servidor con cuota:
+      las peticiones que la superan fallan con ``FakeRateLimitError``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        verdict: str = "VALIDADA",
+        requests_per_second: float | None = None,
+    ) -> None:
+        """
+        :param latency: Segundos simulados por llamada.
+        :param verdict: Respuesta fija para los prompts del juez.
+        :param requests_per_second: Cuota del servidor simulado, con ráfagas
+            de un segundo; ``None`` no limita.
+        """
+        self.latency = latency
+        self.verdict = verdict
+        self.requests_per_second = requests_per_second
+        self.calls = 0
+        self.rejected = 0
+        self._allowance = requests_per_second or 0.0
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def _complete(self, model: str, messages: list[dict], **kwargs):
+        with self._lock:
+            if self.requests_per_second:
+                now = time.monotonic()
+                self._allowance = min(
+                    self.requests_per_second,
+                    self._allowance + (now - self._checked) * self.requests_per_second,
+                )
+                self._checked = now
+                if self._allowance < 1:
+                    self.rejected += 1
+                    raise FakeRateLimitError("Rate limit reached for requests")
+                self._allowance -= 1
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        if kwargs.get("response_format", {}).get("type") == "json_object":
+            match = _PARENT_RE.search(prompt)
+            parent = match.group(1) if match else "pregunta"
+            width = int(match.group(2)) if match else 2
+            questions = [_sub_question(parent, i) for i in range(width)]
+            content = json.dumps({"questions": questions}, ensure_ascii=False)
+        else:
+            content = self.verdict
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4
+            ),
+        )
@@ -0,0 +1,105 @@
+"""
+Perfil del tiempo de importación en frío.
+
+Lanza un intérprete limpio con ``python -X importtime``, importa los
+módulos indicados y agrega el coste acumulado por paquete de primer nivel,
+de modo que se vea qué dependencias consumen el presupuesto de arranque::
+
+    python -m benchmarks.import_profile --budget-ms 1500
+    python -m benchmarks.import_profile cd_modules.core.raga_engine --top 15
+
+Con ``--budget-ms`` el proceso termina con código 1 si el total lo supera.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+
+DEFAULT_TARGETS = [
+    "cd_modules.core",
+    "cd_modules.core.raga_engine",
+    "cd_modules.core.inquiry_engine",
+    "cd_modules.core.validador_epistemico",
+    "cd_modules.core.audit_stage",
+]
+
+
+def measure(targets: list[str]) -> list[dict]:
+    """
+    Importa ``targets`` en un proceso nuevo y devuelve cada módulo cargado.
+
+    :param targets: Módulos a importar, en orden.
+    :return: Lista ``{"module", "self_us", "cumulative_us", "depth"}``.
+    """
+    code = "; ".join(f"import {target}" for target in targets)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        # Formato: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            # La indentación del nombre indica la profundidad de la importación
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return modules
+
+
+def summarize(modules: list[dict], top: int = 20) -> dict:
+    """
+    Agrega el coste propio de cada módulo por paquete de primer nivel.
+
+    :param modules: Resultado de ``measure``.
+    :param top: Número de paquetes a devolver, de mayor a menor coste.
+    :return: Total en ms y desglose por paquete.
+    """
+    by_package: dict[str, int] = {}
+    for module in modules:
+        package = module["module"].split(".")[0]
+        by_package[package] = by_package.get(package, 0) + module["self_us"]
+    ranking = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "total_ms": round(sum(by_package.values()) / 1000, 1),
+        "modules": len(modules),
+        "packages": [
+            {"package": package, "ms": round(us / 1000, 1)} for package, us in ranking[:top]
+        ],
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Perfil de importación en frío de H‑ANCHOR.")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    report = summarize(measure(args.targets), top=args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for row in report["packages"]:
+            print(f"{row['ms']:>9.1f} ms  {row['package']}")
+        print(f"⏱️ Total: {report['total_ms']} ms en {report['modules']} módulos")
+
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"❌ Se supera el presupuesto de {args.budget_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
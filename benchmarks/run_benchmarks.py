@@ -0,0 +1,329 @@
+"""
+Banco de pruebas offline de H‑ANCHOR.
+
+Mide, con sustitutos locales de OpenAI y un corpus sintético:
+
+- rendimiento de ingesta (páginas/s y fragmentos/s) por backend y troceador;
+- latencia p50/p99 de ``retrieve`` (y de ``retrieve_paths``) según el tamaño del corpus y el modo;
+- tiempo de ``InquiryEngine`` según profundidad y anchura;
+- llamadas con éxito, rechazos y reintentos contra un servidor con cuota,
+  con y sin ``LLMScheduler``.
+
+El resultado es un JSON estable que se puede comparar entre commits::
+
+    python -m benchmarks.run_benchmarks --output bench_report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeChatClient, FakeEmbeddings
+from benchmarks.synthetic_corpus import make_corpus
+from cd_modules.core.inquiry_engine import InquiryEngine
+from cd_modules.core.llm_scheduler import LLMScheduler
+from cd_modules.core.raga_engine import RAGAEngine
+
+# Los sustitutos locales no tienen cuota: sin límites, medimos el pipeline
+UNLIMITED = LLMScheduler(limits={})
+
+QUERIES = [
+    "¿Qué obligaciones tienen los proveedores de sistemas de IA?",
+    "supervisión humana de los sistemas de alto riesgo",
+    "¿Qué dice el Artículo 5?",
+    "sistemas de categorización biométrica",
+    "calidad de los conjuntos de datos de entrenamiento",
+    "Anexo III",
+    "trazabilidad de los registros generados automáticamente",
+    "protección de los derechos de propiedad intelectual",
+]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _engine(workdir: str, backend: str, embeddings: FakeEmbeddings) -> RAGAEngine:
+    return RAGAEngine(
+        persist_directory=os.path.join(workdir, f"index_{backend}"),
+        embedding_cache_path=os.path.join(workdir, f"emb_{backend}.sqlite"),
+        text_cache_path=None,  # extracción siempre en frío
+        backend=backend,
+        embeddings=embeddings,
+        scheduler=UNLIMITED,
+    )
+
+
+def bench_ingest(
+    workdir: str,
+    pdf_path: str,
+    pages: int,
+    backend: str,
+    latency: float,
+    chunker: str = "recursive",
+    extract_workers: int | None = None,
+) -> tuple[dict, RAGAEngine]:
+    """Ingesta en frío (sin caché de embeddings) de un PDF sintético."""
+    embeddings = FakeEmbeddings(latency=latency)
+    engine = _engine(workdir, backend, embeddings)
+    start = time.perf_counter()
+    engine.ingest_document(pdf_path, chunker=chunker, extract_workers=extract_workers)
+    elapsed = time.perf_counter() - start
+    stats = engine.ingest_stats
+    chunks = stats.get("chunks", 0)
+    return {
+        "backend": backend,
+        "chunker": chunker,
+        "extract_workers": extract_workers,
+        "pages": pages,
+        "chunks": chunks,
+        "chars": stats.get("chars"),
+        "extract_s": stats.get("extract_s"),
+        "chunk_s": stats.get("chunk_s"),
+        "seconds": round(elapsed, 4),
+        "pages_per_s": round(pages / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 2),
+        "embedding_requests": embeddings.calls,
+    }, engine
+
+
+def bench_retrieve(engine: RAGAEngine, pages: int, mode: str, repeats: int) -> dict:
+    """
+    Latencia de ``retrieve`` sin caché (cada consulta es distinta). El modo
+    ``"paths"`` mide ``retrieve_paths`` (PathRAG).
+    """
+    latencies = []
+    for i in range(repeats):
+        query = f"{QUERIES[i % len(QUERIES)]} ({i})"
+        start = time.perf_counter()
+        if mode == "paths":
+            engine.retrieve_paths(query, k=3)
+        else:
+            engine.retrieve(query, k=3, mode=mode)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "backend": engine.backend,
+        "mode": mode,
+        "pages": pages,
+        "chunks": engine.ingest_stats.get("chunks", 0),
+        "queries": repeats,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def bench_inquiry(engine: RAGAEngine, depth: int, width: int, latency: float) -> list[dict]:
+    """
+    Tiempo de generación del árbol, secuencial y concurrente, con la forma
+    completa ``depth`` × ``width``. La variante ``merge_0.92`` mide aparte
+    la fusión por similitud (DAG) sobre la expansión concurrente.
+    """
+    results = []
+    variants = (
+        ("generate", "generate", None),
+        ("generate_concurrent", "generate_concurrent", None),
+        ("merge_0.92", "generate_concurrent", 0.92),
+    )
+    for variant, method, similarity_threshold in variants:
+        client = FakeChatClient(latency=latency)
+        inquiry = InquiryEngine(
+            "¿Qué obligaciones impone la norma a los proveedores?",
+            max_depth=depth,
+            max_width=width,
+            raga_engine=engine,
+            client=client,
+            cache_path=None,  # sin memoización: medimos el coste real
+            similarity_threshold=similarity_threshold,
+            scheduler=UNLIMITED,
+        )
+        start = time.perf_counter()
+        getattr(inquiry, method)()
+        results.append({
+            "variant": variant,
+            "depth": depth,
+            "width": width,
+            "llm_calls": client.calls,
+            "nodes": inquiry.stats["nodes"],
+            "merged": inquiry.stats["merged"],
+            "pruned": inquiry.stats["pruned"],
+            "llm_calls_saved": inquiry.stats["llm_calls_saved"],
+            "seconds": round(time.perf_counter() - start, 4),
+        })
+    return results
+
+
+def bench_scheduler(calls: int, requests_per_second: float, latency: float) -> list[dict]:
+    """
+    Lanza ``calls`` peticiones distintas, 16 a la vez, contra un servidor
+    simulado con cuota: directamente (las que la superan fallan) y a través
+    de un ``LLMScheduler`` con los mismos límites.
+    """
+    results = []
+    for variant in ("direct", "scheduler"):
+        client = FakeChatClient(latency=latency, requests_per_second=requests_per_second)
+        scheduler = LLMScheduler(
+            limits={"chat": (requests_per_second * 60, 10**9)},
+            max_concurrency=16,
+            base_delay=0.05,
+            burst=1.0,
+        )
+
+        def request(i: int) -> bool:
+            kwargs = {"model": "gpt-4o", "messages": [{"role": "user", "content": f"Pregunta {i}"}]}
+            try:
+                if variant == "scheduler":
+                    scheduler.chat(client, priority="batch", **kwargs)
+                else:
+                    client.chat.completions.create(**kwargs)
+                return True
+            except Exception:
+                return False
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            succeeded = sum(pool.map(request, range(calls)))
+        elapsed = time.perf_counter() - start
+        results.append({
+            "variant": variant,
+            "calls": calls,
+            "requests_per_second": requests_per_second,
+            "succeeded": succeeded,
+            "rejected_by_server": client.rejected,
+            "retried": scheduler.stats()["retried"],
+            "seconds": round(elapsed, 4),
+            "throughput_per_s": round(succeeded / elapsed, 2),
+        })
+    return results
+
+
+def run(
+    sizes: list[int],
+    backends: list[str],
+    chunkers: list[str],
+    extract_workers: int | None,
+    modes: list[str],
+    shapes: list[tuple[int, int]],
+    embed_latency: float,
+    chat_latency: float,
+    repeats: int,
+    scheduler_calls: int = 200,
+    scheduler_rps: float = 50.0,
+) -> dict:
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "embed_latency_ms": embed_latency * 1000,
+            "chat_latency_ms": chat_latency * 1000,
+            "extract_workers": extract_workers,
+        },
+        "ingest": [],
+        "retrieve": [],
+        "inquiry": [],
+        "scheduler": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        largest_engine = None
+        for pages in sizes:
+            pdf_path = make_corpus(os.path.join(workdir, f"corpus_{pages}.pdf"), pages)
+            for backend in backends:
+                engines = []
+                for chunker in chunkers:
+                    size_dir = os.path.join(workdir, f"{backend}_{pages}_{chunker}")
+                    os.makedirs(size_dir)
+                    result, engine = bench_ingest(
+                        size_dir, pdf_path, pages, backend, embed_latency,
+                        chunker=chunker, extract_workers=extract_workers,
+                    )
+                    report["ingest"].append(result)
+                    engines.append(engine)
+                    print(
+                        f"📥 ingest {backend}/{chunker} {pages}p: {result['pages_per_s']} páginas/s, "
+                        f"{result['chunks']} fragmentos"
+                    )
+                # La latencia de recuperación se mide sobre el primer troceador
+                engine = engines[0]
+                for mode in modes:
+                    result = bench_retrieve(engine, pages, mode, repeats)
+                    report["retrieve"].append(result)
+                    print(f"🔎 retrieve {backend}/{mode} {pages}p: p50 {result['p50_ms']} ms")
+                largest_engine = engine
+
+        for depth, width in shapes:
+            for result in bench_inquiry(largest_engine, depth, width, chat_latency):
+                report["inquiry"].append(result)
+                print(f"🌳 {result['variant']} d={depth} w={width}: {result['seconds']} s")
+
+    if scheduler_calls:
+        for result in bench_scheduler(scheduler_calls, scheduler_rps, chat_latency):
+            report["scheduler"].append(result)
+            print(
+                f"🚦 {result['variant']}: {result['succeeded']}/{result['calls']} con éxito, "
+                f"{result['rejected_by_server']} rechazos 429, {result['throughput_per_s']} llamadas/s"
+            )
+    return report
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks offline de H‑ANCHOR.")
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--sizes", type=_int_list, default=[10, 50, 200], help="Páginas por corpus")
+    parser.add_argument("--backends", default="numpy,chroma")
+    parser.add_argument("--chunkers", default="recursive,legal")
+    parser.add_argument("--extract-workers", type=int, default=None,
+                        help="Procesos de extracción; por defecto PyPDFLoader")
+    parser.add_argument("--modes", default="vector,lexical,hybrid,paths")
+    parser.add_argument("--shapes", default="1x2,2x2,3x2", help="profundidad x anchura")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=50.0)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--scheduler-calls", type=int, default=200,
+                        help="Llamadas contra el servidor con cuota; 0 omite la prueba")
+    parser.add_argument("--scheduler-rps", type=float, default=50.0,
+                        help="Cuota del servidor simulado (peticiones/s)")
+    args = parser.parse_args(argv)
+
+    report = run(
+        sizes=args.sizes,
+        backends=[b for b in args.backends.split(",") if b],
+        chunkers=[c for c in args.chunkers.split(",") if c],
+        extract_workers=args.extract_workers,
+        modes=[m for m in args.modes.split(",") if m],
+        shapes=[tuple(int(x) for x in s.split("x")) for s in args.shapes.split(",") if s],
+        embed_latency=args.embed_latency_ms / 1000,
+        chat_latency=args.chat_latency_ms / 1000,
+        repeats=args.repeats,
+        scheduler_calls=args.scheduler_calls,
+        scheduler_rps=args.scheduler_rps,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"📊 Informe guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
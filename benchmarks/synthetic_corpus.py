@@ -0,0 +1,146 @@
+"""
+Generador de PDFs jurídicos sintéticos en español.
+
+Produce normas ficticias con estructura de Títulos, Capítulos, Artículos
+y Anexos, de tamaño configurable y reproducibles a partir de una semilla.
+El PDF se escribe a mano (Helvetica, WinAnsiEncoding) para no añadir
+dependencias.
+"""
+
+from __future__ import annotations
+
+import random
+import textwrap
+
+_SUJETOS = [
+    "los proveedores de sistemas de IA",
+    "los responsables del despliegue",
+    "las autoridades nacionales competentes",
+    "los importadores y distribuidores",
+    "la Oficina de IA",
+    "los organismos notificados",
+]
+_VERBOS = [
+    "deberán garantizar",
+    "velarán por",
+    "documentarán",
+    "notificarán sin demora",
+    "evaluarán periódicamente",
+    "no podrán comercializar",
+]
+_OBJETOS = [
+    "la supervisión humana de los sistemas de alto riesgo",
+    "la transparencia frente a las personas afectadas",
+    "la gestión de riesgos durante todo el ciclo de vida",
+    "la calidad de los conjuntos de datos de entrenamiento",
+    "los sistemas de categorización biométrica",
+    "la trazabilidad de los registros generados automáticamente",
+    "la protección de los derechos de propiedad intelectual",
+    "la ciberseguridad y la solidez técnica",
+]
+_CONDICIONES = [
+    "de conformidad con el artículo {ref}",
+    "sin perjuicio de lo dispuesto en el artículo {ref} apartado 2",
+    "en los términos previstos en el Anexo {anexo}",
+    "cuando así lo exija la normativa sectorial aplicable",
+    "con arreglo a los actos de ejecución adoptados por la Comisión",
+]
+_ROMANOS = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+
+
+def generate_articles(pages: int, seed: int = 0) -> list[str]:
+    """
+    Genera el texto de una norma sintética, una cadena por página.
+
+    :param pages: Número de páginas deseado.
+    :param seed: Semilla para que el corpus sea reproducible.
+    :return: Lista con las líneas de texto de cada página (unidas por ``\\n``).
+    """
+    rng = random.Random(seed)
+    lines: list[str] = []
+    article = 0
+    titulo = 0
+    # ~60 líneas por página, ~8 líneas por artículo
+    target_lines = pages * 60
+    while len(lines) < target_lines:
+        if article % 20 == 0:
+            titulo += 1
+            lines += ["", f"TÍTULO {_ROMANOS[(titulo - 1) % 10]}", "Disposiciones generales"]
+        if article % 5 == 0:
+            lines += ["", f"CAPÍTULO {article // 5 + 1}"]
+        article += 1
+        lines += ["", f"Artículo {article}", f"Obligaciones relativas a {rng.choice(_OBJETOS)}"]
+        for apartado in range(1, rng.randint(2, 4) + 1):
+            condicion = rng.choice(_CONDICIONES).format(
+                ref=rng.randint(1, max(1, article)),
+                anexo=rng.choice(_ROMANOS[:4]),
+            )
+            sentence = (
+                f"{apartado}. {rng.choice(_SUJETOS).capitalize()} {rng.choice(_VERBOS)} "
+                f"{rng.choice(_OBJETOS)}, {condicion}."
+            )
+            lines += textwrap.wrap(sentence, width=95)
+    for numero in _ROMANOS[:4]:
+        lines += ["", f"ANEXO {numero}", f"Lista de {rng.choice(_OBJETOS)}."]
+
+    return ["\n".join(lines[i:i + 60]) for i in range(0, len(lines), 60)][:pages] or [""]
+
+
+def _escape(line: str) -> bytes:
+    text = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return text.encode("cp1252", errors="replace")
+
+
+def write_pdf(path: str, pages: list[str]) -> None:
+    """
+    Escribe un PDF mínimo con una página por elemento de ``pages``.
+
+    :param path: Ruta de salida.
+    :param pages: Texto de cada página; cada ``\\n`` es un salto de línea.
+    """
+    objects: list[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font_id = add(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    )
+    pages_id = add(b"")  # se rellena al final
+    page_ids = []
+    for page in pages:
+        stream = b"BT /F1 9 Tf 11 TL 40 800 Td\n"
+        for line in page.split("\n"):
+            stream += b"(" + _escape(line) + b") '\n"
+        stream += b"ET"
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(path: str, pages: int, seed: int = 0) -> str:
+    """Genera y escribe un PDF sintético de ``pages`` páginas. Devuelve ``path``."""
+    write_pdf(path, generate_articles(pages, seed))
+    return path
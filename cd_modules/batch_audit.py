@@ -0,0 +1,275 @@
+"""
+Ejecutor por lotes de auditorías H‑ANCHOR, sin interfaz Streamlit.
+
+Lee temas de un fichero JSONL o CSV, los audita en un pool de procesos
+contra un índice ya ingerido y escribe un resultado por tema (JSONL o CSV)
+en cuanto termina. Los temas completados se anotan en un fichero de
+control, de modo que relanzar el mismo comando tras una caída continúa
+donde se quedó.
+
+Uso::
+
+    python -m cd_modules.batch_audit temas.jsonl resultados.jsonl --workers 4
+
+Cada línea JSONL (o fila CSV) necesita ``topic`` y admite ``id``,
+``depth`` y ``width``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+from cd_modules.core.audit_stage import run_audit
+from cd_modules.core.disk_cache import hash_key
+
+CSV_COLUMNS = ["id", "topic", "depth", "width", "questions", "validated", "eee", "seconds"]
+
+# Estado por proceso trabajador (se rellena en ``_init_worker``)
+_worker: dict = {}
+
+
+def read_topics(path: str, depth: int, width: int) -> Iterator[dict]:
+    """
+    Lee los temas a auditar desde JSONL o CSV.
+
+    :param path: Fichero de entrada (``.jsonl`` o ``.csv``).
+    :param depth: Profundidad por defecto si la fila no la indica.
+    :param width: Anchura por defecto si la fila no la indica.
+    :return: Iterador de tareas ``{"id", "topic", "depth", "width"}``.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            topic = (record.get("topic") or "").strip()
+            if not topic:
+                continue
+            task_depth = int(record.get("depth") or depth)
+            task_width = int(record.get("width") or width)
+            yield {
+                # Sin id explícito, el propio tema y sus parámetros lo identifican
+                "id": str(record.get("id") or hash_key(topic, task_depth, task_width)[:16]),
+                "topic": topic,
+                "depth": task_depth,
+                "width": task_width,
+            }
+
+
+def read_checkpoint(path: str) -> set[str]:
+    """Devuelve los ids de los temas ya completados."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _init_worker(
+    persist_directory: str,
+    backend: str,
+    retrieval_mode: str,
+    documents: list[str] | None = None,
+    ledger_path: str | None = None,
+    workers: int = 1,
+) -> None:
+    """
+    Abre una sola vez, por proceso, el índice (solo lectura), el juez y el
+    registro. La cuota de OpenAI se reparte a partes iguales entre los
+    ``workers`` procesos y sus llamadas van con prioridad de lote.
+    """
+    from cd_modules.core.llm_scheduler import DEFAULT_LIMITS, configure_shared_scheduler
+    from cd_modules.core.raga_engine import RAGAEngine
+    from cd_modules.core.validador_epistemico import EroteticEvaluator
+
+    configure_shared_scheduler(limits={
+        resource: (rpm / workers, tpm / workers)
+        for resource, (rpm, tpm) in DEFAULT_LIMITS.items()
+    })
+    _worker["raga"] = RAGAEngine(
+        persist_directory=persist_directory,
+        backend=backend,
+        retrieval_mode=retrieval_mode,
+        read_only=True,
+        documents=documents,
+        priority="batch",
+    )
+    _worker["evaluator"] = EroteticEvaluator(priority="batch")
+    if ledger_path:
+        from cd_modules.core.audit_ledger import AuditLedger
+
+        _worker["ledger"] = AuditLedger(ledger_path)
+
+
+def audit_topic(task: dict) -> dict:
+    """
+    Audita un tema completo dentro de un proceso trabajador.
+
+    :param task: Tarea devuelta por ``read_topics``.
+    :return: Resultado serializable con el árbol, los veredictos y el EEE.
+    """
+    from cd_modules.core.inquiry_engine import InquiryEngine
+    from cd_modules.core.reasoning_tracker import ReasoningTracker
+
+    started = time.perf_counter()
+    tracker = ReasoningTracker()
+    _worker["raga"].tracker = tracker
+    _worker["evaluator"].tracker = tracker
+    engine = InquiryEngine(
+        task["topic"],
+        max_depth=task["depth"],
+        max_width=task["width"],
+        raga_engine=_worker["raga"],
+        tracker=tracker,
+        priority="batch",
+    )
+    tree = engine.generate_concurrent()
+    audit = run_audit(
+        tree, _worker["raga"], _worker["evaluator"],
+        ledger=_worker.get("ledger"), audit_id=task["id"],
+    )
+    return {
+        **task,
+        "questions": len(audit.rows),
+        "validated": sum(1 for row in audit.rows if row.status == "VALIDADA"),
+        "unaudited": audit.unaudited,
+        "eee": round(audit.eee, 2),
+        "seconds": round(time.perf_counter() - started, 3),
+        "tree": tree,
+        "rows": audit.to_records(),
+        "profile": tracker.profile(),
+    }
+
+
+def _write_result(out, result: dict, as_csv: bool) -> None:
+    if as_csv:
+        csv.DictWriter(out, fieldnames=CSV_COLUMNS, extrasaction="ignore").writerow(result)
+    else:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    persist_directory: str = "./chroma_db",
+    backend: str = "chroma",
+    retrieval_mode: str = "vector",
+    workers: int = 4,
+    depth: int = 2,
+    width: int = 2,
+    checkpoint_path: str | None = None,
+    documents: list[str] | None = None,
+    ledger_path: str | None = None,
+) -> dict:
+    """
+    Audita todos los temas de ``input_path`` en un pool de procesos.
+
+    Los resultados se escriben (en streaming) al final de ``output_path`` y
+    cada tema terminado se registra en ``checkpoint_path``; los temas ya
+    registrados se omiten al relanzar.
+
+    :param documents: Documentos del corpus a consultar; ``None`` usa todos.
+    :param ledger_path: ``AuditLedger`` (SQLite) donde cada trabajador anexa
+        los veredictos de cada tema, con el id del tema como auditoría.
+    :return: Resumen con temas completados, omitidos y fallidos.
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.done"
+    done = read_checkpoint(checkpoint_path)
+    tasks = []
+    skipped = 0  # Solo los temas de esta entrada ya completados
+    for task in read_topics(input_path, depth, width):
+        if task["id"] in done:
+            skipped += 1
+        else:
+            tasks.append(task)
+    summary = {"completed": 0, "skipped": skipped, "failed": 0}
+    if not tasks:
+        print("✅ No hay temas pendientes.")
+        return summary
+
+    as_csv = output_path.endswith(".csv")
+    write_header = as_csv and not os.path.exists(output_path)
+    print(f"📋 {len(tasks)} temas pendientes ({skipped} ya completados).")
+
+    with open(output_path, "a", encoding="utf-8", newline="") as out, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ProcessPoolExecutor(
+                max_workers=max(1, workers),
+                initializer=_init_worker,
+                initargs=(
+                    persist_directory, backend, retrieval_mode, documents, ledger_path,
+                    max(1, workers),
+                ),
+            ) as pool:
+        if write_header:
+            csv.DictWriter(out, fieldnames=CSV_COLUMNS).writeheader()
+        futures = {pool.submit(audit_topic, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # No se marca en el control: se reintentará en la próxima ejecución
+                summary["failed"] += 1
+                print(f"⚠️ Falló el tema {task['id']}: {e}")
+                continue
+            _write_result(out, result, as_csv)
+            checkpoint.write(task["id"] + "\n")
+            checkpoint.flush()
+            summary["completed"] += 1
+            print(f"✅ [{task['id']}] EEE {result['eee']:.1f}% ({result['seconds']}s)")
+            if result["unaudited"]:
+                print(f"⚠️ [{task['id']}] {result['unaudited']} cuestiones sin auditar: OpenAI no respondió.")
+
+    if ledger_path:
+        from cd_modules.core.audit_ledger import AuditLedger
+
+        ledger = AuditLedger(ledger_path)
+        summary["ledger"] = ledger.stats()
+        ledger.close()
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Auditorías H‑ANCHOR por lotes.")
+    parser.add_argument("input", help="Temas a auditar (.jsonl o .csv)")
+    parser.add_argument("output", help="Resultados (.jsonl o .csv); se añade al final")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--retrieval-mode", choices=["vector", "lexical", "hybrid"], default="vector")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--width", type=int, default=2)
+    parser.add_argument("--checkpoint", default=None, help="Por defecto: <output>.done")
+    parser.add_argument(
+        "--documents", default=None,
+        help="Documentos del corpus a consultar, separados por comas (por defecto: todos)",
+    )
+    parser.add_argument("--ledger", default=None, help="Registro de auditoría SQLite (opcional)")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.input,
+        args.output,
+        persist_directory=args.persist_directory,
+        backend=args.backend,
+        retrieval_mode=args.retrieval_mode,
+        workers=args.workers,
+        depth=args.depth,
+        width=args.width,
+        checkpoint_path=args.checkpoint,
+        documents=args.documents.split(",") if args.documents else None,
+        ledger_path=args.ledger,
+    )
+    print(f"📊 Resumen: {summary}")
+
+
+if __name__ == "__main__":
+    main()
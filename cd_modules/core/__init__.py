@@ -6,8 +6,31 @@ including the RAGA (retrieval augmented generation and anchoring) engine,
 the inquiry engine responsible for structured deliberation, and the
 epistemic validator. Importing from ``cd_modules.core`` will make these
 submodules available to other parts of the codebase.
+
+Los submódulos se importan bajo demanda (PEP 562): ``import cd_modules.core``
+no arrastra langchain, chromadb ni openai hasta que se accede a un motor.
 """
 
-from .raga_engine import RAGAEngine  # noqa: F401
-from .inquiry_engine import InquiryEngine  # noqa: F401
-from .validador_epistemico import EroteticEvaluator, auditor  # noqa: F401
+import importlib
+
+_EXPORTS = {
+    "RAGAEngine": ".raga_engine",
+    "InquiryEngine": ".inquiry_engine",
+    "EroteticEvaluator": ".validador_epistemico",
+    "auditor": ".validador_epistemico",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, TextIO
+
+from cd_modules.core.disk_cache import hash_key
+
+LEDGER_COLUMNS = [
+    "seq", "audit_id", "question_id", "question", "status",
+    "explanation", "source", "evidence", "sources", "created",
+]
+# Filas leídas de SQLite por bloque al exportar
+_EXPORT_BATCH = 500
+
+
+def question_id(question: str) -> str:
+    """Identificador estable de una cuestión (independiente de mayúsculas y espacios)."""
+    return hash_key(" ".join(question.lower().split()))[:16]
+
+
+class AuditLedger:
+    """
+    Registro de auditoría en SQLite, de solo anexado.
+
+    Cada veredicto es una fila nueva de ``steps`` (un disparador impide
+    modificarlas o borrarlas). ``latest`` apunta al último veredicto de
+    cada cuestión y ``counters`` mantiene, por auditoría, cuántas cuestiones
+    distintas hay, cuántas están validadas y cuántas tienen fuente; se
+    actualizan en la misma transacción que el anexado, así que el EEE se
+    lee en O(1) sin recorrer el historial. Varios procesos pueden escribir
+    el mismo fichero.
+    """
+
+    def __init__(self, path: str = "./audit_ledger.sqlite") -> None:
+        """
+        :param path: Ruta del fichero SQLite. Se crea si no existe.
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Transacciones explícitas: el recuento se lee y se corrige de forma atómica
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS steps (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                audit_id TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                status TEXT NOT NULL,
+                explanation TEXT NOT NULL,
+                source TEXT NOT NULL,
+                evidence TEXT NOT NULL,
+                sources INTEGER NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS steps_audit ON steps (audit_id, seq);
+            CREATE TRIGGER IF NOT EXISTS steps_no_update BEFORE UPDATE ON steps
+                BEGIN SELECT RAISE(ABORT, 'audit ledger is append-only'); END;
+            CREATE TRIGGER IF NOT EXISTS steps_no_delete BEFORE DELETE ON steps
+                BEGIN SELECT RAISE(ABORT, 'audit ledger is append-only'); END;
+            CREATE TABLE IF NOT EXISTS latest (
+                audit_id TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                validated INTEGER NOT NULL,
+                sourced INTEGER NOT NULL,
+                PRIMARY KEY (audit_id, question_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS counters (
+                audit_id TEXT PRIMARY KEY,
+                questions INTEGER NOT NULL,
+                validated INTEGER NOT NULL,
+                sourced INTEGER NOT NULL,
+                steps INTEGER NOT NULL
+            );
+            """
+        )
+
+    def append(
+        self,
+        audit_id: str,
+        question: str,
+        status: str,
+        explanation: str = "",
+        source: str = "",
+        evidence: str = "",
+        sources: int | None = None,
+    ) -> None:
+        """
+        Anexa el veredicto de una cuestión.
+
+        :param audit_id: Auditoría a la que pertenece (p. ej. el hash del árbol).
+        :param question: Cuestión auditada.
+        :param status: Veredicto (``"VALIDADA"``, ``"RECHAZADA"``…).
+        :param explanation: Justificación del veredicto.
+        :param source: Fuente citada.
+        :param evidence: Texto de la evidencia.
+        :param sources: Número de fuentes; por defecto 1 si hay ``source`` o
+            ``evidence`` y 0 si no.
+        """
+        self.append_many(audit_id, [{
+            "question": question,
+            "status": status,
+            "explanation": explanation,
+            "source": source,
+            "evidence": evidence,
+            "sources": sources,
+        }])
+
+    def append_many(self, audit_id: str, steps: Iterable[dict]) -> None:
+        """
+        Anexa varios veredictos en una sola transacción.
+
+        :param audit_id: Auditoría a la que pertenecen.
+        :param steps: Diccionarios con ``question`` y ``status`` y,
+            opcionalmente, ``explanation``, ``source``, ``evidence`` y ``sources``.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                delta = [0, 0, 0, 0]  # cuestiones, validadas, con fuente, pasos
+                for step in steps:
+                    source = step.get("source") or ""
+                    evidence = step.get("evidence") or ""
+                    sources = step.get("sources")
+                    if sources is None:
+                        sources = 1 if (source or evidence) else 0
+                    qid = question_id(step["question"])
+                    validated = int(step["status"] == "VALIDADA")
+                    sourced = int(sources > 0)
+                    seq = conn.execute(
+                        "INSERT INTO steps (audit_id, question_id, question, status, explanation,"
+                        " source, evidence, sources, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (audit_id, qid, step["question"], step["status"],
+                         step.get("explanation") or "", source, evidence, sources, now),
+                    ).lastrowid
+                    previous = conn.execute(
+                        "SELECT validated, sourced FROM latest WHERE audit_id = ? AND question_id = ?",
+                        (audit_id, qid),
+                    ).fetchone()
+                    # Una cuestión re‑auditada sustituye su veredicto anterior
+                    if previous is None:
+                        delta[0] += 1
+                    else:
+                        delta[1] -= previous[0]
+                        delta[2] -= previous[1]
+                    delta[1] += validated
+                    delta[2] += sourced
+                    delta[3] += 1
+                    conn.execute(
+                        "INSERT OR REPLACE INTO latest (audit_id, question_id, seq, validated, sourced)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (audit_id, qid, seq, validated, sourced),
+                    )
+                conn.execute(
+                    "INSERT INTO counters (audit_id, questions, validated, sourced, steps)"
+                    " VALUES (?, ?, ?, ?, ?) ON CONFLICT (audit_id) DO UPDATE SET"
+                    " questions = questions + excluded.questions,"
+                    " validated = validated + excluded.validated,"
+                    " sourced = sourced + excluded.sourced,"
+                    " steps = steps + excluded.steps",
+                    (audit_id, *delta),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def stats(self, audit_id: str | None = None) -> dict:
+        """
+        Contadores de una auditoría (o de todas si ``audit_id`` es ``None``).
+
+        :return: ``{"questions", "validated", "sourced", "steps", "eee"}``;
+            ``eee`` es el porcentaje de cuestiones validadas.
+        """
+        query = "SELECT SUM(questions), SUM(validated), SUM(sourced), SUM(steps) FROM counters"
+        params: tuple = ()
+        if audit_id is not None:
+            query += " WHERE audit_id = ?"
+            params = (audit_id,)
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        questions, validated, sourced, steps = (value or 0 for value in row)
+        return {
+            "questions": questions,
+            "validated": validated,
+            "sourced": sourced,
+            "steps": steps,
+            "eee": 100.0 * validated / questions if questions else 0.0,
+        }
+
+    def eee(self, audit_id: str | None = None) -> float:
+        """Índice EEE (porcentaje de cuestiones validadas), leído de los contadores."""
+        return self.stats(audit_id)["eee"]
+
+    def iter_steps(self, audit_id: str | None = None, history: bool = False) -> Iterator[dict]:
+        """
+        Recorre el registro por bloques, sin cargarlo entero en memoria.
+
+        Usa una conexión propia: en modo WAL la lectura no bloquea a quien
+        siga anexando.
+
+        :param audit_id: Auditoría a recorrer; ``None`` recorre todas.
+        :param history: Si es ``True`` devuelve todos los veredictos; si no,
+            solo el último de cada cuestión.
+        :return: Iterador de diccionarios con ``LEDGER_COLUMNS``.
+        """
+        columns = ", ".join(f"s.{c}" for c in LEDGER_COLUMNS)
+        if history:
+            query = f"SELECT {columns} FROM steps s"
+            where = " WHERE s.audit_id = ?"
+        else:
+            query = (
+                f"SELECT {columns} FROM latest l JOIN steps s ON s.seq = l.seq"
+            )
+            where = " WHERE l.audit_id = ?"
+        params: tuple = ()
+        if audit_id is not None:
+            query += where
+            params = (audit_id,)
+        query += " ORDER BY s.seq"
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(query, params)
+            while rows := cursor.fetchmany(_EXPORT_BATCH):
+                for row in rows:
+                    yield dict(zip(LEDGER_COLUMNS, row))
+        finally:
+            conn.close()
+
+    def export_csv(self, out: TextIO, audit_id: str | None = None, history: bool = False) -> int:
+        """
+        Escribe el registro en CSV a medida que se lee.
+
+        :param out: Fichero de texto abierto con ``newline=""``.
+        :return: Filas escritas.
+        """
+        writer = csv.DictWriter(out, fieldnames=LEDGER_COLUMNS)
+        writer.writeheader()
+        count = 0
+        for step in self.iter_steps(audit_id, history):
+            writer.writerow(step)
+            count += 1
+        return count
+
+    def export_jsonl(self, out: TextIO, audit_id: str | None = None, history: bool = False) -> int:
+        """
+        Escribe el registro en JSONL (una línea por veredicto) a medida que se lee.
+
+        :return: Filas escritas.
+        """
+        count = 0
+        for step in self.iter_steps(audit_id, history):
+            out.write(json.dumps(step, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def close(self) -> None:
+        """Cierra la conexión con el fichero."""
+        with self._lock:
+            self._conn.close()
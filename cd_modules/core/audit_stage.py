@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+from typing import Iterator
+
+from cd_modules.core.disk_cache import hash_key
+from cd_modules.core.llm_scheduler import LLMUnavailableError
+
+REPORT_COLUMNS = ["Cuestión", "Estado", "Justificación", "Evidencia (Grounding)"]
+# Veredicto de las cuestiones que no se pudieron auditar (OpenAI no respondió)
+UNAUDITED = "SIN AUDITAR"
+
+
+@dataclass(frozen=True)
+class AuditRow:
+    """Veredicto de una cuestión del árbol."""
+
+    question: str
+    status: str
+    explanation: str
+    source: str
+    evidence: str
+
+    def to_record(self) -> dict:
+        """Fila del informe forense con las columnas que muestra la interfaz."""
+        return dict(zip(
+            REPORT_COLUMNS, (self.question, self.status, self.explanation, self.source)
+        ))
+
+
+@dataclass(frozen=True)
+class AuditResult:
+    """Resultado inmutable de auditar un árbol concreto."""
+
+    tree_hash: str
+    rows: tuple[AuditRow, ...]
+
+    @property
+    def eee(self) -> float:
+        """
+        Índice EEE: porcentaje de cuestiones validadas entre las auditadas.
+        Las cuestiones ``"SIN AUDITAR"`` no cuentan a favor ni en contra.
+        """
+        audited = [row for row in self.rows if row.status != UNAUDITED]
+        if not audited:
+            return 0.0
+        validas = sum(1 for row in audited if row.status == "VALIDADA")
+        return 100.0 * validas / len(audited)
+
+    @property
+    def unaudited(self) -> int:
+        """Cuestiones que quedaron sin auditar."""
+        return sum(1 for row in self.rows if row.status == UNAUDITED)
+
+    def status_by_question(self) -> dict[str, str]:
+        """Estado de cada cuestión, para colorear el mapa."""
+        return {row.question: row.status for row in self.rows}
+
+    def to_records(self) -> list[dict]:
+        """Filas del informe en formato tabular."""
+        return [row.to_record() for row in self.rows]
+
+    def to_csv(self) -> bytes:
+        """Informe forense en CSV (UTF‑8)."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(self.to_records())
+        return buffer.getvalue().encode("utf-8")
+
+
+def iter_questions(tree: dict) -> Iterator[str]:
+    """Recorre el árbol en preorden devolviendo cada cuestión."""
+    for question, children in tree.items():
+        yield question
+        yield from iter_questions(children)
+
+
+def tree_hash(tree: dict) -> str:
+    """Hash estable del árbol (estructura y orden de las cuestiones)."""
+    return hash_key(json.dumps(tree, ensure_ascii=False))
+
+
+def run_audit(
+    tree: dict,
+    raga,
+    evaluator,
+    ledger=None,
+    audit_id: str | None = None,
+) -> AuditResult:
+    """
+    Audita una sola vez todas las cuestiones de un árbol.
+
+    Ancla cada cuestión con ``retrieve_many`` (una única petición de
+    embeddings) y pide al ``EroteticEvaluator`` los veredictos en lote.
+
+    Si OpenAI no responde (al recuperar la evidencia o al emitir un
+    veredicto), las cuestiones afectadas quedan ``"SIN AUDITAR"``: no se
+    anexan al registro ni cuentan en el EEE, para repetirlas más tarde.
+
+    :param tree: Árbol devuelto por ``InquiryEngine``.
+    :param raga: ``RAGAEngine`` con la base de conocimientos cargada.
+    :param evaluator: ``EroteticEvaluator`` que emite los veredictos.
+    :param ledger: ``AuditLedger`` opcional donde anexar los veredictos.
+    :param audit_id: Auditoría del registro; por defecto, el hash del árbol.
+    :return: ``AuditResult`` inmutable, identificado por el hash del árbol.
+    """
+    questions = list(dict.fromkeys(iter_questions(tree)))
+    try:
+        evidence_lists = raga.retrieve_many(questions, k=1)
+    except LLMUnavailableError as e:
+        # Sin evidencia recuperada no hay juicio posible: nada de "NO VALIDADA"
+        print(f"⚠️ Evidencia no disponible: {e}")
+        evidence_lists = [[] for _ in questions]
+        verdicts = [(UNAUDITED, f"No se pudo recuperar la evidencia: {e}")] * len(questions)
+    else:
+        verdicts = None
+    evidence = [e[0]["content"] if e else "" for e in evidence_lists]
+    sources = [e[0]["source"] if e else "Sin fuente" for e in evidence_lists]
+    if verdicts is None:
+        verdicts = evaluator.audit_many(zip(questions, evidence))
+
+    rows = tuple(
+        AuditRow(
+            question=question,
+            status=status,
+            explanation=explanation,
+            source=source,
+            evidence=text,
+        )
+        for question, text, source, (status, explanation) in zip(
+            questions, evidence, sources, verdicts
+        )
+    )
+    result = AuditResult(tree_hash=tree_hash(tree), rows=rows)
+    if ledger is not None:
+        ledger.append_many(audit_id or result.tree_hash, [
+            {
+                "question": row.question,
+                "status": row.status,
+                "explanation": row.explanation,
+                "source": row.source if row.evidence else "",
+                "evidence": row.evidence,
+            }
+            for row in rows
+            if row.status != UNAUDITED
+        ])
+    return result
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import re
+
+from cd_modules.core.reasoning_tracker import count_tokens, truncate_tokens
+
+# Solapamiento mínimo (caracteres) para considerar que dos fragmentos se
+# continúan; el divisor recursivo solapa hasta 200.
+_MIN_OVERLAP = 20
+_MAX_OVERLAP = 400
+# Por debajo de este resto de presupuesto no merece la pena recortar un bloque
+_MIN_TRUNCATED_TOKENS = 32
+_GAP = "\n[…]\n"
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _overlap(left: str, right: str) -> int:
+    """Longitud del sufijo de ``left`` que es prefijo de ``right`` (0 si no hay)."""
+    probe = right[:_MIN_OVERLAP]
+    if len(probe) < _MIN_OVERLAP:
+        return 0
+    start = max(0, len(left) - _MAX_OVERLAP)
+    position = left.find(probe, start)
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def merge_text(first: str, second: str) -> str:
+    """
+    Une dos fragmentos de la misma página sin repetir texto.
+
+    Si uno contiene al otro se queda el mayor; si se solapan (en cualquier
+    orden) se cosen por el solapamiento; si no, se concatenan con una marca
+    de salto.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    overlap = _overlap(first, second)
+    if overlap:
+        return first + second[overlap:]
+    overlap = _overlap(second, first)
+    if overlap:
+        return second + first[overlap:]
+    return first + _GAP + second
+
+
+def merge_evidence(evidence: list[dict]) -> list[dict]:
+    """
+    Fusiona las evidencias de una misma página y descarta duplicados.
+
+    Conserva el orden de relevancia: cada bloque ocupa la posición de su
+    primer fragmento.
+
+    :param evidence: Evidencias de ``RAGAEngine.retrieve``.
+    :return: Bloques ``{"source", "content", "relevance"}`` sin texto repetido.
+    """
+    blocks: list[dict] = []
+    by_source: dict[str, dict] = {}
+    seen: set[str] = set()
+    for item in evidence:
+        content = item["content"].strip()
+        fingerprint = _SPACES_RE.sub(" ", content)
+        if not content or fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        block = by_source.get(item["source"])
+        if block is None:
+            block = {**item, "content": content}
+            by_source[item["source"]] = block
+            blocks.append(block)
+        else:
+            block["content"] = merge_text(block["content"], content)
+    return blocks
+
+
+def pack_context(
+    evidence: list[dict],
+    budget_tokens: int = 600,
+    model: str = "gpt-4o",
+) -> str:
+    """
+    Prepara el contexto legal de un prompt dentro de un presupuesto de tokens.
+
+    Fusiona y deduplica con ``merge_evidence`` y añade bloques por orden de
+    relevancia mientras quepan; el primero que no cabe se recorta si queda
+    presupuesto suficiente.
+
+    :param evidence: Evidencias de ``RAGAEngine.retrieve``.
+    :param budget_tokens: Tokens máximos del contexto (medidos con ``tiktoken``).
+    :param model: Modelo cuyo tokenizador se usa para medir.
+    :return: Líneas ``- (Fuente: …): …`` listas para el prompt.
+    """
+    lines: list[str] = []
+    used = 0
+    for block in merge_evidence(evidence):
+        line = f"- (Fuente: {block['source']}): {block['content']}"
+        tokens = count_tokens(line, model)
+        if used + tokens <= budget_tokens:
+            lines.append(line)
+            used += tokens
+            continue
+        remaining = budget_tokens - used
+        if remaining >= _MIN_TRUNCATED_TOKENS:
+            lines.append(truncate_tokens(line, remaining - 1, model).rstrip() + "…")
+        break
+    return "\n".join(lines)
@@ -2,53 +2,262 @@
 
 # Se elimina la importación de 'recuperar_fragmentos' y 'validar_contexto' ya que no se usarán.
 
-# Imports para la integración con OpenAI
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.schema.output_parser import StrOutputParser
+# Los imports de LangChain/OpenAI se hacen dentro de las funciones:
+# son costosos y este módulo se importa aunque no se llegue a usar.
 
+import os
+import queue
+import threading
+from typing import Iterator
 
-def generar_contexto(nodo: str, openai_api_key: str) -> dict:
+from cd_modules.core.disk_cache import hash_key
+from cd_modules.core.llm_scheduler import ScheduledEmbeddings, shared_scheduler
+from cd_modules.core.reasoning_tracker import count_tokens
+
+# Se define la plantilla del prompt para que la IA responda desde su conocimiento general.
+_PLANTILLA = """
+    Eres un asistente legal experto en Derecho de la Propiedad Intelectual en España.
+    Responde a la siguiente pregunta basándote en tu conocimiento general sobre el tema de forma clara, técnica y concisa.
+
+    Pregunta del usuario:
+    {pregunta}
+
+    Respuesta:
+    """
+_FUENTE = "Conocimiento General de OpenAI"
+_MODELO = "gpt-4o"
+# Usamos una temperatura de 0.2 para un equilibrio entre creatividad y objetividad.
+_TEMPERATURA = 0.2
+_EMBEDDING_MODEL = "text-embedding-3-small"
+# Tokens de respuesta que se reservan en la cuota antes de cada llamada
+_RESPUESTA_ESTIMADA = 512
+# Similitud coseno a partir de la cual dos preguntas comparten respuesta
+UMBRAL_SIMILITUD = 0.95
+CACHE_PATH = "./answer_cache.sqlite"
+# Vida y tope de la caché de respuestas (los mismos que los desgloses de ``InquiryEngine``)
+CACHE_TTL = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 10_000
+
+# Cadenas y cachés compartidas por todo el proceso. La clave de API entra
+# en la clave del pool solo como hash.
+_pool_lock = threading.Lock()
+_cadenas: dict[tuple[str, str], object] = {}
+_caches: dict[tuple[str, str, str], object] = {}
+
+
+def _cadena(openai_api_key: str, modelo: str):
+    """Cadena ``prompt | modelo | parser`` reutilizada por clave de API y modelo."""
+    clave = (hash_key(openai_api_key), modelo)
+    with _pool_lock:
+        chain = _cadenas.get(clave)
+        if chain is None:
+            from langchain_openai import ChatOpenAI
+            from langchain.prompts import PromptTemplate
+            from langchain.schema.output_parser import StrOutputParser
+
+            prompt = PromptTemplate(input_variables=["pregunta"], template=_PLANTILLA)
+            # Sin reintentos propios: los gestiona el planificador
+            llm = ChatOpenAI(
+                temperature=_TEMPERATURA, model=modelo, openai_api_key=openai_api_key, max_retries=0
+            )
+            chain = prompt | llm | StrOutputParser()
+            _cadenas[clave] = chain
+        return chain
+
+
+def _cache_respuestas(
+    openai_api_key: str, modelo: str, cache_path: str | None, embeddings, planificador
+):
+    """
+    ``SemanticCache`` compartida para un fichero y un modelo, o ``None`` si
+    ``cache_path`` es ``None``.
+
+    Las respuestas se separan por modelo, temperatura y plantilla: cambiar
+    cualquiera de ellos no devuelve respuestas generadas con los anteriores.
+    """
+    if cache_path is None:
+        return None
+    namespace = hash_key(modelo, _TEMPERATURA, _PLANTILLA)[:16]
+    clave = (os.path.abspath(cache_path), namespace, hash_key(openai_api_key))
+    with _pool_lock:
+        cache = _caches.get(clave)
+        if cache is None:
+            from cd_modules.core.semantic_cache import SemanticCache
+
+            if embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+
+                embeddings = OpenAIEmbeddings(
+                    model=_EMBEDDING_MODEL, openai_api_key=openai_api_key, max_retries=0
+                )
+            embeddings = ScheduledEmbeddings(embeddings, planificador, _EMBEDDING_MODEL)
+            cache = SemanticCache(
+                cache_path,
+                embeddings,
+                threshold=UMBRAL_SIMILITUD,
+                namespace=namespace,
+                ttl=CACHE_TTL,
+                max_entries=CACHE_MAX_ENTRIES,
+            )
+            _caches[clave] = cache
+        return cache
+
+
+def generar_contexto(
+    nodo: str,
+    openai_api_key: str,
+    modelo: str = _MODELO,
+    umbral_similitud: float = UMBRAL_SIMILITUD,
+    cache_path: str | None = CACHE_PATH,
+    embeddings=None,
+    planificador=None,
+    prioridad: str = "interactive",
+) -> dict:
     """
     Genera el contexto legal para un nodo usando directamente el conocimiento
     general de un modelo de OpenAI.
 
+    Antes de llamar al modelo se consulta la caché semántica: si ya se
+    respondió una pregunta con similitud mayor o igual que
+    ``umbral_similitud`` y que cita los mismos artículos y números, se
+    devuelve esa respuesta sin coste de API.
+
     :param nodo: Subpregunta o concepto a contextualizar.
     :param openai_api_key: La clave de API para autenticarse con OpenAI.
-    :return: Diccionario con el contexto generado por la IA.
+    :param modelo: Modelo de chat de OpenAI.
+    :param umbral_similitud: Similitud coseno mínima para reutilizar una respuesta.
+    :param cache_path: Fichero de la caché semántica; ``None`` la desactiva.
+    :param embeddings: Embeddings para la caché (por defecto ``OpenAIEmbeddings``);
+        solo se usan la primera vez que se abre la caché.
+    :param planificador: ``LLMScheduler`` por el que pasan las llamadas a
+        OpenAI; por defecto el compartido del proceso.
+    :param prioridad: Clase de prioridad (``"interactive"`` o ``"batch"``).
+    :return: Diccionario con el contexto generado por la IA; ``desde_cache``
+        indica si la respuesta procede de la caché.
     """
-    
-    # Se define la plantilla del prompt para que la IA responda desde su conocimiento general.
-    template = """
-    Eres un asistente legal experto en Derecho de la Propiedad Intelectual en España.
-    Responde a la siguiente pregunta basándote en tu conocimiento general sobre el tema de forma clara, técnica y concisa.
+    planificador = planificador or shared_scheduler()
+    cache = _cache_respuestas(openai_api_key, modelo, cache_path, embeddings, planificador)
+    vector = None
+    if cache is not None:
+        respuesta, vector = cache.lookup(nodo, umbral_similitud)
+        if respuesta is not None:
+            return _resultado(respuesta, desde_cache=True)
 
-    Pregunta del usuario:
-    {pregunta}
+    # Invocamos la cadena con la pregunta del usuario. La misma pregunta en
+    # vuelo desde otra sesión comparte la llamada
+    chain = _cadena(openai_api_key, modelo)
+    contexto_generado = planificador.call(
+        lambda: chain.invoke({"pregunta": nodo}),
+        tokens=_tokens_estimados(nodo, modelo),
+        priority=prioridad,
+        key=hash_key(hash_key(openai_api_key), modelo, nodo),
+    )
+    if cache is not None:
+        cache.store(nodo, contexto_generado, vector)
+    return _resultado(contexto_generado, desde_cache=False)
 
-    Respuesta:
+
+def generar_contexto_stream(
+    nodo: str,
+    openai_api_key: str,
+    modelo: str = _MODELO,
+    umbral_similitud: float = UMBRAL_SIMILITUD,
+    cache_path: str | None = CACHE_PATH,
+    embeddings=None,
+    planificador=None,
+    prioridad: str = "interactive",
+) -> Iterator[str]:
+    """
+    Variante de ``generar_contexto`` que devuelve la respuesta a trozos según
+    llega del modelo (p. ej. para ``st.write_stream``).
+
+    Un acierto de la caché se devuelve de una vez. La respuesta solo se
+    guarda en la caché si el flujo se consume hasta el final.
+
+    El flujo entero se lee dentro de una llamada del planificador, que
+    ocupa su hueco de concurrencia hasta el último trozo; los trozos llegan
+    al llamante por una cola. Solo se reintenta si el modelo falla antes
+    del primer trozo: un fallo a mitad de flujo se propaga tal cual para
+    no repetir texto ya emitido. Si se deja de consumir el iterador, el
+    flujo se cierra y el hueco se libera.
+
+    :return: Iterador de fragmentos de texto de la respuesta.
     """
-    prompt = PromptTemplate(
-        input_variables=["pregunta"],
-        template=template
+    planificador = planificador or shared_scheduler()
+    cache = _cache_respuestas(openai_api_key, modelo, cache_path, embeddings, planificador)
+    vector = None
+    if cache is not None:
+        respuesta, vector = cache.lookup(nodo, umbral_similitud)
+        if respuesta is not None:
+            yield respuesta
+            return
+
+    chain = _cadena(openai_api_key, modelo)
+    trozos: queue.Queue = queue.Queue()
+    cancelado = threading.Event()
+    futuro = planificador.submit(
+        lambda: _leer_flujo(chain.stream({"pregunta": nodo}), trozos, cancelado),
+        tokens=_tokens_estimados(nodo, modelo),
+        priority=prioridad,
     )
+    futuro.add_done_callback(lambda _: trozos.put(_FIN))
+    partes = []
+    try:
+        while (trozo := trozos.get()) is not _FIN:
+            partes.append(trozo)
+            yield trozo
+    finally:
+        cancelado.set()
+    error = futuro.result()  # Eleva el error si el flujo no llegó a abrirse
+    if error is not None:
+        raise error
+    if cache is not None and partes:
+        cache.store(nodo, "".join(partes), vector)
+
+
+def _tokens_estimados(nodo: str, modelo: str) -> int:
+    return count_tokens(_PLANTILLA + nodo, modelo) + _RESPUESTA_ESTIMADA
+
+
+# Marca el final de los trozos en la cola de ``generar_contexto_stream``
+_FIN = object()
 
-    # Inicializamos el modelo de OpenAI
-    # Usamos una temperatura de 0.2 para un equilibrio entre creatividad y objetividad.
-    modelo = ChatOpenAI(temperature=0.2, model="gpt-4o", openai_api_key=openai_api_key)
 
-    # Creamos el pipeline (chain) de LangChain
-    chain = prompt | modelo | StrOutputParser()
+def _leer_flujo(flujo, trozos: queue.Queue, cancelado: threading.Event) -> Exception | None:
+    """
+    Lee ``flujo`` completo y deja cada trozo en ``trozos``.
+
+    Un error antes del primer trozo se eleva (el planificador lo reintenta);
+    después se devuelve, porque repetir la llamada duplicaría el texto ya
+    emitido.
+
+    :return: El error que cortó el flujo a medias, o ``None``.
+    """
+    iterador = iter(flujo)
+    emitido = False
+    try:
+        for trozo in iterador:
+            if cancelado.is_set():
+                break
+            trozos.put(trozo)
+            emitido = True
+    except Exception as exc:
+        if not emitido:
+            raise
+        return exc
+    finally:
+        cerrar = getattr(iterador, "close", None)
+        if cerrar is not None:
+            cerrar()
+    return None
+
 
-    # Invocamos la cadena con la pregunta del usuario
-    contexto_generado = chain.invoke({
-        "pregunta": nodo
-    })
-    
+def _resultado(contexto: str, desde_cache: bool) -> dict:
     # Como la respuesta no se basa en un documento, la fuente y la validación son fijas.
     return {
-        "contexto": contexto_generado,
-        "fuente": "Conocimiento General de OpenAI",
+        "contexto": contexto,
+        "fuente": _FUENTE,
         "validacion": "no validada",
-        "camino": []
+        "camino": [],
+        "desde_cache": desde_cache,
     }
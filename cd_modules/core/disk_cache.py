@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+
+def hash_key(*parts: object) -> str:
+    """
+    Genera una clave estable (SHA‑256) a partir de varias partes.
+
+    :param parts: Elementos que identifican la entrada; se convierten a texto.
+    :return: Digest hexadecimal.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Almacén clave/valor persistente sobre SQLite, seguro entre hilos."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float | None = None,
+        max_entries: int | None = None,
+    ) -> None:
+        """
+        :param path: Ruta del fichero SQLite. Se crea si no existe.
+        :param ttl: Segundos de vida de cada entrada; ``None`` = sin caducidad.
+        :param max_entries: Tope de entradas; al superarlo se desalojan las
+            más antiguas. ``None`` = sin límite.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # ``timeout`` holgado: varios procesos pueden escribir la misma caché
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS kv_created ON kv (created)")
+        self._conn.commit()
+
+    def _min_created(self) -> float:
+        """Marca temporal mínima de una entrada vigente según ``ttl``."""
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def get(self, key: str) -> bytes | None:
+        """Devuelve el valor de ``key`` o ``None`` si no existe o ha caducado."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND created >= ?",
+                (key, self._min_created()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, bytes]:
+        """
+        Recupera varias claves en una sola consulta por lote.
+
+        :param keys: Claves a consultar.
+        :return: Diccionario con las claves encontradas.
+        """
+        keys = list(dict.fromkeys(keys))
+        found: dict[str, bytes] = {}
+        # SQLite limita el número de parámetros por sentencia
+        step = 500
+        with self._lock:
+            for i in range(0, len(keys), step):
+                batch = keys[i:i + step]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM kv WHERE key IN ({placeholders})"
+                    " AND created >= ?",
+                    [*batch, self._min_created()],
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put(self, key: str, value: bytes) -> None:
+        """Guarda ``value`` bajo ``key`` (sobrescribe si ya existía)."""
+        self.put_many({key: value})
+
+    def put_many(self, items: dict[str, bytes]) -> None:
+        """Guarda varias entradas en una única transacción."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kv (key, value, created) VALUES (?, ?, ?)",
+                [(k, sqlite3.Binary(v), now) for k, v in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Borra entradas caducadas y las más antiguas por encima del tope."""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM kv WHERE created < ?", (self._min_created(),))
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM kv WHERE key IN ("
+                " SELECT key FROM kv ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    def close(self) -> None:
+        """Cierra la conexión con el fichero."""
+        with self._lock:
+            self._conn.close()
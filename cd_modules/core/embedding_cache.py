@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from cd_modules.core.disk_cache import DiskCache, hash_key
+from cd_modules.core.reasoning_tracker import trace
+
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envoltorio de embeddings con caché en disco direccionada por contenido.
+
+    Cada fragmento se identifica por el hash de su texto y del modelo de
+    embeddings, de modo que al re‑ingestar un PDF corregido solo se envían
+    al endpoint los fragmentos nuevos o modificados.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_path: str) -> None:
+        """
+        :param embeddings: Implementación real (p. ej. ``OpenAIEmbeddings``).
+        :param model_name: Nombre del modelo; forma parte de la clave.
+        :param cache_path: Fichero SQLite donde persistir los vectores.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = DiskCache(cache_path)
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.embedded = 0
+        # ``ReasoningTracker`` opcional que recibe tiempos y tokens
+        self.tracker = None
+
+    def _call(self, method, texts: list[str]):
+        """Llama al modelo real registrando la petición en el rastreador."""
+        start = time.perf_counter()
+        with trace(self.tracker, "embedding"):
+            result = method(texts)
+        if self.tracker is not None:
+            self.tracker.record_embedding(
+                self.model_name,
+                texts if isinstance(texts, list) else [texts],
+                time.perf_counter() - start,
+            )
+        return result
+
+    def _key(self, text: str) -> str:
+        return hash_key(self.model_name, text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Devuelve los embeddings de ``texts`` calculando solo los ausentes.
+
+        :param texts: Fragmentos a vectorizar.
+        :return: Lista de vectores en el mismo orden que ``texts``.
+        """
+        keys = [self._key(t) for t in texts]
+        stored = self.cache.get_many(keys)
+
+        # Textos pendientes, sin duplicados, en orden de aparición
+        pending: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in stored and key not in pending:
+                pending[key] = text
+
+        fresh: dict[str, bytes] = {}
+        if pending:
+            vectors = self._call(self.embeddings.embed_documents, list(pending.values()))
+            fresh = {key: _pack(vec) for key, vec in zip(pending, vectors)}
+            self.cache.put_many(fresh)
+
+        with self._lock:
+            self.embedded += len(pending)
+            self.reused += len(texts) - len(pending)
+
+        return [_unpack(stored[k] if k in stored else fresh[k]) for k in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Las consultas no se persisten: se delegan en el modelo real."""
+        return self._call(self.embeddings.embed_query, text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Vectoriza varias consultas en una única petición por lotes.
+
+        Como ``embed_query``, no pasa por la caché en disco ni altera los
+        contadores de ingesta.
+        """
+        if not texts:
+            return []
+        return self._call(self.embeddings.embed_documents, texts)
+
+    def reset_counters(self) -> None:
+        """Pone a cero los contadores de reutilizados/calculados."""
+        with self._lock:
+            self.reused = 0
+            self.embedded = 0
+
+    def counters(self) -> dict:
+        """Devuelve cuántos fragmentos se reutilizaron y cuántos se calcularon."""
+        with self._lock:
+            return {"reused": self.reused, "embedded": self.embedded}
@@ -1,21 +1,35 @@
 class EpistemicNavigator:
     """
-    Navegador epistémico stub: simula una búsqueda de fuentes jurídicas relevantes.
-    Puede ampliarse con embeddings o integración real más adelante.
+    Navegador epistémico: busca cadenas de fuentes jurídicas relevantes
+    recorriendo el grafo de fragmentos del corpus (PathRAG).
     """
 
-    def __init__(self):
-        # En el futuro: inicializa aquí la base de conocimiento o embeddings
-        pass
+    def __init__(self, raga=None, max_hops=2):
+        """
+        :param raga: ``RAGAEngine`` a consultar; por defecto, el motor
+            compartido del índice local.
+        :param max_hops: Saltos máximos de cada camino.
+        """
+        if raga is None:
+            from cd_modules.core.raga_engine import shared_engine
+
+            raga = shared_engine()
+        self.raga = raga
+        self.max_hops = max_hops
+
+    def search_paths(self, query, k=3):
+        """
+        Los k caminos más relevantes, con sus fragmentos en orden (ver
+        ``RAGAEngine.retrieve_paths``).
+        """
+        return self.raga.retrieve_paths(query, k=k, max_hops=self.max_hops)
 
     def search(self, query, k=3):
         """
-        Simula la búsqueda de las k fuentes más relevantes para una consulta.
-        Devuelve una lista de tuplas: (extracto/fragmento, score)
+        Busca las k cadenas de fuentes más relevantes para una consulta.
+        Devuelve una lista de tuplas: (extracto encadenado, score)
         """
-        resultados = [
-            (f"Extracto jurídico de ejemplo relacionado con: {query}", 0.92),
-            (f"Otro fragmento relevante sobre: {query}", 0.85),
-            (f"Jurisprudencia simulada para: {query}", 0.81)
+        return [
+            ("\n→ ".join(e["content"] for e in path["evidence"]), path["score"])
+            for path in self.search_paths(query, k)
         ]
-        return resultados[:k]
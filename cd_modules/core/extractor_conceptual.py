@@ -1,5 +1,6 @@
 # File: cd_modules/core/extractor_conceptual.py
 
+import bisect
 import re
 
 # Lista ampliada de términos PI para una mejor extracción de conceptos.
@@ -11,27 +12,126 @@ KEYWORDS = [
     "límites al derecho de autor", "copia privada"
 ]
 
+# Términos compuestos ("derechos de autor") y palabras largas ("patentable"):
+# los mismos que la expresión original ``\b(X{4,}(conector)?X{4,}){1,2}\b``,
+# pero sin su cuantificador anidado, que retrocede de forma exponencial en
+# palabras largas seguidas de otro carácter de palabra ("ü", dígitos…).
+_COMPUESTO_RE = re.compile(
+    r"\b(?:[a-záéíóúñ]{4,}\s+(?:de|la|el|los|las)\s+[a-záéíóúñ]{4,}|[a-záéíóúñ]{8,})\b"
+)
+_NO_CONCEPTOS = {"de", "la", "el", "y", "en", "para", "qué", "cómo", "cuándo"}
+# Separador de textos en ``buscar_lote``: no es palabra ni espacio, así que
+# ningún término lo atraviesa
+_SEPARADOR = "\x00"
+
+
+class ConceptMatcher:
+    """
+    Buscador de conceptos compilado para procesar muchos textos a la vez.
+
+    Cada término se compila una sola vez en una expresión que empieza por
+    un literal (el motor ``re`` la localiza con búsqueda rápida de
+    subcadenas) y ``buscar_lote`` la pasa una única vez sobre todos los
+    textos unidos, saltando al texto siguiente en cuanto encuentra el
+    término. Una alternancia única de todos los términos resulta más lenta
+    en ``re``, que prueba las alternativas una a una en cada posición.
+
+    Con ``palabras_completas`` (por defecto) cada término se busca como
+    palabras enteras que admiten plural ("derecho" encuentra "derechos",
+    pero "ue" no aparece dentro de "que"); sin ella, como subcadena
+    literal, igual que ``termino in texto``.
+    """
+
+    def __init__(self, terminos: list[str], palabras_completas: bool = True) -> None:
+        """
+        :param terminos: Vocabulario de conceptos (se compara en minúsculas).
+        :param palabras_completas: Busca palabras enteras (con plural) en
+            lugar de subcadenas.
+        """
+        self.terminos = list(dict.fromkeys(" ".join(t.lower().split()) for t in terminos))
+        self.palabras_completas = palabras_completas
+        # Identifica cómo se buscan los términos (se guarda con los índices)
+        self.modo = "palabras+plural" if palabras_completas else "subcadena"
+        if palabras_completas:
+            self._patrones = [
+                (termino, re.compile(
+                    r"\s+".join(re.escape(palabra) + r"(?:e?s)?" for palabra in termino.split())
+                    + r"(?!\w)"
+                ))
+                for termino in self.terminos
+            ]
+        else:
+            self._patrones = [(termino, re.compile(re.escape(termino))) for termino in self.terminos]
+
+    def buscar(self, texto: str) -> list[str]:
+        """
+        Conceptos del vocabulario presentes en ``texto``.
+
+        :return: Lista sin duplicados, en el orden del vocabulario.
+        """
+        return self.buscar_lote([texto])[0]
+
+    def buscar_lote(self, textos: list[str]) -> list[list[str]]:
+        """
+        Conceptos de cada texto, con una sola pasada por término sobre todos
+        ellos.
+
+        :param textos: Textos a analizar (p. ej. los fragmentos de un PDF).
+        :return: Una lista de conceptos por texto, en el mismo orden.
+        """
+        bajos = [t.lower() for t in textos]
+        inicios = []
+        posicion = 0
+        for texto in bajos:
+            inicios.append(posicion)
+            posicion += len(texto) + len(_SEPARADOR)
+        unido = _SEPARADOR.join(bajos)
+
+        encontrados: list[list[str]] = [[] for _ in textos]
+        for termino, patron in self._patrones:
+            posicion = 0
+            while match := patron.search(unido, posicion):
+                inicio = match.start()
+                anterior = unido[inicio - 1] if inicio else " "
+                if self.palabras_completas and (anterior.isalnum() or anterior == "_"):
+                    posicion = inicio + 1  # Parte de otra palabra ("materia")
+                    continue
+                i = bisect.bisect_right(inicios, inicio) - 1
+                encontrados[i].append(termino)
+                # Basta una aparición por texto: seguimos en el siguiente
+                posicion = inicios[i + 1] if i + 1 < len(inicios) else len(unido)
+        return encontrados
+
+
+# Buscadores del vocabulario por defecto, compilados una sola vez. El índice
+# de conceptos usa palabras completas; ``extraer_conceptos`` mantiene la
+# búsqueda por subcadena de siempre.
+MATCHER = ConceptMatcher(KEYWORDS)
+_MATCHER_SUBCADENA = ConceptMatcher(KEYWORDS, palabras_completas=False)
+
+
 def extraer_conceptos(texto: str) -> list[str]:
     """
     Extrae conceptos clave buscando keywords y tokens compuestos.
     La lista de keywords ha sido ampliada para mayor precisión.
     """
-    texto_low = texto.lower()
-    encontrados = set()
-
-    # 1) Buscamos keywords de la lista ampliada
-    for kw in KEYWORDS:
-        if kw in texto_low:
-            encontrados.add(kw)
-
-    # 2) Buscamos términos compuestos que puedan ser relevantes
-    # Esta expresión busca secuencias de 2 a 4 palabras que parezcan conceptos.
-    for match in re.finditer(r"\b([a-záéíóúñ]{4,}(?:\s+(?:de|la|el|los|las)\s+)?[a-záéíóúñ]{4,}){1,2}\b", texto_low):
-        token = match.group(1).strip()
-        if token not in ("de", "la", "el", "y", "en", "para", "qué", "cómo", "cuándo"):
-             # Filtro adicional para evitar frases demasiado largas o irrelevantes
-            if len(token.split()) <= 4:
-                encontrados.add(token)
+    return extraer_conceptos_lote([texto])[0]
 
-    # Devuelve una lista única de conceptos encontrados
-    return list(encontrados)
+
+def extraer_conceptos_lote(textos: list[str]) -> list[list[str]]:
+    """
+    Variante por lotes de ``extraer_conceptos``.
+
+    :param textos: Textos a analizar.
+    :return: Conceptos de cada texto, en el mismo orden.
+    """
+    resultados = []
+    for texto, conceptos in zip(textos, _MATCHER_SUBCADENA.buscar_lote(textos)):
+        encontrados = set(conceptos)
+        # Términos compuestos que puedan ser relevantes ("derechos de autor")
+        for match in _COMPUESTO_RE.finditer(texto.lower()):
+            token = match.group(0).strip()
+            if token not in _NO_CONCEPTOS and len(token.split()) <= 4:
+                encontrados.add(token)
+        resultados.append(list(encontrados))
+    return resultados
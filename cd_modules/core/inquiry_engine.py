@@ -1,7 +1,26 @@
 import json
+import math
 import os
-from openai import OpenAI
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+from cd_modules.core.context_packer import pack_context
+from cd_modules.core.disk_cache import DiskCache, hash_key
+from cd_modules.core.lexical_index import normalize
+from cd_modules.core.llm_scheduler import shared_scheduler
 from cd_modules.core.raga_engine import RAGAEngine
+from cd_modules.core.reasoning_tracker import ReasoningTracker, trace
+
+# Instrucciones fijas: van primero y sin datos variables para que el
+# proveedor pueda reutilizar el prefijo del prompt entre llamadas.
+_SUBQUESTION_SYSTEM = """Actúa como un Auditor Jurídico experto en AI Act.
+
+Tu tarea es desglosar una pregunta en sub‑preguntas lógicas para una auditoría, usando el CONTEXTO LEGAL OBLIGATORIO (RAGA) que se te proporciona.
+
+REGLAS:
+1. Las sub‑preguntas deben verificar si se cumple lo que dice el texto legal citado.
+2. No inventes normas. Básate solo en el contexto provisto.
+3. Salida estrictamente en formato JSON: { "questions": ["¿Pregunta 1?", "¿Pregunta 2?"] }"""
 
 
 class InquiryEngine:
@@ -13,23 +32,103 @@ class InquiryEngine:
         max_depth: int = 2,
         max_width: int = 2,
         raga_engine: RAGAEngine | None = None,
+        max_concurrency: int = 4,
+        model: str = "gpt-4o",
+        temperature: float = 0.2,
+        cache_path: str | None = "./subquestion_cache.sqlite",
+        cache_ttl: float | None = 7 * 24 * 3600,
+        cache_max_entries: int | None = 10_000,
+        tracker: ReasoningTracker | None = None,
+        client=None,
+        context_budget: int = 600,
+        similarity_threshold: float | None = None,
+        merge_duplicates: bool = False,
+        relevance_cutoff: float | None = None,
+        prune_unsupported: bool = False,
+        scheduler=None,
+        priority: str = "interactive",
     ) -> None:
         """
         :param topic: Pregunta inicial del usuario.
         :param max_depth: Nivel máximo de profundidad del árbol.
         :param max_width: Número máximo de sub‑preguntas por nodo.
         :param raga_engine: Instancia de ``RAGAEngine`` ya cargada con datos.
+        :param max_concurrency: Número máximo de nodos que se expanden en
+            paralelo en ``generate_concurrent``.
+        :param model: Modelo de OpenAI que desglosa las preguntas.
+        :param temperature: Temperatura de generación.
+        :param cache_path: Fichero SQLite donde se memorizan los desgloses por
+            (pregunta, contexto RAGA, anchura, modelo, temperatura). ``None``
+            desactiva la caché.
+        :param cache_ttl: Segundos de vida de cada desglose memorizado.
+        :param cache_max_entries: Máximo de desgloses memorizados.
+        :param tracker: ``ReasoningTracker`` opcional donde se registran
+            latencia y tokens de cada llamada al LLM.
+        :param client: Cliente compatible con ``OpenAI`` a usar en lugar del
+            creado a partir de ``OPENAI_API_KEY``.
+        :param context_budget: Tokens máximos del contexto legal de cada
+            prompt, tras fusionar y deduplicar los fragmentos recuperados.
+        :param similarity_threshold: Similitud coseno a partir de la cual dos
+            cuestiones se consideran la misma y se expanden una sola vez
+            (el árbol pasa a ser un DAG); p. ej. ``0.92``. Indicarlo activa
+            ``merge_duplicates``. Con ``None`` (por defecto) no se piden
+            embeddings.
+        :param merge_duplicates: Si es ``True``, las cuestiones con texto
+            idéntico (salvo mayúsculas, acentos y espacios) se expanden una
+            sola vez y las que repiten un ancestro se descartan. Por defecto
+            cada sub‑pregunta se expande por separado, como siempre.
+        :param relevance_cutoff: Relevancia que debe alcanzar la mejor
+            evidencia de una cuestión para expandirla: distancia máxima en
+            modo ``"vector"`` y puntuación mínima en ``"lexical"`` e
+            ``"hybrid"``. Indicarla activa la poda. Sin ella solo se poda lo
+            que no tiene ningún resultado, lo que en modo ``"vector"`` no
+            ocurre nunca (la búsqueda siempre devuelve ``k`` fragmentos).
+        :param prune_unsupported: Si es ``True``, las cuestiones sin ninguna
+            evidencia en el corpus (o por debajo de ``relevance_cutoff``)
+            quedan como hojas. Por defecto no se poda y el árbol tiene la
+            forma completa de ``max_depth`` × ``max_width``.
+        :param scheduler: ``LLMScheduler`` por el que pasan las llamadas al
+            LLM; por defecto el compartido del proceso.
+        :param priority: Clase de prioridad de esas llamadas
+            (``"interactive"`` o ``"batch"``).
         """
         self.topic = topic
         self.max_depth = max_depth
         self.max_width = max_width
+        self.max_concurrency = max(1, max_concurrency)
+        self.model = model
+        self.temperature = temperature
+        self.context_budget = context_budget
+        self.similarity_threshold = similarity_threshold
+        self.merge_duplicates = merge_duplicates or similarity_threshold is not None
+        self.relevance_cutoff = relevance_cutoff
+        self.prune_unsupported = prune_unsupported or relevance_cutoff is not None
+        # Resumen de la última expansión: nodos, fusiones, podas y llamadas ahorradas
+        self.stats: dict[str, int] = {}
+        self.cache = (
+            DiskCache(cache_path, ttl=cache_ttl, max_entries=cache_max_entries)
+            if cache_path
+            else None
+        )
         self.tree: dict[str, dict] = {}
+        self.tracker = tracker
+        self.scheduler = scheduler or shared_scheduler()
+        self.priority = priority
         # Si no nos pasan un motor, intentamos inicializar uno por defecto
         self.raga = raga_engine if raga_engine else RAGAEngine()
 
         # Configuración del cliente OpenAI
         api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key) if api_key else None
+        if client is not None:
+            self.client = client
+        else:
+            if api_key:
+                from openai import OpenAI
+
+                # Sin reintentos propios: los gestiona el planificador
+                self.client = OpenAI(api_key=api_key, max_retries=0)
+            else:
+                self.client = None
 
     def _get_raga_context(self, query: str) -> str:
         """
@@ -38,14 +137,12 @@ class InquiryEngine:
         :param query: Pregunta a contrastar con la base legal.
         :return: Cadena con contexto legal formateado.
         """
-        if not self.raga or not self.raga.vector_store:
+        if not self.raga or not self.raga.has_documents:
             return "No hay base de conocimientos cargada. Usa conocimiento general."
 
         results = self.raga.retrieve(query, k=2)  # Recuperamos los 2 fragmentos más relevantes
-        context_str = "\n".join(
-            [f"- (Fuente: {r['source']}): {r['content']}" for r in results]
-        )
-        return context_str
+        # Sin texto repetido entre fragmentos solapados y dentro del presupuesto
+        return pack_context(results, self.context_budget, self.model)
 
     def _generate_subquestions(self, parent_question: str, current_depth: int) -> list[str]:
         """
@@ -54,6 +151,8 @@ class InquiryEngine:
         :param parent_question: Pregunta desde la que se desprenden las sub‑preguntas.
         :param current_depth: Nivel actual en el árbol.
         :return: Lista de sub‑preguntas.
+        :raises LLMUnavailableError: Si el LLM no responde tras los reintentos
+            del planificador.
         """
         if not self.client:
             return ["(Error: Sin API Key)"]
@@ -62,52 +161,343 @@ class InquiryEngine:
         # Antes de preguntar a GPT, le damos la ley.
         contexto_legal = self._get_raga_context(parent_question)
 
-        prompt = f"""
-        Actúa como un Auditor Jurídico experto en AI Act.
-
-        OBJETIVO: Desglosar la pregunta "{parent_question}" en {self.max_width} sub‑preguntas lógicas para una auditoría.
-
-        CONTEXTO LEGAL OBLIGATORIO (RAGA):
-        {contexto_legal}
+        # Mismo padre + mismo contexto legal => mismo desglose: sin llamar al LLM
+        cache_key = hash_key(
+            parent_question,
+            hash_key(contexto_legal),
+            self.max_width,
+            self.model,
+            self.temperature,
+        )
+        if self.cache is not None:
+            stored = self.cache.get(cache_key)
+            if stored is not None:
+                return json.loads(stored)
 
-        REGLAS:
-        1. Las sub‑preguntas deben verificar si se cumple lo que dice el texto legal arriba citado.
-        2. No inventes normas. Básate solo en el contexto provisto.
-        3. Salida estrictamente en formato JSON: {{ "questions": ["¿Pregunta 1?", "¿Pregunta 2?"] }}
-        """
+        # La parte variable va al final, detrás del prefijo fijo
+        prompt = (
+            f"CONTEXTO LEGAL OBLIGATORIO (RAGA):\n{contexto_legal}\n\n"
+            f'OBJETIVO: Desglosar la pregunta "{parent_question}" en '
+            f"{self.max_width} sub‑preguntas lógicas para una auditoría."
+        )
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",  # O gpt-3.5-turbo si prefieres ahorrar
-                messages=[{"role": "user", "content": prompt}],
+        # Los límites de cuota y los reintentos los gestiona el planificador;
+        # si se agotan, el error llega al llamador en lugar de un árbol vacío
+        start = time.perf_counter()
+        with trace(self.tracker, "chat_completion"):
+            response = self.scheduler.chat(
+                self.client,
+                priority=self.priority,
+                model=self.model,  # gpt-4o por defecto; gpt-3.5-turbo si prefieres ahorrar
+                messages=[
+                    {"role": "system", "content": _SUBQUESTION_SYSTEM},
+                    {"role": "user", "content": prompt},
+                ],
                 response_format={"type": "json_object"},
-                temperature=0.2,  # Baja temperatura para mayor rigor
+                temperature=self.temperature,  # Baja temperatura para mayor rigor
             )
-            data = json.loads(response.choices[0].message.content)
-            return data.get("questions", [])
-        except Exception as e:
-            print(f"Error generando subpreguntas: {e}")
+        content = response.choices[0].message.content
+        if self.tracker is not None:
+            self.tracker.record_llm(
+                "subquestions",
+                self.model,
+                _SUBQUESTION_SYSTEM + prompt,
+                content,
+                time.perf_counter() - start,
+            )
+        try:
+            questions = json.loads(content).get("questions", [])
+        except (ValueError, AttributeError) as e:
+            print(f"Error generando subpreguntas: respuesta no válida del LLM ({e})")
             return []
+        if questions and self.cache is not None:
+            self.cache.put(cache_key, json.dumps(questions, ensure_ascii=False).encode("utf-8"))
+        return questions
 
     def build_tree(self, current_node: str, depth: int) -> dict:
         """
-        Construye el árbol de indagación de manera recursiva.
+        Construye el árbol de indagación expandiendo un nodo tras otro.
+
+        Es la versión secuencial de ``build_tree_concurrent``: con
+        ``merge_duplicates`` las cuestiones repetidas (o equivalentes, con
+        ``similarity_threshold``) se expanden una sola vez y, con
+        ``prune_unsupported``, las ramas sin evidencia se podan igual que
+        allí. Sin ninguna de las dos opciones el árbol es el de siempre.
 
         :param current_node: Pregunta actual desde la que generar ramas.
         :param depth: Profundidad actual.
         :return: Diccionario representando las ramas hijas de ``current_node``.
         """
-        if depth >= self.max_depth:
-            return {}
+        tree: dict[str, dict] = {}
+        nodes: dict = {None: tree}
+        for event in self.iter_tree(current_node, max_concurrency=1, start_depth=depth):
+            self.attach_event(nodes, event)
+        return tree[current_node]
+
+    def _expand(self, question: str, depth: int) -> tuple[list[str], str]:
+        """
+        Expande un nodo y devuelve sus sub‑preguntas junto al contexto legal
+        usado para generarlas (que ya está en la caché de RAGA).
+        """
+        subquestions = self._generate_subquestions(question, depth)
+        return subquestions, self._get_raga_context(question)
+
+    def _embed_questions(self, questions: list[str]) -> list[list[float]] | None:
+        """
+        Vectoriza cuestiones para detectar equivalentes; ``None`` si no hay
+        umbral o el modelo de embeddings no está disponible.
+        """
+        if self.similarity_threshold is None or not self.raga or not questions:
+            return None
+        try:
+            return self.raga.embed_queries(questions)
+        except Exception as e:
+            print(f"⚠️ Sin embeddings para fusionar cuestiones: {e}")
+            return None
+
+    def _supported(self, evidence: list[dict]) -> bool:
+        """Indica si la mejor evidencia de una cuestión justifica expandirla."""
+        if not evidence:
+            return False
+        if self.relevance_cutoff is None:
+            return True
+        scores = [float(e["relevance"]) for e in evidence]
+        if self.raga.retrieval_mode == "vector":
+            return min(scores) <= self.relevance_cutoff  # distancia: menor es mejor
+        return max(scores) >= self.relevance_cutoff
+
+    def _subtree_calls(self, depth: int) -> int:
+        """Llamadas al LLM que costaría expandir en árbol un nodo de ``depth``."""
+        return sum(self.max_width ** i for i in range(max(0, self.max_depth - depth)))
+
+    def iter_tree(
+        self,
+        root: str,
+        max_concurrency: int | None = None,
+        start_depth: int = 0,
+    ) -> Iterator[dict]:
+        """
+        Genera el árbol de forma incremental, emitiendo un evento por nodo en
+        cuanto existe.
+
+        Cada expansión (recuperación RAGA + llamada al LLM) es bloqueante de
+        E/S, así que se solapan en un pool de hilos: las hijas de un nodo se
+        lanzan en cuanto se procesa el padre, sin esperar al resto de su
+        nivel. Los resultados se procesan en orden de lanzamiento, no en el
+        que terminan, así que el árbol (y cada fusión) es determinista.
+        Las sub‑preguntas de cada hornada se anclan con una sola llamada a
+        ``retrieve_many``. El primer evento útil llega tras un único viaje
+        al LLM.
+
+        Con ``merge_duplicates`` la expansión es un DAG: una sub‑pregunta
+        con el mismo texto que una cuestión ya conocida (o, con
+        ``similarity_threshold``, una similitud que lo supera) se enlaza a
+        ella en lugar de expandirse otra vez (y se descarta si es un
+        ancestro, para no crear ciclos). Con ``prune_unsupported``, las
+        sub‑preguntas sin evidencia suficiente (ver ``relevance_cutoff``)
+        quedan como hojas. El coste crece así con el número de cuestiones
+        distintas y ``self.stats`` resume fusiones, podas y llamadas al LLM
+        ahorradas. Sin estas opciones se obtiene el árbol completo de
+        ``max_depth`` × ``max_width``.
+
+        Cada evento es un diccionario con ``node_id``, ``parent_id`` (``None``
+        para la raíz), ``parent`` (pregunta padre), ``question``, ``depth``,
+        ``context`` (contexto legal con el que se generó la pregunta),
+        ``merged`` (el nodo ya existía y solo se añade la arista) y
+        ``pruned`` (no se expandirá por falta de evidencia).
+
+        :param root: Pregunta raíz.
+        :param max_concurrency: Tope de expansiones simultáneas. Si es
+            ``None`` se usa ``self.max_concurrency``.
+        :param start_depth: Profundidad de ``root`` dentro del árbol.
+        :return: Iterador de eventos de nodo.
+        """
+        workers = max(1, max_concurrency or self.max_concurrency)
+        self.stats = {"nodes": 1, "expanded": 0, "merged": 0, "pruned": 0, "llm_calls_saved": 0}
+        yield {
+            "node_id": 0,
+            "parent_id": None,
+            "parent": None,
+            "question": root,
+            "depth": start_depth,
+            "context": "",
+            "merged": False,
+            "pruned": False,
+        }
+        if start_depth >= self.max_depth:
+            return
+
+        # Cuestiones conocidas: texto normalizado, embedding y padres de cada nodo
+        questions: list[str] = [root]
+        by_text: dict[str, int] = {normalize(root).strip(): 0}
+        vectors: list[list[float] | None] = [None]
+        parents: dict[int, set[int]] = {0: set()}
+        root_vector = self._embed_questions([root])
+        if root_vector:
+            vectors[0] = root_vector[0]
+
+        def match(question: str, vector: list[float] | None) -> int | None:
+            """Nodo equivalente a ``question``, si lo hay."""
+            if not self.merge_duplicates:
+                return None
+            known = by_text.get(normalize(question).strip())
+            if known is not None or vector is None:
+                return known
+            best, best_id = self.similarity_threshold, None
+            for node_id, other in enumerate(vectors):
+                if other is not None:
+                    similarity = _cosine(vector, other)
+                    if similarity >= best:
+                        best, best_id = similarity, node_id
+            return best_id
+
+        def is_ancestor(node_id: int, of: int) -> bool:
+            """Indica si ``node_id`` es ``of`` o alcanza a ``of`` por alguna rama."""
+            stack, seen = [of], set()
+            while stack:
+                current = stack.pop()
+                if current == node_id:
+                    return True
+                if current not in seen:
+                    seen.add(current)
+                    stack.extend(parents[current])
+            return False
+
+        # future -> (orden de lanzamiento, id del nodo, pregunta, profundidad)
+        pending: dict[Future, tuple[int, int, str, int]] = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending[pool.submit(self._expand, root, start_depth)] = (0, 0, root, start_depth)
+            self.stats["expanded"] += 1
+            try:
+                while pending:
+                    # Las expansiones corren en paralelo, pero se fusionan en orden de
+                    # lanzamiento (el de ``build_tree``): el DAG no depende de cuál
+                    # termine antes
+                    future = min(pending, key=lambda f: pending[f][0])
+                    _, parent_id, parent, depth = pending.pop(future)
+                    subquestions, context = future.result()
+                    saved = self._subtree_calls(depth + 1)
+
+                    # 1. Fusión de cuestiones equivalentes (DAG)
+                    links: list[int] = []
+                    children: list[tuple[int, str]] = []
+                    embedded = self._embed_questions(subquestions) or [None] * len(subquestions)
+                    for sq, vector in zip(subquestions, embedded):
+                        node_id = match(sq, vector)
+                        if node_id is None:
+                            node_id = len(questions)
+                            questions.append(sq)
+                            by_text[normalize(sq).strip()] = node_id
+                            vectors.append(vector)
+                            parents[node_id] = {parent_id}
+                            children.append((node_id, sq))
+                            continue
+                        self.stats["merged"] += 1
+                        self.stats["llm_calls_saved"] += saved
+                        # Un ancestro repetido crearía un ciclo; un hermano
+                        # repetido ya cuelga de este padre
+                        if is_ancestor(node_id, parent_id) or parent_id in parents[node_id]:
+                            continue
+                        parents[node_id].add(parent_id)
+                        links.append(node_id)
+
+                    # 2. Poda por evidencia. Anclamos la hornada con una sola
+                    # petición de embeddings; cada ``_get_raga_context``
+                    # posterior sale de la caché de RAGA
+                    expandable = depth + 1 < self.max_depth
+                    supported = [True] * len(children)
+                    if (
+                        self.prune_unsupported and expandable and children
+                        and self.raga and self.raga.has_documents
+                    ):
+                        evidence = self.raga.retrieve_many([sq for _, sq in children], k=2)
+                        supported = [self._supported(e) for e in evidence]
+
+                    for node_id in links:
+                        yield {
+                            "node_id": node_id,
+                            "parent_id": parent_id,
+                            "parent": parent,
+                            "question": questions[node_id],
+                            "depth": depth + 1,
+                            "context": context,
+                            "merged": True,
+                            "pruned": False,
+                        }
+                    for (node_id, sq), keep in zip(children, supported):
+                        self.stats["nodes"] += 1
+                        pruned = expandable and not keep
+                        if pruned:
+                            self.stats["pruned"] += 1
+                            self.stats["llm_calls_saved"] += saved
+                        yield {
+                            "node_id": node_id,
+                            "parent_id": parent_id,
+                            "parent": parent,
+                            "question": sq,
+                            "depth": depth + 1,
+                            "context": context,
+                            "merged": False,
+                            "pruned": pruned,
+                        }
+                        if expandable and keep:
+                            future = pool.submit(self._expand, sq, depth + 1)
+                            pending[future] = (node_id, node_id, sq, depth + 1)
+                            self.stats["expanded"] += 1
+            finally:
+                # Si el consumidor abandona el iterador, no seguimos gastando LLM
+                for future in pending:
+                    future.cancel()
+
+        print(
+            f"🔀 Indagación: {self.stats['nodes']} cuestiones, {self.stats['merged']} fusionadas, "
+            f"{self.stats['pruned']} podadas, ~{self.stats['llm_calls_saved']} llamadas al LLM ahorradas."
+        )
+
+    def iter_generate(self, max_concurrency: int | None = None) -> Iterator[dict]:
+        """
+        Variante en streaming de ``generate`` con ``self.topic`` como raíz.
 
-        subquestions = self._generate_subquestions(current_node, depth)
-        branches: dict[str, dict] = {}
+        Los eventos se pueden ir aplicando con ``attach_event`` para redibujar
+        el árbol a medida que crece.
+        """
+        print(f"🌳 Iniciando Deliberación RAGA en streaming sobre: {self.topic}")
+        return self.iter_tree(self.topic, max_concurrency)
 
-        for sq in subquestions:
-            # Recursividad: Para cada sub‑pregunta, profundizamos
-            branches[sq] = self.build_tree(sq, depth + 1)
+    @staticmethod
+    def attach_event(nodes: dict, event: dict) -> None:
+        """
+        Cuelga el nodo de ``event`` en el árbol en construcción.
 
-        return branches
+        Un nodo fusionado (``merged``) comparte el mismo diccionario de ramas
+        bajo todos sus padres, de modo que el resultado es un DAG.
+
+        :param nodes: Mapa ``node_id -> diccionario de ramas``. La clave
+            ``None`` debe apuntar al diccionario raíz del árbol.
+        :param event: Evento emitido por ``iter_tree``/``iter_generate``.
+        """
+        branches = nodes[event["parent_id"]]
+        branches[event["question"]] = nodes.setdefault(event["node_id"], {})
+
+    def build_tree_concurrent(self, root: str, max_concurrency: int | None = None) -> dict:
+        """
+        Construye el árbol expandiendo los nodos en paralelo.
+
+        Consume ``iter_tree``; como cada nodo se cuelga de su padre en el
+        orden en que el LLM devolvió las sub‑preguntas, el diccionario es
+        determinista e idéntico en forma al de ``build_tree``. Las
+        cuestiones fusionadas comparten su diccionario de ramas.
+
+        :param root: Pregunta raíz desde la que generar ramas.
+        :param max_concurrency: Tope de expansiones simultáneas. Si es
+            ``None`` se usa ``self.max_concurrency``.
+        :return: Diccionario representando las ramas hijas de ``root``.
+        """
+        tree: dict[str, dict] = {}
+        nodes: dict = {None: tree}
+        for event in self.iter_tree(root, max_concurrency):
+            self.attach_event(nodes, event)
+        return tree[root]
 
     def generate(self) -> dict:
         """
@@ -118,3 +508,21 @@ class InquiryEngine:
         print(f"🌳 Iniciando Deliberación RAGA sobre: {self.topic}")
         self.tree = {self.topic: self.build_tree(self.topic, 0)}
         return self.tree
+
+    def generate_concurrent(self, max_concurrency: int | None = None) -> dict:
+        """
+        Variante concurrente de ``generate``: expande los nodos en paralelo.
+
+        :param max_concurrency: Tope de llamadas simultáneas al LLM.
+        :return: Árbol de deliberación completo con ``self.topic`` como raíz.
+        """
+        print(f"🌳 Iniciando Deliberación RAGA concurrente sobre: {self.topic}")
+        self.tree = {self.topic: self.build_tree_concurrent(self.topic, max_concurrency)}
+        return self.tree
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    """Similitud coseno entre dos vectores."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
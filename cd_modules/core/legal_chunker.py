@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import bisect
+import re
+
+# Encabezados estructurales al principio de una línea. En mayúsculas se
+# acepta cualquier rótulo detrás ("CAPÍTULO II Prácticas prohibidas"); en
+# minúsculas el numeral debe cerrar la línea o ir seguido de punto, para no
+# confundir un encabezado con una cita partida por el ajuste de línea
+# ("... de conformidad con el\nartículo 12 apartado 2").
+_HEADING_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:T[ÍI]TULO|CAP[ÍI]TULO|SECCI[ÓO]N|ANEXO)\s+[IVXLCDM\d]+\b[^\n]*"
+    r"|(?:Título|Capítulo|Sección|Anexo)\s+[IVXLCDM\d]+[ \t]*(?:\.[^\n]*)?$"
+    r"|Art[íi]culo\s+\d+(?:\s+(?:bis|ter|quater))?[ \t]*(?:\.[^\n]*)?$"
+    r"|Disposici[óo]n\s+(?:adicional|transitoria|derogatoria|final)[^\n]*"
+    r")",
+    re.MULTILINE,
+)
+# Niveles que solo agrupan: se anteponen al primer artículo que contienen
+_GROUPING_RE = re.compile(r"^\s*(?:t[íi]tulo|cap[íi]tulo|secci[óo]n)\b", re.IGNORECASE)
+_PARAGRAPH_RE = re.compile(r"\n(?=\s*(?:\d+\.|[a-z]\)|\n))")
+
+
+def _split_long(text: str, chunk_size: int) -> list[tuple[int, str]]:
+    """
+    Parte un bloque demasiado largo por apartados ("1.", "a)") y, si un
+    apartado no cabe, por espacios. Devuelve ``(desplazamiento, texto)``.
+    """
+    cuts = [0] + [m.end() for m in _PARAGRAPH_RE.finditer(text)] + [len(text)]
+    spans: list[tuple[int, int]] = []
+    for a, b in zip(cuts, cuts[1:]):
+        while b - a > chunk_size:
+            cut = text.rfind(" ", a + 1, a + chunk_size)
+            if cut <= a:
+                cut = a + chunk_size
+            spans.append((a, cut))
+            a = cut
+        spans.append((a, b))
+
+    # Se agrupan apartados consecutivos mientras quepan en ``chunk_size``
+    pieces: list[tuple[int, int]] = []
+    start, end = spans[0]
+    for a, b in spans[1:]:
+        if b - start <= chunk_size:
+            end = b
+        else:
+            pieces.append((start, end))
+            start, end = a, b
+    pieces.append((start, end))
+    return [(a, text[a:b].strip()) for a, b in pieces if text[a:b].strip()]
+
+
+def split_legal(
+    pages: list[str],
+    source: str,
+    chunk_size: int = 1200,
+    min_chunk_size: int = 200,
+) -> list[tuple[str, dict]]:
+    """
+    Trocea una norma siguiendo su estructura de Títulos, Capítulos,
+    Artículos y Anexos.
+
+    Cada artículo (o anexo, disposición…) es un fragmento. Los encabezados
+    de Título/Capítulo/Sección se anteponen al primer artículo que abren y
+    los bloques menores de ``min_chunk_size`` se unen al siguiente. Un
+    artículo más largo que ``chunk_size`` se parte por apartados y cada
+    continuación repite solo su encabezado, en lugar del solapamiento fijo
+    de caracteres del divisor recursivo.
+
+    :param pages: Texto de cada página.
+    :param source: Ruta del documento, para los metadatos.
+    :param chunk_size: Tamaño máximo orientativo de cada fragmento.
+    :param min_chunk_size: Tamaño por debajo del cual un bloque se fusiona.
+    :return: Lista de ``(texto, metadatos)`` con ``source``, ``page`` y
+        ``section`` (encabezado del artículo o anexo).
+    """
+    offsets = []
+    position = 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 1
+    text = "\n".join(pages)
+
+    def page_at(offset: int) -> int:
+        return bisect.bisect_right(offsets, offset) - 1
+
+    bounds = [m.start() for m in _HEADING_RE.finditer(text)]
+    if not bounds or bounds[0] != 0:
+        bounds.insert(0, 0)
+    bounds.append(len(text))
+
+    # 1. Bloques estructurales; los agrupadores y los muy cortos se
+    #    arrastran al siguiente bloque
+    blocks: list[tuple[int, str]] = []
+    carry_start = None
+    for start, end in zip(bounds, bounds[1:]):
+        block = text[start:end].strip()
+        if not block:
+            continue
+        block_start = start if carry_start is None else carry_start
+        if _GROUPING_RE.match(block) or len(block) < min_chunk_size:
+            carry_start = block_start
+            continue
+        blocks.append((block_start, text[block_start:end].strip()))
+        carry_start = None
+    if carry_start is not None:
+        tail = text[carry_start:].strip()
+        if blocks and len(tail) < min_chunk_size:
+            start, previous = blocks.pop()
+            blocks.append((start, f"{previous}\n{tail}"))
+        elif tail:
+            blocks.append((carry_start, tail))
+
+    # 2. Fragmentos, partiendo los bloques demasiado largos
+    chunks: list[tuple[str, dict]] = []
+    for start, block in blocks:
+        headings = [m.group(0).strip() for m in _HEADING_RE.finditer(block)]
+        # El primer artículo/anexo da nombre al fragmento; si solo hay
+        # agrupadores, el más interno
+        units = [h for h in headings if not _GROUPING_RE.match(h)]
+        section = units[0] if units else (headings[-1] if headings else "")
+        if len(block) <= chunk_size:
+            chunks.append((block, {"source": source, "page": page_at(start), "section": section}))
+            continue
+        for i, (offset, piece) in enumerate(_split_long(block, chunk_size)):
+            if i and section and not piece.startswith(section):
+                piece = f"{section}\n{piece}"
+            chunks.append((
+                piece,
+                {"source": source, "page": page_at(start + offset), "section": section},
+            ))
+    return chunks
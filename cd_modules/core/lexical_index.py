@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from cd_modules.core.extractor_conceptual import MATCHER, ConceptMatcher
+
+# Palabras vacías del español (sin tildes, tras normalizar)
+STOPWORDS = frozenset(
+    """
+    a al algo algun alguna algunas alguno algunos ante antes aquel aquella
+    aquellas aquello aquellos aqui asi aun cada como con contra cual cuales
+    cuando de del desde donde dos el ella ellas ello ellos en entre era eran
+    es esa esas ese eso esos esta estan estas este esto estos fue fueron ha
+    han hasta hay la las le les lo los mas me mi mismo muy ni no nos o os
+    otra otras otro otros para pero poco por porque que quien quienes se
+    segun ser si sin sobre son su sus tal tambien tan te tiene tienen todo
+    todos tu un una unas uno unos y ya dice dicen
+    """.split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Referencias del tipo "Artículo 5", "art. 6", "Anexo III"
+_REFERENCE_RE = re.compile(
+    r"\b(art[ií]culos?|arts?\.|anexos?)\s+(\d+|[ivxlc]+)\b", re.IGNORECASE
+)
+# Encabezado que abre un artículo/anexo al principio de una línea
+_HEADING_RE = re.compile(
+    r"^\s*(art[ií]culo|anexo)\s+(\d+|[ivxlc]+)\b", re.IGNORECASE | re.MULTILINE
+)
+# Multiplicador BM25 por cada concepto de la consulta presente en el fragmento
+_CONCEPT_BOOST = 0.25
+
+
+def normalize(text: str) -> str:
+    """Pasa a minúsculas y elimina tildes (``"Artículo"`` -> ``"articulo"``)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stem(token: str) -> str:
+    """Stemming mínimo: reduce plurales regulares (``sistemas`` -> ``sistema``)."""
+    if len(token) > 5 and token.endswith("es") and token[-3] not in "aeiou":
+        return token[:-2]
+    if len(token) > 4 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Tokenizador para textos jurídicos en español.
+
+    Normaliza tildes, descarta palabras vacías y aplica un stemming ligero
+    de plurales para que "sistemas de categorización biométrica" case con
+    "sistema de categorizacion biometrica".
+    """
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall(normalize(text))
+        if token not in STOPWORDS
+    ]
+
+
+def _reference_key(kind: str, number: str) -> str:
+    kind = normalize(kind)
+    prefix = "anexo" if kind.startswith("anexo") else "articulo"
+    return f"{prefix} {number.lower()}"
+
+
+def extract_references(text: str) -> list[str]:
+    """
+    Extrae las referencias normalizadas (``"articulo 5"``, ``"anexo iii"``)
+    que aparecen en ``text``, sin duplicados y en orden.
+    """
+    return list(dict.fromkeys(
+        _reference_key(kind, number) for kind, number in _REFERENCE_RE.findall(text)
+    ))
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 sobre los fragmentos ingeridos, con tabla de
+    búsqueda exacta de artículos y anexos.
+
+    No necesita embeddings: las consultas léxicas se resuelven recorriendo
+    solo las listas de los términos de la consulta.
+    """
+
+    FILE_NAME = "lexical_index.json"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, matcher: ConceptMatcher | None = None) -> None:
+        """
+        :param k1: Saturación de la frecuencia del término (BM25).
+        :param b: Peso de la normalización por longitud (BM25).
+        :param matcher: Vocabulario de conceptos a indexar; por defecto
+            ``extractor_conceptual.MATCHER``.
+        """
+        self.k1 = k1
+        self.b = b
+        self.matcher = matcher or MATCHER
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self.doc_lengths: list[int] = []
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        # referencia -> fragmentos donde el artículo/anexo empieza
+        self.headings: dict[str, list[int]] = defaultdict(list)
+        # referencia -> fragmentos que solo lo mencionan
+        self.mentions: dict[str, list[int]] = defaultdict(list)
+        # concepto -> fragmentos que lo contienen
+        self.concepts: dict[str, list[int]] = defaultdict(list)
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, texts: list[str], metadatas: list[dict]) -> None:
+        """
+        Indexa un lote de fragmentos.
+
+        :param texts: Contenido de cada fragmento.
+        :param metadatas: Metadatos de cada fragmento.
+        """
+        self._add_concepts(len(self.texts), texts)
+        for text, metadata in zip(texts, metadatas):
+            doc_id = len(self.texts)
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+            tokens = tokenize(text)
+            self.doc_lengths.append(len(tokens))
+            self._total_length += len(tokens)
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc_id, tf))
+
+            heading_refs = {
+                _reference_key(kind, number) for kind, number in _HEADING_RE.findall(text)
+            }
+            for ref in heading_refs:
+                self.headings[ref].append(doc_id)
+            for ref in extract_references(text):
+                if ref not in heading_refs:
+                    self.mentions[ref].append(doc_id)
+
+    def _add_concepts(self, first_id: int, texts: list[str]) -> None:
+        """Indexa los conceptos de un lote con una sola pasada del buscador."""
+        for doc_id, concepts in enumerate(self.matcher.buscar_lote(texts), start=first_id):
+            for concept in concepts:
+                self.concepts[concept].append(doc_id)
+
+    def concept_ids(self, concepts: list[str]) -> set[int]:
+        """
+        Fragmentos que contienen alguno de los ``concepts``.
+
+        :param concepts: Conceptos del vocabulario (en minúsculas).
+        :return: Identificadores de fragmento.
+        """
+        return {doc_id for concept in concepts for doc_id in self.concepts.get(concept.lower(), ())}
+
+    def concept_counts(self) -> dict[str, int]:
+        """Número de fragmentos por concepto."""
+        return {concept: len(ids) for concept, ids in self.concepts.items()}
+
+    def lookup_references(self, query: str, k: int = 3) -> list[tuple[str, dict, float]]:
+        """
+        Vía rápida para consultas como "¿Qué dice el Artículo 5?".
+
+        Devuelve primero los fragmentos donde empieza el artículo/anexo
+        citado y después los que solo lo mencionan.
+
+        :return: Lista de ``(contenido, metadatos, puntuación)``; vacía si la
+            consulta no cita ningún artículo o anexo conocido.
+        """
+        hits: list[int] = []
+        for ref in extract_references(query):
+            hits.extend(self.headings.get(ref, []))
+        for ref in extract_references(query):
+            hits.extend(self.mentions.get(ref, []))
+        hits = list(dict.fromkeys(hits))[:k]
+        return [
+            (self.texts[i], self.metadatas[i], 1.0 / (rank + 1))
+            for rank, i in enumerate(hits)
+        ]
+
+    def search_ids(
+        self, query: str, k: int = 3, candidates: set[int] | None = None
+    ) -> list[tuple[int, float]]:
+        """
+        Puntuación BM25 de la consulta.
+
+        Los fragmentos que comparten conceptos con la consulta (ver
+        ``extractor_conceptual``) reciben un refuerzo proporcional.
+
+        :param candidates: Si se indica, solo se puntúan estos fragmentos.
+        :return: Lista de ``(id_fragmento, puntuación)`` de mayor a menor.
+        """
+        if not self.texts:
+            return []
+        n_docs = len(self.texts)
+        avgdl = self._total_length / n_docs or 1.0
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avgdl)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        shared: Counter = Counter()
+        for concept in self.matcher.buscar(query):
+            shared.update(self.concepts.get(concept, ()))
+        for doc_id, count in shared.items():
+            if doc_id in scores:
+                scores[doc_id] *= 1 + _CONCEPT_BOOST * count
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def search(self, query: str, k: int = 3) -> list[tuple[str, dict, float]]:
+        """
+        Búsqueda léxica: primero la vía rápida de artículos y, si la consulta
+        no cita ninguno, BM25.
+
+        :return: Lista de ``(contenido, metadatos, puntuación)``.
+        """
+        references = self.lookup_references(query, k)
+        if references:
+            return references
+        return [
+            (self.texts[i], self.metadatas[i], score)
+            for i, score in self.search_ids(query, k)
+        ]
+
+    def save(self, directory: str) -> None:
+        """Persiste el índice como JSON dentro de ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+            "headings": self.headings,
+            "mentions": self.mentions,
+            "concept_terms": self.matcher.terminos,
+            "concept_mode": self.matcher.modo,
+            "concepts": self.concepts,
+        }
+        with open(os.path.join(directory, self.FILE_NAME), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        """Indica si ``directory`` contiene un índice léxico persistido."""
+        return os.path.exists(os.path.join(directory, cls.FILE_NAME))
+
+    @classmethod
+    def load(cls, directory: str, matcher: ConceptMatcher | None = None) -> "LexicalIndex":
+        """
+        Carga un índice léxico persistido con ``save``.
+
+        Si el índice es anterior al índice de conceptos o se guardó con otro
+        vocabulario o modo de búsqueda, los conceptos se recalculan a partir
+        de los textos.
+        """
+        with open(os.path.join(directory, cls.FILE_NAME), encoding="utf-8") as f:
+            payload = json.load(f)
+        index = cls(k1=payload["k1"], b=payload["b"], matcher=matcher)
+        index.texts = payload["texts"]
+        index.metadatas = payload["metadatas"]
+        index.doc_lengths = payload["doc_lengths"]
+        index._total_length = sum(index.doc_lengths)
+        index.postings.update(
+            {term: [tuple(p) for p in plist] for term, plist in payload["postings"].items()}
+        )
+        index.headings.update(payload["headings"])
+        index.mentions.update(payload["mentions"])
+        if (
+            payload.get("concept_terms") == index.matcher.terminos
+            and payload.get("concept_mode") == index.matcher.modo
+        ):
+            index.concepts.update(payload["concepts"])
+        else:
+            index._add_concepts(0, index.texts)
+        return index
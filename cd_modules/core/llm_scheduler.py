@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from cd_modules.core.disk_cache import hash_key
+from cd_modules.core.reasoning_tracker import count_tokens
+
+# Clases de prioridad: lo que espera un usuario pasa antes que los lotes
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Límites (peticiones, tokens) por minuto de cada recurso. Los valores por
+# defecto son los de una organización de nivel 1 de OpenAI para ``gpt-4o``
+# y ``text-embedding-3-small``; se ajustan con variables de entorno.
+DEFAULT_LIMITS = {
+    "chat": (
+        int(os.getenv("OPENAI_RPM", "500")),
+        int(os.getenv("OPENAI_TPM", "30000")),
+    ),
+    "embedding": (
+        int(os.getenv("OPENAI_EMBEDDING_RPM", "3000")),
+        int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000")),
+    ),
+}
+# Tokens de respuesta que se reservan cuando la petición no fija ``max_tokens``
+_COMPLETION_ESTIMATE = 256
+# Códigos HTTP y excepciones que merecen reintento
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRY_ERRORS = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "InternalServerError", "ServiceUnavailableError",
+}
+
+
+class LLMUnavailableError(RuntimeError):
+    """El servicio no respondió tras agotar los reintentos."""
+
+
+class TokenBucket:
+    """
+    Cubo de tokens que se rellena a ``per_minute / 60`` unidades por segundo.
+
+    Admite ráfagas de ``burst`` segundos de cuota: el proveedor aplica los
+    límites por minuto en ventanas más cortas. Una petición mayor que la
+    capacidad se trata como si la ocupara entera, para que no espere para
+    siempre.
+    """
+
+    def __init__(self, per_minute: float, burst: float = 60.0) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya ``amount`` unidades (0 si ya las hay)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        """Devuelve (o, si es negativo, cobra) unidades tras conocer el consumo real."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Job:
+    __slots__ = ("fn", "tokens", "priority", "resource", "key", "future", "attempts")
+
+    def __init__(self, fn, tokens, priority, resource, key, future) -> None:
+        self.fn = fn
+        self.tokens = tokens
+        self.priority = priority
+        self.resource = resource
+        self.key = key
+        self.future = future
+        self.attempts = 0
+
+
+def _retry_info(exc: Exception) -> tuple[bool, bool, float | None]:
+    """
+    Clasifica un error del proveedor sin importar ``openai``.
+
+    :return: ``(reintentable, límite de cuota, segundos de Retry-After)``.
+    """
+    status = getattr(exc, "status_code", None)
+    name = type(exc).__name__
+    rate_limited = status == 429 or name == "RateLimitError"
+    retry = (
+        rate_limited
+        or status in _RETRY_STATUS
+        or name in _RETRY_ERRORS
+        or isinstance(exc, (ConnectionError, TimeoutError))
+    )
+    retry_after = None
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        retry_after = float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        retry_after = None
+    return retry, rate_limited, retry_after
+
+
+def _used_tokens(result) -> int | None:
+    """Tokens consumidos según el ``usage`` de la respuesta, si lo trae."""
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        return None
+    prompt = getattr(usage, "prompt_tokens", None)
+    if prompt is None:
+        return None
+    return prompt + (getattr(usage, "completion_tokens", None) or 0)
+
+
+class LLMScheduler:
+    """
+    Planificador compartido de llamadas a OpenAI.
+
+    Todas las peticiones de chat y embeddings pasan por una cola con
+    prioridad (``"interactive"`` antes que ``"batch"``) y un hilo despachador
+    que solo las lanza cuando los cubos de peticiones y tokens por minuto
+    del recurso lo permiten; los tokens se estiman con ``tiktoken`` y se
+    corrigen con el ``usage`` real de la respuesta. Las peticiones idénticas
+    que coinciden en vuelo comparten una sola llamada. Los errores
+    transitorios (429, 5xx, timeouts) se reintentan con espera exponencial
+    y *jitter*, respetando ``Retry-After``; un 429 además pausa el recurso.
+    Si se agotan los reintentos la llamada falla con ``LLMUnavailableError``:
+    nunca se devuelve un resultado inventado.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, tuple[float, float]] | None = None,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        burst: float = 10.0,
+    ) -> None:
+        """
+        :param limits: ``{recurso: (peticiones/min, tokens/min)}``. Los recursos
+            ausentes no se limitan; ``{}`` desactiva los límites (p. ej. con
+            los sustitutos locales de los benchmarks).
+        :param max_concurrency: Llamadas simultáneas como máximo.
+        :param max_retries: Reintentos por llamada antes de rendirse.
+        :param base_delay: Espera del primer reintento, en segundos.
+        :param max_delay: Espera máxima entre reintentos.
+        :param burst: Segundos de cuota que se pueden gastar de golpe.
+        """
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {
+            resource: (TokenBucket(rpm, burst), TokenBucket(tpm, burst))
+            for resource, (rpm, tpm) in self.limits.items()
+        }
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._queue: list[tuple[int, int, _Job]] = []
+        self._delayed: list[tuple[float, int, _Job]] = []  # reintentos pendientes
+        self._inflight: dict[str, Future] = {}
+        self._paused: dict[str, float] = {}  # recurso -> instante de reanudación tras un 429
+        self._running = 0
+        self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="llm")
+        self._dispatcher: threading.Thread | None = None
+        self._stats = {
+            "submitted": 0, "coalesced": 0, "completed": 0,
+            "retried": 0, "failed": 0, "throttled_s": 0.0,
+        }
+
+    # --- API pública ------------------------------------------------------
+
+    def submit(
+        self,
+        fn: Callable[[], object],
+        tokens: int = 0,
+        priority: str = "interactive",
+        resource: str = "chat",
+        key: str | None = None,
+    ) -> Future:
+        """
+        Encola una llamada.
+
+        :param fn: Función sin argumentos que hace la petición.
+        :param tokens: Tokens estimados que consume.
+        :param priority: ``"interactive"`` o ``"batch"``.
+        :param resource: Recurso cuyos límites se aplican (``"chat"``, ``"embedding"``).
+        :param key: Identidad de la petición; otra igual en vuelo comparte su resultado.
+        :return: ``Future`` con el resultado de ``fn``.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridad desconocida: {priority!r}. Usa una de {sorted(PRIORITIES)}.")
+        with self._cond:
+            if key is not None:
+                future = self._inflight.get(key)
+                if future is not None:
+                    self._stats["coalesced"] += 1
+                    return future
+            future = Future()
+            if key is not None:
+                self._inflight[key] = future
+            job = _Job(fn, tokens, PRIORITIES[priority], resource, key, future)
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+            self._stats["submitted"] += 1
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch, name="llm-scheduler", daemon=True
+                )
+                self._dispatcher.start()
+            self._cond.notify_all()
+        return future
+
+    def call(self, fn: Callable[[], object], **kwargs):
+        """``submit`` y espera el resultado (mismos parámetros)."""
+        return self.submit(fn, **kwargs).result()
+
+    def chat(self, client, priority: str = "interactive", **request):
+        """
+        ``client.chat.completions.create(**request)`` a través del planificador.
+
+        :param client: Cliente compatible con ``OpenAI``.
+        :param priority: Clase de prioridad.
+        :param request: Argumentos de ``create`` (``model``, ``messages``…).
+        :return: Respuesta del cliente.
+        """
+        tokens = 0
+        if "chat" in self._buckets:
+            model = request.get("model", "gpt-4o")
+            tokens = sum(count_tokens(m.get("content") or "", model) for m in request.get("messages", ()))
+            tokens += request.get("max_tokens") or _COMPLETION_ESTIMATE
+        key = hash_key(id(client), json.dumps(request, sort_keys=True, ensure_ascii=False, default=str))
+        return self.call(
+            lambda: client.chat.completions.create(**request),
+            tokens=tokens, priority=priority, resource="chat", key=key,
+        )
+
+    def embed(self, method: Callable, texts, model: str, priority: str = "interactive"):
+        """
+        ``method(texts)`` (``embed_documents`` o ``embed_query``) a través del
+        planificador, con los límites del recurso ``"embedding"``.
+        """
+        batch = texts if isinstance(texts, list) else [texts]
+        tokens = 0
+        if "embedding" in self._buckets:
+            tokens = sum(count_tokens(t, model) for t in batch)
+        owner = getattr(method, "__self__", method)
+        key = hash_key(id(owner), getattr(method, "__name__", ""), model, *batch)
+        return self.call(
+            lambda: method(texts),
+            tokens=tokens, priority=priority, resource="embedding", key=key,
+        )
+
+    def stats(self) -> dict:
+        """Contadores: encoladas, fusionadas, completadas, reintentos, fallos y espera por límites."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._queue) + len(self._delayed)
+            stats["running"] = self._running
+        stats["throttled_s"] = round(stats["throttled_s"], 3)
+        return stats
+
+    # --- Despacho ---------------------------------------------------------
+
+    def _wait_for(self, job: _Job, now: float) -> float:
+        """Segundos que ``job`` debe esperar por los límites de su recurso."""
+        wait = self._paused.get(job.resource, 0.0) - now
+        buckets = self._buckets.get(job.resource)
+        if buckets is not None:
+            requests, tokens = buckets
+            wait = max(wait, requests.delay(1, now), tokens.delay(job.tokens, now))
+        return max(0.0, wait)
+
+    def _next_job(self, now: float) -> tuple[_Job | None, float | None]:
+        """
+        Elige la siguiente llamada lista: la de mayor prioridad de cada
+        recurso, siempre que sus límites lo permitan. Una llamada de menor
+        prioridad no adelanta a otra del mismo recurso que está esperando.
+
+        :return: ``(llamada, None)`` o ``(None, segundos hasta reintentar)``.
+        """
+        blocked: set[str] = set()
+        shortest = None
+        for entry in sorted(self._queue):
+            job = entry[2]
+            if job.resource in blocked:
+                continue
+            wait = self._wait_for(job, now)
+            if wait <= 0:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                return job, None
+            blocked.add(job.resource)
+            shortest = wait if shortest is None else min(shortest, wait)
+        return None, shortest
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, job = heapq.heappop(self._delayed)
+                    heapq.heappush(self._queue, (job.priority, seq, job))
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                if not self._queue or self._running >= self.max_concurrency:
+                    self._cond.wait(timeout)
+                    continue
+                job, wait = self._next_job(now)
+                if job is None:
+                    if timeout is not None:
+                        wait = min(wait, timeout)
+                    self._cond.wait(wait)
+                    self._stats["throttled_s"] += time.monotonic() - now
+                    continue
+                # Cancelada por quien la pidió: no se gasta cuota en ella
+                if job.attempts == 0 and not job.future.set_running_or_notify_cancel():
+                    self._forget(job)
+                    continue
+                buckets = self._buckets.get(job.resource)
+                if buckets is not None:
+                    buckets[0].take(1, now)
+                    buckets[1].take(job.tokens, now)
+                self._running += 1
+            self._pool.submit(self._run, job)
+
+    def _forget(self, job: _Job) -> None:
+        if job.key is not None and self._inflight.get(job.key) is job.future:
+            del self._inflight[job.key]
+
+    def _run(self, job: _Job) -> None:
+        try:
+            result = job.fn()
+        except Exception as exc:
+            retry, rate_limited, retry_after = _retry_info(exc)
+            with self._cond:
+                self._running -= 1
+                if retry and job.attempts < self.max_retries:
+                    # Espera exponencial con jitter: los reintentos no llegan en bloque
+                    delay = retry_after
+                    if delay is None:
+                        delay = min(self.max_delay, self.base_delay * 2 ** job.attempts)
+                        delay *= random.uniform(0.5, 1.0)
+                    job.attempts += 1
+                    ready = time.monotonic() + delay
+                    if rate_limited:
+                        self._paused[job.resource] = max(self._paused.get(job.resource, 0.0), ready)
+                    heapq.heappush(self._delayed, (ready, next(self._seq), job))
+                    self._stats["retried"] += 1
+                    self._cond.notify_all()
+                    return
+                self._forget(job)
+                self._stats["failed"] += 1
+                self._cond.notify_all()
+            if retry:
+                error = LLMUnavailableError(
+                    f"Sin respuesta de OpenAI tras {job.attempts + 1} intentos: {exc}"
+                )
+                error.__cause__ = exc
+                job.future.set_exception(error)
+            else:
+                job.future.set_exception(exc)
+            return
+
+        with self._cond:
+            self._running -= 1
+            self._forget(job)
+            self._stats["completed"] += 1
+            used = _used_tokens(result)
+            buckets = self._buckets.get(job.resource)
+            if used is not None and buckets is not None:
+                buckets[1].give(job.tokens - used)
+            self._cond.notify_all()
+        job.future.set_result(result)
+
+
+class ScheduledEmbeddings:
+    """Envoltorio de embeddings cuyas peticiones pasan por un ``LLMScheduler``."""
+
+    def __init__(self, embeddings, scheduler: LLMScheduler, model: str, priority: str = "interactive") -> None:
+        """
+        :param embeddings: Implementación real (p. ej. ``OpenAIEmbeddings``).
+        :param scheduler: Planificador compartido.
+        :param model: Modelo de embeddings, para estimar tokens.
+        :param priority: Clase de prioridad de las peticiones.
+        """
+        self.embeddings = embeddings
+        self.scheduler = scheduler
+        self.model = model
+        self.priority = priority
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.scheduler.embed(self.embeddings.embed_documents, texts, self.model, self.priority)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.scheduler.embed(self.embeddings.embed_query, text, self.model, self.priority)
+
+
+_shared_lock = threading.Lock()
+_shared_scheduler: LLMScheduler | None = None
+
+
+def shared_scheduler() -> LLMScheduler:
+    """Planificador único del proceso, con ``DEFAULT_LIMITS``."""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = LLMScheduler()
+        return _shared_scheduler
+
+
+def configure_shared_scheduler(**kwargs) -> LLMScheduler:
+    """
+    Sustituye el planificador del proceso (p. ej. para repartir la cuota
+    entre varios procesos). Conviene llamarla antes de crear los motores:
+    los ya creados conservan el anterior.
+
+    :param kwargs: Parámetros de ``LLMScheduler``.
+    :return: El nuevo planificador compartido.
+    """
+    global _shared_scheduler
+    with _shared_lock:
+        _shared_scheduler = LLMScheduler(**kwargs)
+        return _shared_scheduler
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """Caché LRU acotada y segura entre hilos, con contadores de aciertos."""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        """
+        :param maxsize: Número máximo de entradas antes de desalojar la
+            menos usada recientemente.
+        """
+        self.maxsize = max(1, maxsize)
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Devuelve el valor asociado a ``key`` y lo marca como reciente.
+
+        :param key: Clave a consultar.
+        :param default: Valor devuelto si la clave no está en la caché.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Inserta o actualiza ``key`` desalojando la entrada más antigua si hace falta."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Vacía la caché (los contadores se conservan)."""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        """Devuelve aciertos, fallos y ocupación actual."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+# Filas de una matriz compacta que se pasan a float32 de una vez al puntuar
+_SCORE_BLOCK = 8192
+
+
+class NumpyVectorStore:
+    """
+    Índice vectorial en memoria basado en NumPy, alternativa ligera a Chroma.
+
+    Los embeddings se normalizan y se guardan en una matriz contigua
+    (``vectors.npy``) que se abre con ``mmap`` al cargar. La búsqueda es un
+    producto escalar vectorizado seguido de ``argpartition``. Las puntuaciones
+    se devuelven como distancia L2 al cuadrado (``2 - 2·coseno``), la misma
+    escala que usa Chroma por defecto, para que ``relevance`` sea comparable
+    entre backends.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    SCALES_FILE = "scales.npy"
+    DOCUMENTS_FILE = "documents.jsonl"
+    META_FILE = "store.json"
+
+    def __init__(self, directory: str, dtype: str = "float32") -> None:
+        """
+        :param directory: Carpeta donde se persiste el índice.
+        :param dtype: Precisión de almacenamiento: ``float32``, ``float16`` o
+            ``int8`` (cuantización simétrica con una escala por fila).
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype no soportado: {dtype}. Usa uno de {SUPPORTED_DTYPES}")
+        self.directory = directory
+        self.dtype = dtype
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self._matrix: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+        # Lotes añadidos aún no concatenados en ``_matrix``
+        self._pending: list[tuple[np.ndarray, np.ndarray | None]] = []
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        """Indica si ``directory`` contiene un índice NumPy persistido."""
+        return os.path.exists(os.path.join(directory, cls.META_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> "NumpyVectorStore":
+        """
+        Abre un índice persistido; la matriz se mapea en memoria (solo lectura).
+
+        :param directory: Carpeta con el índice.
+        :return: Instancia lista para buscar.
+        """
+        with open(os.path.join(directory, cls.META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(directory, dtype=meta["dtype"])
+        store._matrix = np.load(os.path.join(directory, cls.VECTORS_FILE), mmap_mode="r")
+        if store.dtype == "int8":
+            store._scales = np.load(os.path.join(directory, cls.SCALES_FILE), mmap_mode="r")
+        with open(os.path.join(directory, cls.DOCUMENTS_FILE), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                store.texts.append(record["content"])
+                store.metadatas.append(record["metadata"])
+        return store
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+        """Normaliza y convierte un lote a la precisión de almacenamiento."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        if self.dtype == "float32":
+            return vectors.astype(np.float32), None
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales
+
+    def add(self, texts: list[str], metadatas: list[dict], vectors: list[list[float]]) -> None:
+        """
+        Añade un lote de fragmentos ya vectorizados.
+
+        :param texts: Contenido de cada fragmento.
+        :param metadatas: Metadatos de cada fragmento.
+        :param vectors: Embeddings en el mismo orden que ``texts``.
+        """
+        if not texts:
+            return
+        encoded, scales = self._encode(np.asarray(vectors, dtype=np.float32))
+        self._pending.append((encoded, scales))
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+
+    def _consolidate(self) -> None:
+        """Concatena los lotes pendientes en una única matriz contigua."""
+        if not self._pending:
+            return
+        blocks = [b for b, _ in self._pending]
+        scales = [s for _, s in self._pending]
+        if self._matrix is not None:
+            blocks.insert(0, np.asarray(self._matrix))
+            if self._scales is not None:
+                scales.insert(0, np.asarray(self._scales))
+        self._matrix = np.ascontiguousarray(np.concatenate(blocks))
+        if self.dtype == "int8":
+            self._scales = np.concatenate(scales)
+        self._pending = []
+
+    def save(self) -> None:
+        """Persiste la matriz, las escalas y los documentos en ``directory``."""
+        self._consolidate()
+        os.makedirs(self.directory, exist_ok=True)
+        matrix = self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=self.dtype)
+        np.save(os.path.join(self.directory, self.VECTORS_FILE), matrix)
+        if self.dtype == "int8" and self._scales is not None:
+            np.save(os.path.join(self.directory, self.SCALES_FILE), self._scales)
+        with open(os.path.join(self.directory, self.DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            for text, metadata in zip(self.texts, self.metadatas):
+                f.write(json.dumps({"content": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+        meta = {
+            "dtype": self.dtype,
+            "count": len(self.texts),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        }
+        with open(os.path.join(self.directory, self.META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Similitud coseno entre cada consulta (filas) y cada fragmento.
+
+        Con ``float16`` e ``int8`` la matriz se convierte a ``float32`` por
+        bloques de ``_SCORE_BLOCK`` filas: convertirla entera en cada consulta
+        anularía el ahorro de memoria de la precisión compacta.
+        """
+        self._consolidate()
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = (queries / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+        if self.dtype == "float32":
+            return queries @ np.asarray(self._matrix).T
+        # Fragmentos en filas: cada bloque escribe un tramo contiguo
+        scores = np.empty((len(self._matrix), len(queries)), dtype=np.float32)
+        for start in range(0, len(self._matrix), _SCORE_BLOCK):
+            end = start + _SCORE_BLOCK
+            block = np.asarray(self._matrix[start:end], dtype=np.float32)
+            np.matmul(block, queries.T, out=scores[start:end])
+            if self.dtype == "int8":
+                scores[start:end] *= np.asarray(self._scales[start:end])[:, None]
+            del block  # El siguiente bloque no convive con este
+        return scores.T
+
+    def search(self, query_vector: list[float], k: int = 3) -> list[tuple[str, dict, float]]:
+        """
+        Busca los ``k`` fragmentos más cercanos a ``query_vector``.
+
+        :param query_vector: Embedding de la consulta.
+        :param k: Número de resultados.
+        :return: Lista de ``(contenido, metadatos, distancia)`` ordenada de
+            más a menos similar.
+        """
+        if not self.texts or k <= 0:
+            return []
+        scores = self._scores(np.asarray([query_vector], dtype=np.float32))[0]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (self.texts[i], self.metadatas[i], float(2.0 - 2.0 * scores[i]))
+            for i in top
+        ]
+
+    def search_many(
+        self, query_vectors: list[list[float]], k: int = 3
+    ) -> list[list[tuple[str, dict, float]]]:
+        """
+        Versión por lotes de ``search``: puntúa todas las consultas con una
+        sola multiplicación de matrices.
+
+        :param query_vectors: Embeddings de las consultas.
+        :param k: Número de resultados por consulta.
+        :return: Una lista de resultados por consulta, en el mismo orden.
+        """
+        if not query_vectors:
+            return []
+        if not self.texts or k <= 0:
+            return [[] for _ in query_vectors]
+        scores = self._scores(np.asarray(query_vectors, dtype=np.float32))
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            [
+                (self.texts[i], self.metadatas[i], float(2.0 - 2.0 * row_scores[i]))
+                for i in row_top
+            ]
+            for row_top, row_scores in zip(top, scores)
+        ]
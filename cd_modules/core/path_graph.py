@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import heapq
+import math
+import os
+
+import numpy as np
+
+from cd_modules.core.lexical_index import LexicalIndex
+
+# Tipos de arista, en el orden en que se guardan en ``kinds``
+EDGE_KINDS = ("adyacente", "concepto", "referencia")
+_ADJACENT, _CONCEPT, _REFERENCE = range(len(EDGE_KINDS))
+
+# Peso de cada tipo de arista: una cita expresa ("véase el artículo 6") une
+# más que la contigüidad, y esta más que compartir un concepto
+_REFERENCE_WEIGHT = 1.0
+_ADJACENT_WEIGHT = 0.6
+_CONCEPT_WEIGHT = 0.5
+# Cada fragmento se une solo a las siguientes apariciones de cada concepto:
+# un concepto presente en todo el corpus no genera O(n²) aristas
+_CONCEPT_NEIGHBOURS = 3
+
+
+class PathGraph:
+    """
+    Grafo de fragmentos de un documento en formato CSR, para PathRAG.
+
+    Los fragmentos (los mismos identificadores que ``LexicalIndex``) se unen
+    por contigüidad en el documento, por conceptos compartidos y por
+    referencias cruzadas: un fragmento que cita "artículo 6 apartado 2" se
+    une a los fragmentos donde empieza el artículo 6. Las aristas son no
+    dirigidas y se guardan en cuatro arrays contiguos (``indptr``,
+    ``indices``, ``weights``, ``kinds``): los vecinos de ``u`` son
+    ``indices[indptr[u]:indptr[u + 1]]``.
+    """
+
+    FILE_NAME = "path_graph.npz"
+
+    def __init__(self, indptr, indices, weights, kinds) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.kinds = kinds
+        # Vecinos como listas de Python: el recorrido los visita uno a uno
+        self._adjacency: list[list[tuple[int, float, int]]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def edge_count(self) -> int:
+        """Número de aristas (no dirigidas)."""
+        return len(self.indices) // 2
+
+    @classmethod
+    def build(cls, lexical: LexicalIndex) -> "PathGraph":
+        """
+        Construye el grafo de un documento a partir de su índice léxico.
+
+        :param lexical: Índice con los fragmentos en orden de documento, sus
+            conceptos y sus referencias (``headings``/``mentions``).
+        :return: Grafo listo para ``find_paths``.
+        """
+        n = len(lexical)
+        edges: dict[tuple[int, int], tuple[float, int]] = {}
+
+        def link(a: int, b: int, weight: float, kind: int) -> None:
+            if a == b:
+                return
+            key = (a, b) if a < b else (b, a)
+            # Entre dos fragmentos se queda la relación más fuerte
+            if key not in edges or edges[key][0] < weight:
+                edges[key] = (weight, kind)
+
+        # 1. Contigüidad: fragmentos consecutivos del mismo fichero
+        for i in range(n - 1):
+            if lexical.metadatas[i].get("source") == lexical.metadatas[i + 1].get("source"):
+                link(i, i + 1, _ADJACENT_WEIGHT, _ADJACENT)
+
+        # 2. Conceptos compartidos, ponderados por lo raro que es el concepto
+        for ids in lexical.concepts.values():
+            if len(ids) < 2:
+                continue
+            rarity = math.log(1 + n / len(ids)) / math.log(1 + n)
+            for position, a in enumerate(ids):
+                for b in ids[position + 1:position + 1 + _CONCEPT_NEIGHBOURS]:
+                    link(a, b, _CONCEPT_WEIGHT * rarity, _CONCEPT)
+
+        # 3. Referencias cruzadas: quien cita un artículo -> donde empieza
+        for ref, citing in lexical.mentions.items():
+            for b in lexical.headings.get(ref, ()):
+                for a in citing:
+                    link(a, b, _REFERENCE_WEIGHT, _REFERENCE)
+
+        return cls.from_edges(n, edges)
+
+    @classmethod
+    def from_edges(cls, n: int, edges: dict[tuple[int, int], tuple[float, int]]) -> "PathGraph":
+        """Empaqueta aristas no dirigidas ``{(a, b): (peso, tipo)}`` en CSR."""
+        pairs = np.array(list(edges), dtype=np.int32).reshape(-1, 2)
+        values = list(edges.values())
+        weights = np.array([w for w, _ in values], dtype=np.float32)
+        kinds = np.array([k for _, k in values], dtype=np.int8)
+
+        # Cada arista aparece en la lista de sus dos extremos
+        sources = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        targets = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+        return cls(
+            indptr,
+            targets[order].astype(np.int32),
+            np.concatenate([weights, weights])[order],
+            np.concatenate([kinds, kinds])[order],
+        )
+
+    def neighbours(self, node: int) -> list[tuple[int, float, int]]:
+        """Vecinos de ``node`` como ``(fragmento, peso, tipo de arista)``."""
+        if self._adjacency is None:
+            indices = self.indices.tolist()
+            weights = self.weights.tolist()
+            kinds = self.kinds.tolist()
+            bounds = self.indptr.tolist()
+            self._adjacency = [
+                list(zip(indices[a:b], weights[a:b], kinds[a:b]))
+                for a, b in zip(bounds, bounds[1:])
+            ]
+        return self._adjacency[node]
+
+    def find_paths(
+        self,
+        relevance: dict[int, float],
+        k: int = 3,
+        max_hops: int = 2,
+        beam: int = 32,
+        decay: float = 0.8,
+        min_flow: float = 0.05,
+    ) -> list[dict]:
+        """
+        Caminos de fragmentos relevantes para una consulta.
+
+        Parte de los fragmentos más relevantes y avanza salto a salto. Cada
+        salto multiplica el "flujo" del camino por ``decay`` y el peso de la
+        arista, y el camino suma la relevancia de cada fragmento nuevo por
+        su flujo. Los caminos cuyo flujo cae por debajo de ``min_flow`` se
+        podan y en cada salto solo sobreviven los ``beam`` mejores, así que
+        el coste no depende del tamaño del grafo.
+
+        :param relevance: Relevancia de los fragmentos para la consulta,
+            normalizada en ``[0, 1]`` (los ausentes valen 0).
+        :param k: Caminos a devolver.
+        :param max_hops: Saltos máximos desde cada fragmento de partida.
+        :param beam: Caminos que se mantienen en cada salto.
+        :param decay: Atenuación por salto.
+        :param min_flow: Flujo mínimo para seguir extendiendo un camino.
+        :return: Lista de ``{"nodes", "edges", "score"}`` de mayor a menor
+            puntuación; ``edges`` da el tipo de cada salto. Un camino
+            contenido en otro mejor no se repite.
+        """
+        seeds = heapq.nlargest(beam, relevance.items(), key=lambda item: item[1])
+        frontier = [(score, 1.0, (node,), ()) for node, score in seeds if score > 0]
+        candidates = list(frontier)
+        for _ in range(max_hops):
+            expanded = []
+            for score, flow, nodes, kinds in frontier:
+                for node, weight, kind in self.neighbours(nodes[-1]):
+                    next_flow = flow * decay * weight
+                    if next_flow < min_flow or node in nodes:
+                        continue
+                    gain = next_flow * relevance.get(node, 0.0)
+                    expanded.append((score + gain, next_flow, nodes + (node,), kinds + (kind,)))
+            frontier = heapq.nlargest(beam, expanded, key=lambda path: path[0])
+            # Un camino que acaba en un fragmento sin relevancia solo sirve de puente
+            candidates.extend(path for path in frontier if relevance.get(path[2][-1], 0.0) > 0)
+
+        chosen: list[tuple] = []
+        for path in sorted(candidates, key=lambda path: path[0], reverse=True):
+            members = set(path[2])
+            if any(members <= set(other[2]) for other in chosen):
+                continue
+            chosen.append(path)
+            if len(chosen) >= k:
+                break
+        return [
+            {
+                "nodes": list(nodes),
+                "edges": [EDGE_KINDS[kind] for kind in kinds],
+                "score": score,
+            }
+            for score, _, nodes, kinds in chosen
+        ]
+
+    def save(self, directory: str) -> None:
+        """Persiste los arrays CSR en ``directory``."""
+        np.savez(
+            os.path.join(directory, self.FILE_NAME),
+            indptr=self.indptr,
+            indices=self.indices,
+            weights=self.weights,
+            kinds=self.kinds,
+        )
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        """Indica si ``directory`` contiene un grafo persistido."""
+        return os.path.exists(os.path.join(directory, cls.FILE_NAME))
+
+    @classmethod
+    def load(cls, directory: str) -> "PathGraph":
+        """Carga un grafo persistido con ``save``."""
+        with np.load(os.path.join(directory, cls.FILE_NAME)) as data:
+            return cls(data["indptr"], data["indices"], data["weights"], data["kinds"])
@@ -1,28 +1,35 @@
 # File: cd_modules/core/pathrag_pi.py
 
-def recuperar_fragmentos(pregunta: str, top_k: int = 3) -> list[dict]:
+def recuperar_fragmentos(pregunta: str, top_k: int = 3, raga=None) -> list[dict]:
     """
-    Stub que simula la recuperación RAG.
-    Reemplázalo con la implementación real de PathRAG cuando esté disponible.
+    Recuperación PathRAG sobre el corpus ingerido.
+
+    Busca en el grafo de fragmentos (contigüidad, conceptos compartidos y
+    referencias cruzadas) los ``top_k`` caminos más relevantes y devuelve
+    sus fragmentos en el orden de cada cadena.
     :param pregunta: Texto de la consulta.
-    :param top_k: Número de fragmentos a devolver.
-    :return: Lista de diccionarios con keys 'titulo', 'fragmento', 'url'.
+    :param top_k: Número de caminos a recuperar.
+    :param raga: ``RAGAEngine`` a consultar; por defecto, el motor
+        compartido del índice local (``shared_engine()``).
+    :return: Lista de diccionarios con keys 'titulo', 'fragmento', 'fuente'
+        (fichero PDF del que procede el camino; el corpus no guarda URL),
+        'camino' (posición del camino), 'paso' (posición en la cadena) y
+        'relevancia' (puntuación del camino).
     """
-    ejemplos = [
-        {
-            "titulo": "Ley 24/2015, Art. 4.5",
-            "fragmento": "En España, el software como tal no es patentable salvo que aporte una contribución técnica.",
-            "url": "https://www.boe.es/buscar/act.php?id=BOE-A-2015-5484"
-        },
-        {
-            "titulo": "Sentencia CJEU 2014/C-406/13",
-            "fragmento": "El CJEU aclara que la idea subyacente no es patentable si no cumple requisitos técnicos.",
-            "url": "https://curia.europa.eu/juris/document/document.jsf?text=&docid=152062"
-        },
-        {
-            "titulo": "OEPM - Guía de Patentes",
-            "fragmento": "La Oficina Española de Patentes y Marcas establece que el software necesita elemento técnico adicional.",
-            "url": "https://www.oepm.es/es/patentes"
-        }
-    ]
-    return ejemplos[:top_k]
+    if raga is None:
+        from cd_modules.core.raga_engine import shared_engine
+
+        raga = shared_engine()
+
+    fragmentos = []
+    for camino, ruta in enumerate(raga.retrieve_paths(pregunta, k=top_k)):
+        for paso, evidencia in enumerate(ruta["evidence"]):
+            fragmentos.append({
+                "titulo": evidencia["source"],
+                "fragmento": evidencia["content"],
+                "fuente": ruta["source"],
+                "camino": camino,
+                "paso": paso,
+                "relevancia": ruta["score"],
+            })
+    return fragmentos
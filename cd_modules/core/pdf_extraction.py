@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from cd_modules.core.disk_cache import DiskCache, hash_key
+
+# Por debajo de este número de páginas por proceso no compensa repartir:
+# cada trabajador vuelve a abrir y analizar la tabla de objetos del PDF.
+_MIN_PAGES_PER_WORKER = 8
+
+
+def file_hash(path: str) -> str:
+    """SHA‑256 del contenido de ``path``, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_range(path: str, start: int, end: int) -> list[str]:
+    """Extrae el texto de las páginas ``[start, end)`` (se ejecuta en un trabajador)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _page_count(path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def extract_pages(
+    path: str,
+    workers: int = 1,
+    cache: DiskCache | None = None,
+) -> tuple[list[str], bool]:
+    """
+    Extrae el texto de cada página de un PDF, en paralelo y con caché.
+
+    Las páginas se reparten en rangos contiguos entre ``workers`` procesos
+    (la extracción de pypdf es Python puro y no escala con hilos). El texto
+    resultante se guarda en ``cache`` bajo el hash del fichero y la versión
+    de pypdf, así que volver a ingerir el mismo PDF no lo re‑analiza.
+
+    :param path: Ruta del PDF.
+    :param workers: Procesos de extracción; ``1`` extrae en el proceso actual.
+    :param cache: Caché donde guardar/leer el texto extraído; ``None`` la desactiva.
+    :return: ``(texto de cada página, True si vino de la caché)``.
+    """
+    import pypdf
+
+    key = hash_key("pdf_text", file_hash(path), pypdf.__version__) if cache is not None else None
+    if cache is not None:
+        blob = cache.get(key)
+        if blob is not None:
+            return json.loads(zlib.decompress(blob)), True
+
+    total = _page_count(path)
+    workers = max(1, min(workers, total // _MIN_PAGES_PER_WORKER))
+    if workers == 1:
+        pages = _extract_range(path, 0, total)
+    else:
+        step = -(-total // workers)
+        ranges = [(start, min(start + step, total)) for start in range(0, total, step)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_extract_range, *zip(*[(path, s, e) for s, e in ranges]))
+            pages = [text for part in parts for text in part]
+
+    if cache is not None:
+        cache.put(key, zlib.compress(json.dumps(pages, ensure_ascii=False).encode("utf-8")))
+    return pages, False
@@ -1,115 +1,1270 @@
 import os
 import shutil
 import gc
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+import copy
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+
+# Las dependencias pesadas (langchain, chromadb, pypdf, numpy) se importan
+# dentro de los métodos que las usan para no penalizar el arranque en frío.
+from cd_modules.core.lexical_index import LexicalIndex, extract_references
+from cd_modules.core.llm_scheduler import LLMUnavailableError, ScheduledEmbeddings, shared_scheduler
+from cd_modules.core.lru_cache import LRUCache
+from cd_modules.core.reasoning_tracker import trace
+from cd_modules.core.rw_lock import RWLock
+
+# Chroma rechaza ``upsert`` con más registros que su tamaño máximo de lote
+_CHROMA_BATCH = 5000
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+CHUNKERS = ("recursive", "legal")
+# Constante de la fusión por rango recíproco (Reciprocal Rank Fusion)
+_RRF_K = 60
+# Candidatos vectoriales por resultado cuando se filtra por concepto
+_CONCEPT_OVERSAMPLE = 4
+# Fragmentos puntuados con BM25 como posibles puntos de partida de PathRAG
+_PATH_SEEDS = 50
+
+# Marca de "aún no abierto" para los recursos que se cargan bajo demanda
+_UNSET = object()
+
+# Cada documento del corpus vive en su propia generación ``gen-<id>`` dentro
+# del directorio persistente; ``corpus.json`` indica cuál es la vigente de
+# cada uno. ``CURRENT`` es el puntero del formato anterior (un solo índice).
+_MANIFEST_FILE = "corpus.json"
+_CURRENT_FILE = "CURRENT"
+_GENERATION_PREFIX = "gen-"
+# Nombre del documento de los índices creados antes del corpus multi‑documento
+DEFAULT_DOCUMENT = "default"
+
+
+class _Document:
+    """Documento del corpus: su propio almacén vectorial e índice léxico."""
+
+    def __init__(self, name: str, directory: str, vector_store, lexical_index, info: dict) -> None:
+        self.name = name
+        self.directory = directory
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        # Entrada de ``corpus.json``: generación, fuente, fragmentos, metadatos…
+        self.info = info
+        # ``PathGraph`` del documento; se abre en la primera consulta de caminos
+        self.path_graph = None
+
+
+class _SharedIndex:
+    """
+    Estado del corpus compartido por un motor y todas sus sesiones.
+
+    Las consultas leen ``documents`` bajo ``lock.read()``. La ingesta
+    construye la generación nueva de un documento aparte y publica un
+    diccionario nuevo bajo ``lock.write()``, así que nadie ve un índice a
+    medias y los demás documentos no se tocan.
+    """
+
+    def __init__(self) -> None:
+        self.documents = _UNSET
+        self.version = 0
+        self.lock = RWLock()
+        # Un solo escritor: las ingestas concurrentes se ejecutan en serie
+        self.writer = threading.Lock()
+        # Apertura perezosa del corpus publicado (no espera al escritor)
+        self.open_lock = threading.Lock()
+        self.executor: ThreadPoolExecutor | None = None
+        self.text_cache = None
 
 
 class RAGAEngine:
     """Motor de ingesta y recuperación de evidencia para H‑ANCHOR."""
 
-    def __init__(self, persist_directory: str = "./chroma_db") -> None:
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        cache_size: int = 512,
+        embedding_model: str = "text-embedding-3-small",
+        embedding_cache_path: str = "./embedding_cache.sqlite",
+        backend: str = "chroma",
+        vector_dtype: str = "float32",
+        retrieval_mode: str = "vector",
+        read_only: bool = False,
+        embeddings=None,
+        text_cache_path: str | None = "./pdf_text_cache.sqlite",
+        documents: list[str] | None = None,
+        scheduler=None,
+        priority: str = "interactive",
+    ) -> None:
         """
         Inicializa el motor RAGA con posibilidad de persistencia local.
 
-        :param persist_directory: Directorio donde se almacenarán los
-            vectores generados. Si existe, se intenta reutilizar; de lo
-            contrario, se creará al realizar una ingesta.
+        :param persist_directory: Directorio del corpus. Si existe, se
+            intenta reutilizar; de lo contrario, se creará al realizar una
+            ingesta. Cada documento se guarda en su propia generación y cada
+            ingesta la publica de forma atómica.
+        :param cache_size: Entradas máximas de cada nivel de la caché de
+            recuperación (embeddings de consulta y evidencias).
+        :param embedding_model: Modelo de embeddings de OpenAI.
+        :param embedding_cache_path: Fichero SQLite con los embeddings ya
+            calculados, indexados por hash del fragmento y del modelo. Vive
+            fuera de ``persist_directory`` para sobrevivir a las re‑ingestas.
+        :param backend: Almacén vectorial: ``"chroma"`` (por defecto) o
+            ``"numpy"`` (matriz en memoria persistida como ``.npy``, pensada
+            para corpus de una sola sesión de unos miles de fragmentos).
+        :param vector_dtype: Precisión del backend ``numpy``: ``float32``,
+            ``float16`` o ``int8``.
+        :param retrieval_mode: Modo por defecto de ``retrieve``: ``"vector"``
+            (embeddings), ``"lexical"`` (BM25 + artículos, sin llamar a la
+            API) o ``"hybrid"`` (fusión de ambos).
+        :param read_only: Si es ``True`` el índice persistido solo se
+            consulta; las ingestas se rechazan. Pensado para procesos
+            trabajadores que comparten el mismo índice.
+        :param embeddings: Implementación de embeddings a usar en lugar de
+            ``OpenAIEmbeddings`` (p. ej. un sustituto local en benchmarks).
+        :param text_cache_path: Fichero SQLite con el texto ya extraído de
+            cada PDF, indexado por el hash del fichero. Solo se usa al ingerir
+            con ``extract_workers``. ``None`` desactiva la caché.
+        :param documents: Documentos del corpus a los que se limita por
+            defecto la recuperación; ``None`` busca en todos.
+        :param scheduler: ``LLMScheduler`` por el que pasan las peticiones de
+            embeddings; por defecto el compartido del proceso.
+        :param priority: Clase de prioridad de esas peticiones
+            (``"interactive"`` o ``"batch"``).
+
+        La construcción es barata: el cliente de embeddings, el almacén
+        vectorial y el índice léxico se abren la primera vez que se usan.
         """
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Backend vectorial desconocido: {backend}")
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperación desconocido: {retrieval_mode}")
+        self.retrieval_mode = retrieval_mode
+        self.documents = list(documents) if documents is not None else None
+        self.read_only = read_only
         self.persist_directory = persist_directory
-        # Usamos embeddings de OpenAI (requiere variable de entorno OPENAI_API_KEY)
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-
-        # Conexión a la Base de Datos Vectorial
-        # Solo cargamos si existe, para evitar crear bases vacías
-        if os.path.exists(persist_directory):
-            self.vector_store = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=self.embeddings,
+        self.backend = backend
+        self.vector_dtype = vector_dtype
+        # Caché de dos niveles: texto -> embedding y (texto, k) -> evidencias.
+        # Las evidencias dependen del índice, así que se invalidan cuando
+        # ``index_version`` cambia; los embeddings de consulta no.
+        self._shared = _SharedIndex()
+        self._query_embedding_cache = LRUCache(cache_size)
+        self._evidence_cache = LRUCache(cache_size)
+        self.embedding_model = embedding_model
+        self.embedding_cache_path = embedding_cache_path
+        self.text_cache_path = text_cache_path
+        self._base_embeddings = embeddings
+        self.scheduler = scheduler
+        self.priority = priority
+        self._embeddings = None
+        self.ingest_stats: dict = {}
+        self._tracker = None
+
+    @property
+    def embeddings(self):
+        """``CachedEmbeddings`` sobre OpenAI, creado en el primer uso."""
+        if self._embeddings is None:
+            from cd_modules.core.embedding_cache import CachedEmbeddings
+
+            base = self._base_embeddings
+            if base is None:
+                # Usamos embeddings de OpenAI (requiere variable de entorno OPENAI_API_KEY)
+                from langchain_openai import OpenAIEmbeddings
+
+                # Sin reintentos propios: los gestiona el planificador
+                base = OpenAIEmbeddings(model=self.embedding_model, max_retries=0)
+            base = ScheduledEmbeddings(
+                base,
+                self.scheduler or shared_scheduler(),
+                self.embedding_model,
+                self.priority,
             )
+            embeddings = CachedEmbeddings(
+                base,
+                model_name=self.embedding_model,
+                cache_path=self.embedding_cache_path,
+            )
+            embeddings.tracker = self._tracker
+            self._embeddings = embeddings
+        return self._embeddings
+
+    def session(
+        self,
+        tracker=None,
+        retrieval_mode: str | None = None,
+        documents: list[str] | None = None,
+        priority: str | None = None,
+    ) -> "RAGAEngine":
+        """
+        Vista ligera del motor para una sesión de usuario.
+
+        Comparte corpus, cerrojos y cachés de recuperación con este motor y
+        con el resto de vistas, pero tiene su propio ``tracker``, modo de
+        recuperación, documentos por defecto y cliente de embeddings, de
+        modo que las métricas de una sesión no se mezclan con las de otra.
+
+        :param tracker: ``ReasoningTracker`` de la sesión.
+        :param retrieval_mode: Modo por defecto de la vista; ``None`` hereda
+            el del motor.
+        :param documents: Documentos por defecto de la vista; ``None``
+            hereda los del motor.
+        :param priority: Prioridad de sus peticiones de embeddings; ``None``
+            hereda la del motor.
+        :return: Nuevo ``RAGAEngine`` que comparte el corpus.
+        """
+        if retrieval_mode is not None and retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperación desconocido: {retrieval_mode}")
+        view = copy.copy(self)
+        view._embeddings = None
+        view._tracker = tracker
+        view.ingest_stats = {}
+        view.retrieval_mode = retrieval_mode or self.retrieval_mode
+        if documents is not None:
+            view.documents = list(documents)
+        if priority is not None:
+            view.priority = priority
+        return view
+
+    @property
+    def index_version(self) -> int:
+        """Versión del corpus publicado; cambia con cada ingesta o borrado."""
+        return self._shared.version
+
+    @property
+    def has_documents(self) -> bool:
+        """Indica si hay algún documento indexado en el corpus."""
+        return any(doc.vector_store for doc in self._loaded_documents().values())
+
+    def list_documents(self) -> list[dict]:
+        """
+        Documentos del corpus con los metadatos registrados al ingerirlos.
+
+        :return: Lista ordenada por nombre de ``{"name", "source", "pages",
+            "chunks", "chunker", "ingested_at", "metadata", "directory"}``.
+        """
+        return [
+            {"name": name, **doc.info}
+            for name, doc in sorted(self._loaded_documents().items())
+        ]
+
+    def list_concepts(self, documents: list[str] | None = None) -> dict[str, int]:
+        """
+        Conceptos indexados y número de fragmentos que contienen cada uno.
+
+        :param documents: Documentos a considerar (ver ``retrieve``).
+        :return: ``{concepto: fragmentos}`` de mayor a menor frecuencia.
+        """
+        counts: dict[str, int] = {}
+        with self._shared.lock.read():
+            for doc in self._scope(documents):
+                for concept, n in doc.lexical_index.concept_counts().items():
+                    counts[concept] = counts.get(concept, 0) + n
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def _loaded_documents(self) -> dict:
+        """Documentos publicados; se abren una sola vez, en el primer acceso."""
+        shared = self._shared
+        documents = shared.documents
+        if documents is not _UNSET:
+            return documents
+        with shared.open_lock:
+            if shared.documents is _UNSET:
+                shared.documents = {
+                    name: self._open_document(name, info)
+                    for name, info in self._read_manifest().items()
+                }
+            return shared.documents
+
+    def _open_document(self, name: str, info: dict) -> _Document:
+        """Abre el almacén vectorial y el índice léxico de un documento."""
+        directory = os.path.normpath(os.path.join(self.persist_directory, info["directory"]))
+        if LexicalIndex.exists(directory):
+            lexical = LexicalIndex.load(directory)
         else:
-            self.vector_store = None
+            lexical = LexicalIndex()
+        return _Document(name, directory, self._open_persisted_store(directory), lexical, info)
+
+    def _read_manifest(self) -> dict:
+        """
+        Lee ``corpus.json``: nombre de documento -> entrada del manifiesto.
+
+        Los formatos anteriores se leen como un único documento
+        ``DEFAULT_DOCUMENT``: el puntero ``CURRENT`` a una generación o el
+        índice guardado directamente en ``persist_directory``.
+        """
+        root = self.persist_directory
+        try:
+            with open(os.path.join(root, _MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)["documents"]
+        except FileNotFoundError:
+            pass
+        try:
+            with open(os.path.join(root, _CURRENT_FILE), encoding="utf-8") as f:
+                return {DEFAULT_DOCUMENT: {"directory": f.read().strip()}}
+        except FileNotFoundError:
+            pass
+        if LexicalIndex.exists(root) or self._has_store(root):
+            return {DEFAULT_DOCUMENT: {"directory": "."}}
+        return {}
+
+    def _has_store(self, directory: str) -> bool:
+        """Indica si ``directory`` contiene un almacén vectorial del backend."""
+        if self.backend == "numpy":
+            from cd_modules.core.numpy_store import NumpyVectorStore
+
+            return NumpyVectorStore.exists(directory)
+        return os.path.exists(os.path.join(directory, "chroma.sqlite3"))
+
+    def _open_persisted_store(self, directory: str):
+        """
+        Conexión a la Base de Datos Vectorial.
+
+        Solo cargamos si existe, para evitar crear bases vacías.
+        """
+        if not self._has_store(directory):
+            return None
+        if self.backend == "numpy":
+            from cd_modules.core.numpy_store import NumpyVectorStore
+
+            return NumpyVectorStore.load(directory)
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(
+            persist_directory=directory,
+            embedding_function=self.embeddings,
+        )
 
-    def ingest_document(self, file_path: str):
+    def ingest_document(
+        self,
+        file_path: str,
+        chunker: str = "recursive",
+        extract_workers: int | None = None,
+        document: str | None = None,
+        metadata: dict | None = None,
+    ):
         """
-        Ingesta un documento en la base vectorial.
+        Ingesta un documento en el corpus, o lo sustituye si ya existía.
 
         1. Carga el PDF desde ``file_path``.
         2. Lo trocea en fragmentos manejables (chunks) usando un divisor
-           de caracteres recursivo.
-        3. Genera vectores para cada fragmento y los guarda en
-           ``self.persist_directory``.
+           de caracteres recursivo o, con ``chunker="legal"``, siguiendo
+           los Títulos, Capítulos, Artículos y Anexos de la norma.
+        3. Genera vectores para cada fragmento y los guarda en una
+           generación nueva de ``self.persist_directory``, propia del
+           documento. Los fragmentos cuyo texto ya se vectorizó en una
+           ingesta anterior se sirven desde la caché de embeddings; el
+           resumen queda en ``self.ingest_stats``.
+        4. Publica la generación nueva de forma atómica: las consultas en
+           curso terminan sobre la versión anterior del documento y las
+           siguientes ven ya la nueva. El resto del corpus no se toca.
+
+        ``self.ingest_stats`` recoge además los tiempos de extracción y
+        troceado y, con el troceado jurídico, los fragmentos y caracteres
+        que habría producido el divisor recursivo (``baseline``).
 
         :param file_path: Ruta del archivo PDF a ingerir.
+        :param chunker: ``"recursive"`` (1000 caracteres con 200 de
+            solapamiento) o ``"legal"`` (un fragmento por artículo).
+        :param extract_workers: Si se indica, el texto se extrae con ese
+            número de procesos y se guarda en la caché de texto; con
+            ``None`` se usa ``PyPDFLoader`` como hasta ahora.
+        :param document: Nombre del documento en el corpus (p. ej. ``"AI Act"``);
+            por defecto, el nombre del fichero sin extensión.
+        :param metadata: Metadatos del documento que se guardan en el
+            manifiesto del corpus (título, jurisdicción, fecha…).
         :return: ``True`` si la ingesta fue exitosa, o un mensaje de error.
         """
+        if chunker not in CHUNKERS:
+            raise ValueError(f"Troceador desconocido: {chunker}")
+        if self.read_only:
+            return "❌ Error: El motor está abierto en modo solo lectura."
         if not os.path.exists(file_path):
             return f"❌ Error: No encuentro el archivo {file_path}"
 
         print(f"📥 Ingestando {file_path}...")
 
+        from langchain_core.documents import Document
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         # 1. Cargar
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
+        started = time.perf_counter()
+        text_cached = False
+        with trace(self.tracker, "pdf_load"):
+            if extract_workers is None:
+                from langchain_community.document_loaders import PyPDFLoader
+
+                docs = PyPDFLoader(file_path).load()
+            else:
+                from cd_modules.core.pdf_extraction import extract_pages
+
+                pages, text_cached = extract_pages(
+                    file_path, workers=extract_workers, cache=self._text_cache()
+                )
+                docs = [
+                    Document(page_content=text, metadata={"source": file_path, "page": i})
+                    for i, text in enumerate(pages)
+                ]
+        extract_s = time.perf_counter() - started
 
         # 2. Trocear (Split)
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000, chunk_overlap=200
         )
-        splits = text_splitter.split_documents(docs)
+        started = time.perf_counter()
+        with trace(self.tracker, "split"):
+            if chunker == "legal":
+                from cd_modules.core.legal_chunker import split_legal
 
-        # 3. Vectorizar y Guardar
-        # IMPORTANTE: Liberar conexión anterior antes de borrar
-        if self.vector_store:
-            self.vector_store = None
-            gc.collect()  # Forzar al recolector de basura a soltar el archivo
+                chunks = split_legal([d.page_content for d in docs], file_path)
+            else:
+                chunks = [
+                    (d.page_content, d.metadata) for d in text_splitter.split_documents(docs)
+                ]
+        chunk_s = time.perf_counter() - started
+        texts = [text for text, _ in chunks]
 
-        # Si ya existía DB, la borramos para empezar de cero (limpieza)
-        if os.path.exists(self.persist_directory):
+        stats = {
+            "chunker": chunker,
+            "chars": sum(len(text) for text in texts),
+            "extract_s": round(extract_s, 4),
+            "chunk_s": round(chunk_s, 4),
+            "text_cached": text_cached,
+        }
+        if chunker != "recursive":
+            # Referencia: lo que habría generado el divisor de siempre
+            started = time.perf_counter()
+            baseline = text_splitter.split_documents(docs)
+            stats["baseline"] = {
+                "chunks": len(baseline),
+                "chars": sum(len(d.page_content) for d in baseline),
+                "chunk_s": round(time.perf_counter() - started, 4),
+            }
+
+        # 3. Vectorizar y Guardar (en una generación aparte)
+        name = document or _document_name(file_path)
+        with self._shared.writer:
+            directory, store, lexical = self._begin_generation()
             try:
-                shutil.rmtree(self.persist_directory)
-            except Exception as e:
-                print(f"⚠️ No se pudo borrar el directorio antiguo: {e}")
+                self.embeddings.reset_counters()
+                self._add_embedded(
+                    store,
+                    lexical,
+                    texts,
+                    [{**chunk_metadata, "document": name} for _, chunk_metadata in chunks],
+                    self.embeddings.embed_documents(texts),
+                )
+                self._finalize_store(directory, store, lexical)
+            except BaseException:
+                self._discard_generation(directory)
+                raise
+            # 4. Publicar
+            self._publish(name, directory, store, lexical, {
+                "source": os.path.basename(file_path),
+                "pages": len(docs),
+                "chunks": len(chunks),
+                "chunker": chunker,
+                "ingested_at": time.time(),
+                "metadata": metadata or {},
+            })
+        self.ingest_stats = {
+            "document": name,
+            "chunks": len(chunks),
+            **stats,
+            **self.embeddings.counters(),
+        }
+        print(
+            f"✅ Ingestión completada: {len(chunks)} fragmentos indexados "
+            f"({self.ingest_stats['reused']} reutilizados, "
+            f"{self.ingest_stats['embedded']} vectorizados)."
+        )
+        return True
+
+    def ingest_document_stream(
+        self,
+        file_path: str,
+        pages_per_batch: int = 20,
+        max_inflight: int = 2,
+        document: str | None = None,
+        metadata: dict | None = None,
+    ) -> Iterator[dict]:
+        """
+        Ingesta en streaming para PDFs muy grandes, con progreso por lotes.
 
-        self.vector_store = Chroma.from_documents(
-            documents=splits,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory,
+        El PDF se lee página a página. Cada lote de ``pages_per_batch``
+        páginas se trocea y se envía a vectorizar en segundo plano mientras
+        se analizan las siguientes; mientras se lee un lote hay como mucho
+        ``max_inflight`` lotes vectorizándose (con ``max_inflight=1`` la
+        lectura del lote siguiente se solapa con la vectorización del
+        anterior). Cada lote indexado produce un evento de progreso.
+
+        Lo acotado es la parte en tránsito: las páginas del lote en curso y
+        los lotes pendientes de vectorizar. Los índices que se construyen
+        sí crecen con el documento y viven en memoria hasta guardarse: el
+        índice léxico guarda el texto y las listas de términos de cada
+        fragmento y, con el backend ``"numpy"``, también los vectores
+        (Chroma los escribe en disco según llegan). Al terminar se construye
+        además el grafo de fragmentos de PathRAG (``PathGraph``), con todas
+        sus aristas en memoria, antes de guardarlo.
+
+        :param file_path: Ruta del archivo PDF a ingerir.
+        :param pages_per_batch: Páginas por lote de troceado/vectorización.
+        :param max_inflight: Peticiones de embeddings simultáneas.
+        :param document: Nombre del documento en el corpus (ver ``ingest_document``).
+        :param metadata: Metadatos del documento para el manifiesto del corpus.
+        :return: Iterador de eventos ``{"stage", "pages_done", "total_pages",
+            "chunks"}``. El último tiene ``stage == "done"`` (o ``"error"``).
+        """
+        if self.read_only:
+            yield {"stage": "error", "message": "❌ Error: El motor está abierto en modo solo lectura."}
+            return
+        if not os.path.exists(file_path):
+            yield {"stage": "error", "message": f"❌ Error: No encuentro el archivo {file_path}"}
+            return
+
+        from langchain_core.documents import Document
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from pypdf import PdfReader
+
+        print(f"📥 Ingestando en streaming {file_path}...")
+        reader = PdfReader(file_path)
+        total_pages = len(reader.pages)
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000, chunk_overlap=200
         )
-        print(f"✅ Ingestión completada: {len(splits)} fragmentos indexados.")
+
+        name = document or _document_name(file_path)
+        pages_done = 0
+        chunks = 0
+        pending: deque = deque()
+
+        def flush_oldest() -> dict:
+            nonlocal pages_done, chunks
+            future, texts, metadatas, batch_pages = pending.popleft()
+            self._add_embedded(store, lexical, texts, metadatas, future.result())
+            pages_done += batch_pages
+            chunks += len(texts)
+            return {
+                "stage": "indexed",
+                "pages_done": pages_done,
+                "total_pages": total_pages,
+                "chunks": chunks,
+            }
+
+        # Mientras se construye la generación nueva, las consultas siguen
+        # sirviéndose de la anterior; si el consumidor abandona el
+        # iterador, la generación a medias se descarta.
+        with self._shared.writer:
+            directory, store, lexical = self._begin_generation()
+            try:
+                self.embeddings.reset_counters()
+                with ThreadPoolExecutor(max_workers=max(1, max_inflight)) as pool:
+                    for start in range(0, total_pages, max(1, pages_per_batch)):
+                        end = min(start + pages_per_batch, total_pages)
+                        with trace(self.tracker, "pdf_load"):
+                            docs = [
+                                Document(
+                                    page_content=reader.pages[i].extract_text() or "",
+                                    metadata={"source": file_path, "page": i, "document": name},
+                                )
+                                for i in range(start, end)
+                            ]
+                        with trace(self.tracker, "split"):
+                            splits = text_splitter.split_documents(docs)
+                        texts = [d.page_content for d in splits]
+                        metadatas = [d.metadata for d in splits]
+                        future = pool.submit(self.embeddings.embed_documents, texts)
+                        pending.append((future, texts, metadatas, end - start))
+
+                        # Contrapresión: mientras se analiza el lote siguiente quedan
+                        # ``max_inflight`` lotes vectorizándose, nunca más
+                        while len(pending) > max(1, max_inflight):
+                            yield flush_oldest()
+
+                    while pending:
+                        yield flush_oldest()
+
+                self._finalize_store(directory, store, lexical)
+            except BaseException:
+                self._discard_generation(directory)
+                raise
+            self._publish(name, directory, store, lexical, {
+                "source": os.path.basename(file_path),
+                "pages": total_pages,
+                "chunks": chunks,
+                "chunker": "recursive",
+                "ingested_at": time.time(),
+                "metadata": metadata or {},
+            })
+        self.ingest_stats = {"document": name, "chunks": chunks, **self.embeddings.counters()}
+        print(f"✅ Ingestión en streaming completada: {chunks} fragmentos indexados.")
+        yield {
+            "stage": "done",
+            "pages_done": pages_done,
+            "total_pages": total_pages,
+            "chunks": chunks,
+        }
+
+    def ingest_in_background(self, file_path: str, **options) -> Future:
+        """
+        Lanza ``ingest_document`` en un hilo aparte y devuelve su ``Future``.
+
+        Las consultas siguen sirviéndose del índice anterior hasta que el
+        nuevo se publica. El motor y todas sus vistas comparten un único
+        hilo de ingesta, así que las peticiones se atienden en orden.
+
+        :param file_path: Ruta del archivo PDF a ingerir.
+        :param options: Opciones de ``ingest_document`` (``chunker``,
+            ``extract_workers``, ``document``, ``metadata``).
+        :return: ``Future`` con el resultado de ``ingest_document``.
+        """
+        shared = self._shared
+        with shared.open_lock:
+            if shared.executor is None:
+                shared.executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="raga-ingest"
+                )
+        return shared.executor.submit(self.ingest_document, file_path, **options)
+
+    def _text_cache(self):
+        """Caché en disco del texto extraído de los PDF (compartida por las vistas)."""
+        if self.text_cache_path is None:
+            return None
+        shared = self._shared
+        with shared.open_lock:
+            if shared.text_cache is None:
+                from cd_modules.core.disk_cache import DiskCache
+
+                shared.text_cache = DiskCache(self.text_cache_path)
+        return shared.text_cache
+
+    def _begin_generation(self) -> tuple:
+        """
+        Prepara una generación vacía junto al índice publicado.
+
+        :return: ``(directorio, almacén vectorial, índice léxico)``.
+        """
+        directory = os.path.join(
+            self.persist_directory, f"{_GENERATION_PREFIX}{uuid.uuid4().hex[:12]}"
+        )
+        os.makedirs(directory)
+        return directory, self._open_empty_store(directory), LexicalIndex()
+
+    def _open_empty_store(self, directory: str):
+        """Crea un almacén vectorial vacío del backend configurado en ``directory``."""
+        if self.backend == "numpy":
+            from cd_modules.core.numpy_store import NumpyVectorStore
+
+            return NumpyVectorStore(directory, dtype=self.vector_dtype)
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(
+            persist_directory=directory,
+            embedding_function=self.embeddings,
+        )
+
+    def _finalize_store(self, directory: str, store, lexical: LexicalIndex) -> None:
+        """Persiste el índice recién construido (Chroma lo hace al insertar)."""
+        from cd_modules.core.path_graph import PathGraph
+
+        lexical.save(directory)
+        # El grafo se construye entero en memoria a partir del índice léxico
+        # (crece con el número de fragmentos) y después se guarda
+        with trace(self.tracker, "path_graph"):
+            PathGraph.build(lexical).save(directory)
+        if self.backend == "numpy":
+            store.save()
+
+    def remove_document(self, name: str):
+        """
+        Quita un documento del corpus sin tocar los demás.
+
+        :param name: Nombre del documento.
+        :return: ``True`` si se eliminó, ``False`` si no existía, o un
+            mensaje de error.
+        """
+        if self.read_only:
+            return "❌ Error: El motor está abierto en modo solo lectura."
+        with self._shared.writer:
+            documents = self._loaded_documents()
+            if name not in documents:
+                return False
+            self._swap_documents({n: d for n, d in documents.items() if n != name})
+        print(f"🗑️ Documento eliminado del corpus: {name}")
         return True
 
-    def retrieve(self, query: str, k: int = 3):
+    def _publish(self, name: str, directory: str, store, lexical: LexicalIndex, info: dict) -> None:
+        """
+        Publica la generación recién construida de un documento.
+
+        :param name: Documento que se añade o sustituye.
+        :param directory: Generación construida con ``_begin_generation``.
+        :param info: Entrada del manifiesto (fuente, páginas, metadatos…).
+        """
+        info = {"directory": os.path.basename(directory), **info}
+        documents = dict(self._loaded_documents())
+        documents[name] = _Document(name, directory, store, lexical, info)
+        self._swap_documents(documents)
+
+    def _swap_documents(self, documents: dict) -> None:
+        """
+        Sustituye de forma atómica el corpus publicado por ``documents``.
+
+        El cerrojo de escritura espera a que terminen las consultas en curso;
+        el cambio en sí es una asignación y la reescritura de
+        ``corpus.json``, así que los lectores apenas esperan. Después se
+        borran las generaciones que ya no usa nadie, salvo las del
+        manifiesto anterior, que un proceso de solo lectura puede tener aún
+        abiertas.
+        """
+        shared = self._shared
+        previous = self._read_manifest()
+        with shared.lock.write(), shared.open_lock:
+            path = os.path.join(self.persist_directory, _MANIFEST_FILE)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"documents": {name: doc.info for name, doc in documents.items()}},
+                    f, ensure_ascii=False, indent=2,
+                )
+            os.replace(tmp_path, path)
+            shared.documents = documents
+            self._bump_index_version()
+        keep = {info["directory"] for info in previous.values()}
+        keep |= {doc.info["directory"] for doc in documents.values()}
+        self._remove_stale_generations(keep)
+
+    def _remove_stale_generations(self, keep: set) -> None:
+        """
+        Borra del directorio persistente lo que no esté en ``keep``.
+
+        :param keep: Generaciones (relativas a ``persist_directory``) que se
+            conservan; ``"."`` protege un índice en el formato antiguo.
+        """
+        # IMPORTANTE: Liberar conexiones antiguas antes de borrar
+        gc.collect()  # Forzar al recolector de basura a soltar los archivos
+        keep = {os.path.normpath(directory) for directory in keep}
+        legacy_in_use = "." in keep
+        for name in os.listdir(self.persist_directory):
+            if name == _MANIFEST_FILE or name in keep:
+                continue
+            if legacy_in_use and not name.startswith(_GENERATION_PREFIX):
+                continue  # Índice en formato antiguo, aún en uso
+            path = os.path.join(self.persist_directory, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except Exception as e:
+                print(f"⚠️ No se pudo borrar la generación antigua {path}: {e}")
+
+    def _discard_generation(self, directory: str) -> None:
+        """Elimina una generación que no llegó a publicarse."""
+        gc.collect()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _add_embedded(
+        self,
+        store,
+        lexical: LexicalIndex,
+        texts: list[str],
+        metadatas: list[dict],
+        vectors: list[list[float]],
+    ) -> None:
+        """
+        Añade a una generación fragmentos cuyos vectores ya están calculados.
+
+        :param store: Almacén vectorial de la generación en construcción.
+        :param lexical: Índice léxico de la misma generación.
+        :param texts: Contenido de cada fragmento.
+        :param metadatas: Metadatos (fuente, página) de cada fragmento.
+        :param vectors: Embeddings en el mismo orden que ``texts``.
+        """
+        if not texts:
+            return
+        lexical.add(texts, metadatas)
+        if self.backend == "numpy":
+            store.add(texts, metadatas, vectors)
+            return
+        for i in range(0, len(texts), _CHROMA_BATCH):
+            end = i + _CHROMA_BATCH
+            store._collection.upsert(
+                ids=[str(uuid.uuid4()) for _ in texts[i:end]],
+                embeddings=vectors[i:end],
+                metadatas=metadatas[i:end],
+                documents=texts[i:end],
+            )
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 3,
+        mode: str | None = None,
+        documents: list[str] | None = None,
+        concepts: list[str] | None = None,
+    ):
         """
         Busca los ``k`` fragmentos más similares a la consulta.
 
         Devuelve una lista de diccionarios con el texto exacto, la fuente
-        (número de página) y la relevancia de cada fragmento.
+        (documento y número de página) y la relevancia de cada fragmento. En
+        modo ``"vector"`` la relevancia es una distancia (menor es mejor); en
+        ``"lexical"`` e ``"hybrid"`` es una puntuación (mayor es mejor).
 
         :param query: Cadena que describe la pregunta o término de búsqueda.
         :param k: Número de fragmentos a recuperar.
+        :param mode: ``"vector"``, ``"lexical"`` o ``"hybrid"``. Si es
+            ``None`` se usa ``self.retrieval_mode``. Los modos léxico e
+            híbrido resuelven primero las citas exactas ("Artículo 5",
+            "Anexo III") sin llamar a la API de embeddings.
+        :param documents: Documentos del corpus en los que buscar; los demás
+            ni se consultan. ``None`` usa ``self.documents`` (todos si
+            tampoco se indicó). Los nombres desconocidos se ignoran.
+        :param concepts: Si se indica, solo se devuelven fragmentos que
+            contienen alguno de estos conceptos (índice de conceptos de la
+            ingesta, sin llamar a la API). Las citas exactas de artículos
+            se devuelven igualmente.
         :return: Lista de evidencias, o lista vacía si no hay base cargada.
         """
-        if not self.vector_store:
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperación desconocido: {mode}")
+
+        # La ingesta no puede publicar otro corpus mientras lo consultamos
+        with self._shared.lock.read():
+            return self._retrieve(query, k, mode, self._scope(documents), concepts)
+
+    def _scope(self, documents: list[str] | None) -> list[_Document]:
+        """Documentos con índice sobre los que buscar, en orden de nombre."""
+        loaded = self._loaded_documents()
+        names = documents if documents is not None else self.documents
+        if names is None:
+            names = sorted(loaded)
+        return [loaded[n] for n in dict.fromkeys(names) if n in loaded and loaded[n].vector_store]
+
+    def _retrieve(
+        self,
+        query: str,
+        k: int,
+        mode: str,
+        scope: list[_Document],
+        concepts: list[str] | None = None,
+    ) -> list[dict]:
+        """Cuerpo de ``retrieve``; requiere el cerrojo de lectura."""
+        if not scope:
             return []
 
-        # Búsqueda por similitud (Similarity Search)
+        concepts = tuple(sorted({c.lower() for c in concepts})) if concepts else None
+        cache_key = (self.index_version, mode, tuple(d.name for d in scope), concepts, query, k)
+        cached = self._evidence_cache.get(cache_key)
+        if cached is not None:
+            return [dict(e) for e in cached]
+
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
+            if mode == "lexical":
+                with trace(self.tracker, "lexical_search"):
+                    results = self._lexical_hits(scope, query, k, concepts)
+            elif mode == "hybrid":
+                results = self._hybrid_search(scope, query, k, concepts)
+            else:
+                # Búsqueda por similitud (Similarity Search) sobre el embedding cacheado
+                query_embedding = self._embed_query(query)
+                results = self._vector_hits(scope, query_embedding, k, concepts)
+        except LLMUnavailableError:
+            # Sin embeddings no hay búsqueda: una lista vacía se leería como
+            # "no hay evidencia" y acabaría en veredictos falsos
+            raise
         except Exception as e:
             print(f"Error en retrieve: {e}")
             return []
 
-        evidence = []
-        for doc, score in results:
-            evidence.append(
-                {
-                    "content": doc.page_content,
-                    "source": f"Página {doc.metadata.get('page', 'N/A')}",
-                    "relevance": f"{score:.4f}",
-                }
-            )
+        evidence = [self._to_evidence(*hit) for hit in results]
 
+        self._evidence_cache.put(cache_key, [dict(e) for e in evidence])
         return evidence
+
+    @staticmethod
+    def _reference_hits(scope: list[_Document], query: str, k: int) -> list[tuple[str, dict, float]]:
+        """Artículos/anexos citados en la consulta, de todos los documentos."""
+        hits = [hit for doc in scope for hit in doc.lexical_index.lookup_references(query, k)]
+        return sorted(hits, key=lambda hit: hit[2], reverse=True)[:k]
+
+    @staticmethod
+    def _bm25_hits(
+        scope: list[_Document], query: str, k: int, concepts: tuple | None = None
+    ) -> list[tuple[str, dict, float]]:
+        """BM25 de cada documento (filtrado por concepto) fusionado por puntuación."""
+        hits = []
+        for doc in scope:
+            index = doc.lexical_index
+            candidates = index.concept_ids(concepts) if concepts else None
+            hits.extend(
+                (index.texts[i], index.metadatas[i], score)
+                for i, score in index.search_ids(query, k, candidates)
+            )
+        return sorted(hits, key=lambda hit: hit[2], reverse=True)[:k]
+
+    def _lexical_hits(
+        self, scope: list[_Document], query: str, k: int, concepts: tuple | None = None
+    ) -> list[tuple[str, dict, float]]:
+        """
+        Búsqueda léxica sobre varios documentos: citas exactas o, si la
+        consulta no cita ninguna, BM25 de cada documento fusionado por
+        puntuación.
+        """
+        references = self._reference_hits(scope, query, k)
+        if references:
+            return references
+        return self._bm25_hits(scope, query, k, concepts)
+
+    def _vector_hits(
+        self,
+        scope: list[_Document],
+        query_embedding: list[float],
+        k: int,
+        concepts: tuple | None = None,
+    ) -> list[tuple[str, dict, float]]:
+        """
+        Los ``k`` fragmentos más cercanos entre todos los documentos. Con
+        ``concepts`` se piden más candidatos y se descartan los que no
+        contienen ninguno.
+        """
+        hits = []
+        for doc in scope:
+            if not concepts:
+                hits.extend(self._search_by_vector(doc.vector_store, query_embedding, k))
+                continue
+            index = doc.lexical_index
+            allowed = {index.texts[i] for i in index.concept_ids(concepts)}
+            if allowed:
+                depth = min(len(index), k * _CONCEPT_OVERSAMPLE)
+                hits.extend(
+                    hit
+                    for hit in self._search_by_vector(doc.vector_store, query_embedding, depth)
+                    if hit[0] in allowed
+                )
+        return sorted(hits, key=lambda hit: hit[2])[:k]
+
+    def _hybrid_search(
+        self, scope: list[_Document], query: str, k: int, concepts: tuple | None = None
+    ) -> list[tuple[str, dict, float]]:
+        """
+        Fusiona los rankings léxico y vectorial con Reciprocal Rank Fusion.
+
+        Si la consulta cita un artículo o anexo, esos fragmentos encabezan el
+        resultado y no se llama a la API de embeddings.
+        """
+        references = self._reference_hits(scope, query, k)
+        if len(references) >= k:
+            return references
+
+        depth = max(k * 2, 10)
+        with trace(self.tracker, "lexical_search"):
+            lexical = [
+                (content, metadata)
+                for content, metadata, _ in self._bm25_hits(scope, query, depth, concepts)
+            ]
+        vector = [
+            (content, metadata)
+            for content, metadata, _ in self._vector_hits(
+                scope, self._embed_query(query), depth, concepts
+            )
+        ]
+
+        fused: dict[str, float] = {}
+        metadata_by_content: dict[str, dict] = {}
+        for ranking in (lexical, vector):
+            for rank, (content, metadata) in enumerate(ranking):
+                fused[content] = fused.get(content, 0.0) + 1.0 / (_RRF_K + rank + 1)
+                metadata_by_content.setdefault(content, metadata)
+
+        results = list(references)
+        seen = {content for content, _, _ in references}
+        for content, score in sorted(fused.items(), key=lambda item: item[1], reverse=True):
+            if len(results) >= k:
+                break
+            if content not in seen:
+                results.append((content, metadata_by_content[content], score))
+        return results
+
+    def retrieve_paths(
+        self,
+        query: str,
+        k: int = 3,
+        max_hops: int = 2,
+        documents: list[str] | None = None,
+    ) -> list[dict]:
+        """
+        Recuperación por caminos (PathRAG) sobre el grafo de cada documento.
+
+        Los puntos de partida son los fragmentos que puntúan con BM25 y los
+        artículos citados en la consulta, sin llamar a la API de embeddings.
+        Desde ellos se buscan cadenas de fragmentos unidos por contigüidad,
+        conceptos compartidos o referencias cruzadas (ver ``PathGraph``).
+
+        :param query: Pregunta o término de búsqueda.
+        :param k: Caminos a devolver.
+        :param max_hops: Saltos máximos de cada camino.
+        :param documents: Documentos en los que buscar (ver ``retrieve``).
+        :return: Lista de ``{"score", "document", "source", "edges",
+            "evidence"}`` de mayor a menor puntuación; ``evidence`` son los
+            fragmentos del camino en orden, con el formato de ``retrieve``.
+        """
+        results = []
+        with self._shared.lock.read(), trace(self.tracker, "path_search"):
+            for doc in self._scope(documents):
+                index = doc.lexical_index
+                relevance = self._path_relevance(index, query)
+                for path in self._path_graph(doc).find_paths(relevance, k, max_hops):
+                    results.append({
+                        "score": round(path["score"], 4),
+                        "document": doc.name,
+                        "source": doc.info.get("source", doc.name),
+                        "edges": path["edges"],
+                        "evidence": [
+                            self._to_evidence(index.texts[i], index.metadatas[i], relevance.get(i, 0.0))
+                            for i in path["nodes"]
+                        ],
+                    })
+        return sorted(results, key=lambda path: path["score"], reverse=True)[:k]
+
+    @staticmethod
+    def _path_relevance(index: LexicalIndex, query: str) -> dict[int, float]:
+        """Relevancia BM25 normalizada; los artículos citados valen 1."""
+        hits = index.search_ids(query, _PATH_SEEDS)
+        top = hits[0][1] if hits else 0.0
+        relevance = {i: score / top for i, score in hits} if top > 0 else {}
+        for ref in extract_references(query):
+            for i in index.headings.get(ref, ()):
+                relevance[i] = 1.0
+        return relevance
+
+    def _path_graph(self, doc: _Document):
+        """Grafo del documento: persistido en la ingesta o, si es antiguo, construido aquí."""
+        if doc.path_graph is None:
+            from cd_modules.core.path_graph import PathGraph
+
+            with self._shared.open_lock:
+                if doc.path_graph is None:
+                    if PathGraph.exists(doc.directory):
+                        doc.path_graph = PathGraph.load(doc.directory)
+                    else:
+                        doc.path_graph = PathGraph.build(doc.lexical_index)
+        return doc.path_graph
+
+    def retrieve_many(
+        self,
+        queries: list[str],
+        k: int = 3,
+        documents: list[str] | None = None,
+    ) -> list[list[dict]]:
+        """
+        Recupera evidencias para varias consultas de una sola vez.
+
+        Todas las consultas sin caché se vectorizan en una única petición de
+        embeddings y se puntúan contra cada documento en una sola operación,
+        de modo que anclar un árbol completo cuesta un viaje de red en lugar
+        de uno por nodo. Los resultados alimentan la misma caché que
+        ``retrieve``.
+
+        :param queries: Preguntas o términos de búsqueda.
+        :param k: Número de fragmentos por consulta.
+        :param documents: Documentos en los que buscar (ver ``retrieve``).
+        :return: Una lista de evidencias por consulta, en el mismo orden.
+        """
+        if self.retrieval_mode != "vector":
+            # Léxico e híbrido ya son locales salvo el embedding de la consulta
+            return [self.retrieve(q, k, documents=documents) for q in queries]
+        with self._shared.lock.read():
+            return self._retrieve_many(queries, k, self._scope(documents))
+
+    def _retrieve_many(
+        self, queries: list[str], k: int, scope: list[_Document]
+    ) -> list[list[dict]]:
+        """Cuerpo de ``retrieve_many`` en modo vectorial; requiere el cerrojo de lectura."""
+        if not scope:
+            return [[] for _ in queries]
+
+        version = self.index_version
+        names = tuple(d.name for d in scope)
+        resolved: dict[str, list[dict]] = {}
+        missing: list[str] = []
+        for query in dict.fromkeys(queries):
+            cached = self._evidence_cache.get((version, "vector", names, None, query, k))
+            if cached is None:
+                missing.append(query)
+            else:
+                resolved[query] = cached
+
+        if missing:
+            try:
+                vectors = self._embed_queries(missing)
+                per_document = [
+                    self._search_many_by_vector(doc.vector_store, vectors, k) for doc in scope
+                ]
+            except LLMUnavailableError:
+                raise
+            except Exception as e:
+                print(f"Error en retrieve_many: {e}")
+            else:
+                for position, query in enumerate(missing):
+                    hits = sorted(
+                        (hit for batches in per_document for hit in batches[position]),
+                        key=lambda hit: hit[2],
+                    )[:k]
+                    evidence = [self._to_evidence(*hit) for hit in hits]
+                    self._evidence_cache.put((version, "vector", names, None, query, k), evidence)
+                    resolved[query] = evidence
+            for query in missing:
+                resolved.setdefault(query, [])
+
+        return [[dict(e) for e in resolved[q]] for q in queries]
+
+    def _search_many_by_vector(
+        self, store, query_embeddings: list[list[float]], k: int
+    ) -> list[list[tuple[str, dict, float]]]:
+        """Búsqueda vectorial por lotes en un almacén, común a ambos backends."""
+        with trace(self.tracker, "vector_search"):
+            if self.backend == "numpy":
+                return store.search_many(query_embeddings, k=k)
+            results = store._collection.query(
+                query_embeddings=query_embeddings,
+                n_results=k,
+                include=["documents", "metadatas", "distances"],
+            )
+        return [
+            list(zip(documents, metadatas, distances))
+            for documents, metadatas, distances in zip(
+                results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def _search_by_vector(
+        self, store, query_embedding: list[float], k: int
+    ) -> list[tuple[str, dict, float]]:
+        """
+        Búsqueda vectorial en un almacén, común a ambos backends.
+
+        :return: Lista de ``(contenido, metadatos, distancia)``.
+        """
+        with trace(self.tracker, "vector_search"):
+            if self.backend == "numpy":
+                return store.search(query_embedding, k=k)
+            results = store.similarity_search_by_vector_with_relevance_scores(
+                query_embedding, k=k
+            )
+        return [(doc.page_content, doc.metadata, score) for doc, score in results]
+
+    @staticmethod
+    def _to_evidence(content: str, metadata: dict, score: float) -> dict:
+        """Convierte un resultado de búsqueda al diccionario de evidencia."""
+        page = metadata.get("page", "N/A")
+        document = metadata.get("document")
+        return {
+            "content": content,
+            "source": f"{document}, página {page}" if document else f"Página {page}",
+            "document": document or DEFAULT_DOCUMENT,
+            "relevance": f"{score:.4f}",
+        }
+
+    def _embed_query(self, query: str) -> list[float]:
+        """
+        Devuelve el embedding de ``query`` reutilizando la caché LRU.
+
+        :param query: Texto de la consulta.
+        :return: Vector de la consulta.
+        """
+        embedding = self._query_embedding_cache.get(query)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+            self._query_embedding_cache.put(query, embedding)
+        return embedding
+
+    def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """
+        Vectoriza consultas con el modelo del índice, en una sola petición.
+
+        Comparte la caché LRU de ``retrieve``: anclar después las mismas
+        consultas no vuelve a llamar a la API.
+
+        :param queries: Textos a vectorizar.
+        :return: Un vector por consulta, en el mismo orden.
+        """
+        return self._embed_queries(queries)
+
+    def _embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """
+        Vectoriza varias consultas con una sola petición, usando la caché LRU
+        para las que ya se conocen.
+        """
+        vectors = {q: self._query_embedding_cache.get(q) for q in dict.fromkeys(queries)}
+        pending = [q for q, v in vectors.items() if v is None]
+        if pending:
+            for query, vector in zip(pending, self.embeddings.embed_queries(pending)):
+                self._query_embedding_cache.put(query, vector)
+                vectors[query] = vector
+        return [vectors[q] for q in queries]
+
+    def _bump_index_version(self) -> None:
+        """Marca el índice como modificado e invalida las evidencias cacheadas."""
+        self._shared.version += 1
+        self._evidence_cache.clear()
+
+    @property
+    def tracker(self):
+        """``ReasoningTracker`` que recibe tiempos de carga, troceado, embeddings y búsqueda."""
+        return self._tracker
+
+    @tracker.setter
+    def tracker(self, tracker) -> None:
+        self._tracker = tracker
+        if self._embeddings is not None:
+            self._embeddings.tracker = tracker
+
+    def cache_stats(self) -> dict:
+        """
+        Estadísticas de la caché de recuperación.
+
+        :return: Diccionario con aciertos/fallos de cada nivel y la versión
+            actual del índice.
+        """
+        return {
+            "index_version": self.index_version,
+            "query_embeddings": self._query_embedding_cache.stats(),
+            "evidence": self._evidence_cache.stats(),
+        }
+
+
+_registry_lock = threading.Lock()
+_shared_engines: dict[str, RAGAEngine] = {}
+
+
+def _document_name(file_path: str) -> str:
+    """Nombre por defecto de un documento: el del fichero sin extensión."""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def shared_engine(persist_directory: str = "./chroma_db", **kwargs) -> RAGAEngine:
+    """
+    Devuelve el ``RAGAEngine`` compartido por todo el proceso para un índice.
+
+    Las sesiones que abren el mismo ``persist_directory`` comparten un único
+    cliente del almacén, la caché de recuperación y el cerrojo que coordina
+    consultas e ingestas. Con ``engine.session()`` cada sesión obtiene una
+    vista con su propio ``tracker`` y modo de recuperación.
+
+    :param persist_directory: Directorio del índice.
+    :param kwargs: Resto de parámetros de ``RAGAEngine``; solo se aplican la
+        primera vez que se crea el motor de ese directorio.
+    :return: Motor compartido.
+    """
+    key = os.path.abspath(persist_directory)
+    with _registry_lock:
+        engine = _shared_engines.get(key)
+        if engine is None:
+            engine = RAGAEngine(persist_directory=persist_directory, **kwargs)
+            _shared_engines[key] = engine
+        return engine
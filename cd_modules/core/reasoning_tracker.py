@@ -1,27 +1,244 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from cd_modules.core.audit_ledger import question_id
+
+# Precio estimado en USD por millón de tokens: (entrada, salida)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+_encodings = {}
+
+
+def _encoding(model):
+    """Codificación ``tiktoken`` del modelo, o ``False`` si no está disponible."""
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            import tiktoken
+
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            encoding = False
+        _encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text, model="gpt-4o"):
+    """
+    Cuenta tokens con ``tiktoken``. Si no hay codificación disponible
+    (p. ej. sin red para descargarla) se estima a razón de 4 caracteres
+    por token.
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is False:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, model="gpt-4o"):
+    """Recorta ``text`` a ``max_tokens`` tokens (misma estimación que ``count_tokens``)."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is False:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def _percentile(values, q):
+    """Percentil por rango más cercano (``q`` entre 0 y 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def trace(tracker, stage):
+    """``tracker.span(stage)`` si hay rastreador; si no, un contexto vacío."""
+    return tracker.span(stage) if tracker is not None else nullcontext()
+
+
 class ReasoningTracker:
     """
     Rastreador de razonamiento deliberativo: guarda los pasos y calcula la métrica EEE.
+
+    También acumula el perfil de coste y latencia de una auditoría: tiempo por
+    etapa (carga del PDF, troceado, embeddings, búsqueda vectorial, llamadas
+    al LLM, veredictos), latencias de cada llamada y tokens consumidos.
     """
 
-    def __init__(self):
+    def __init__(self, ledger=None, audit_id="reasoning"):
+        """
+        :param ledger: ``AuditLedger`` opcional. Si se indica, los pasos se
+            anexan al registro en disco en lugar de acumularse en ``steps``.
+        :param audit_id: Auditoría del registro a la que van los pasos.
+        """
         self.steps = []
+        self.ledger = ledger
+        self.audit_id = audit_id
+        # Último resultado (con o sin fuente) de cada cuestión, como ``latest``
+        # en el registro; los contadores evitan recorrerlo en ``compute_eee``
+        self._sourced_by_question = {}
+        self._question_count = 0
+        self._with_sources = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.llm_calls = []
 
     def add_step(self, question, sources, generated_answer):
+        if self.ledger is not None:
+            self.ledger.append(
+                self.audit_id,
+                question,
+                status="CON FUENTE" if sources else "SIN FUENTE",
+                explanation=generated_answer,
+                source="; ".join(map(str, sources or [])),
+                sources=len(sources or []),
+            )
+            return
         self.steps.append({
             "question": question,
             "sources": sources,
             "generated_answer": generated_answer
         })
+        # Una cuestión repetida sustituye su resultado anterior
+        qid = question_id(question)
+        previous = self._sourced_by_question.get(qid)
+        if previous is None:
+            self._question_count += 1
+        else:
+            self._with_sources -= previous
+        sourced = 1 if sources else 0
+        self._sourced_by_question[qid] = sourced
+        self._with_sources += sourced
 
     def get_steps(self):
+        if self.ledger is not None:
+            return [
+                {
+                    "question": step["question"],
+                    "sources": step["source"].split("; ") if step["source"] else [],
+                    "generated_answer": step["explanation"],
+                }
+                for step in self.ledger.iter_steps(self.audit_id, history=True)
+            ]
         return self.steps
 
     def compute_eee(self):
         """
-        Calcula la métrica Erotetic Equilibrium Evaluator (EEE).
-        Por ahora: % de respuestas que usan al menos una fuente.
+        Calcula la métrica Erotetic Equilibrium Evaluator (EEE): % de
+        cuestiones distintas cuyo último paso usa al menos una fuente.
+
+        Igual con registro que en memoria: las cuestiones repetidas o
+        re‑auditadas cuentan una sola vez, con su resultado más reciente.
         """
-        if not self.steps:
+        if self.ledger is not None:
+            stats = self.ledger.stats(self.audit_id)
+            total, with_sources = stats["questions"], stats["sourced"]
+        else:
+            total, with_sources = self._question_count, self._with_sources
+        if not total:
             return 0.0
-        count_with_sources = sum(1 for step in self.steps if step["sources"])
-        return round(100.0 * count_with_sources / len(self.steps), 2)
+        return round(100.0 * with_sources / total, 2)
+
+    @contextmanager
+    def span(self, stage):
+        """Mide el tiempo de pared de un bloque y lo acumula en ``stage``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+                entry["seconds"] += elapsed
+                entry["calls"] += 1
+
+    def record_llm(self, kind, model, prompt, completion, latency):
+        """
+        Registra una llamada al LLM.
+
+        :param kind: Tipo de llamada (``"subquestions"``, ``"verdict"``...).
+        :param model: Modelo usado; determina la tokenización y el precio.
+        :param prompt: Texto enviado.
+        :param completion: Texto recibido.
+        :param latency: Segundos que tardó la llamada.
+        """
+        tokens_in = count_tokens(prompt, model)
+        tokens_out = count_tokens(completion, model)
+        price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+        with self._lock:
+            self.llm_calls.append({
+                "kind": kind,
+                "model": model,
+                "latency": latency,
+                "tokens_in": tokens_in,
+                "tokens_out": tokens_out,
+                "cost": (tokens_in * price_in + tokens_out * price_out) / 1_000_000,
+            })
+
+    def record_embedding(self, model, texts, latency):
+        """Registra una petición de embeddings (solo cuentan tokens de entrada)."""
+        self.record_llm("embedding", model, "\n".join(texts), "", latency)
+
+    def profile(self):
+        """
+        Perfil de la auditoría: tiempo por etapa, latencias p50/p95 del LLM,
+        tokens de entrada/salida y coste estimado.
+        """
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+            calls = list(self.llm_calls)
+        chat = [c for c in calls if c["kind"] != "embedding"]
+        latencies = [c["latency"] for c in chat]
+        return {
+            "wall_seconds": round(time.perf_counter() - self._started, 3),
+            "stages": {
+                name: {"seconds": round(e["seconds"], 3), "calls": e["calls"]}
+                for name, e in sorted(stages.items())
+            },
+            "llm": {
+                "calls": len(chat),
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+                "tokens_in": sum(c["tokens_in"] for c in chat),
+                "tokens_out": sum(c["tokens_out"] for c in chat),
+            },
+            "embeddings": {
+                "calls": len(calls) - len(chat),
+                "tokens": sum(c["tokens_in"] for c in calls if c["kind"] == "embedding"),
+            },
+            "cost_usd": round(sum(c["cost"] for c in calls), 6),
+        }
+
+    def export_json(self, path=None):
+        """
+        Exporta el perfil como JSON.
+
+        :param path: Si se indica, se escribe el fichero además de devolverlo.
+        :return: Cadena JSON.
+        """
+        payload = json.dumps(self.profile(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(payload)
+        return payload
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from cd_modules.core.lexical_index import extract_references
+
+# Números sueltos ("plazo de 30 días", "Reglamento 2019/790", "apartado 5.2")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def _references(question: str) -> tuple[str, ...]:
+    """Artículos, anexos y números que cita ``question``."""
+    return tuple(sorted({*extract_references(question), *_NUMBER_RE.findall(question)}))
+
+
+class SemanticCache:
+    """
+    Caché de respuestas direccionada por el significado de la pregunta.
+
+    Guarda cada pregunta con su embedding y su respuesta en SQLite y
+    mantiene en memoria la matriz de embeddings normalizados de su
+    ``namespace``. Una pregunta nueva cuya similitud coseno con alguna ya
+    respondida alcance ``threshold`` recibe la respuesta guardada; una
+    pregunta idéntica (salvo mayúsculas y espacios) ni siquiera se
+    vectoriza.
+
+    Un acierto por similitud exige además que ambas preguntas citen los
+    mismos artículos, anexos y números: "¿Qué dice el Artículo 5?" y "¿Qué
+    dice el Artículo 6?" son casi idénticas para los embeddings, pero no
+    comparten respuesta.
+
+    Como ``DiskCache``, admite caducidad (``ttl``) y un tope de entradas
+    por ``namespace`` (``max_entries``); se desalojan las más antiguas.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embeddings,
+        threshold: float = 0.95,
+        namespace: str = "",
+        ttl: float | None = None,
+        max_entries: int | None = None,
+    ) -> None:
+        """
+        :param path: Ruta del fichero SQLite. Se crea si no existe.
+        :param embeddings: Objeto con ``embed_query`` (p. ej. ``OpenAIEmbeddings``).
+        :param threshold: Similitud coseno mínima para reutilizar una respuesta.
+        :param namespace: Separa respuestas que no son intercambiables
+            (otro modelo, otra plantilla de prompt…).
+        :param ttl: Segundos de vida de cada respuesta; ``None`` = sin caducidad.
+        :param max_entries: Tope de respuestas del ``namespace``; al
+            superarlo se desalojan las más antiguas. ``None`` = sin límite.
+        """
+        self.path = path
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " namespace TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_namespace ON answers (namespace)")
+        self._conn.commit()
+
+        rows = self._conn.execute(
+            "SELECT id, created, question, vector, answer FROM answers"
+            " WHERE namespace = ? ORDER BY id",
+            (namespace,),
+        ).fetchall()
+        # Filas en orden de inserción (de más antigua a más reciente): lo que
+        # se desaloja es siempre un prefijo
+        self._ids = [row[0] for row in rows]
+        self._created = [row[1] for row in rows]
+        self._questions = [row[2] for row in rows]
+        self._rows = [np.frombuffer(row[3], dtype=np.float32) for row in rows]
+        self._answers = [row[4] for row in rows]
+        self._references = [_references(q) for q in self._questions]
+        self._index_exact()
+        self._matrix = None  # se reconstruye al consultar si cambian las filas
+        with self._lock:
+            self._evict()
+
+    def _index_exact(self) -> None:
+        self._exact = {_normalize_question(q): i for i, q in enumerate(self._questions)}
+
+    def _evict(self) -> None:
+        """Desaloja las respuestas caducadas y las más antiguas por encima del tope."""
+        drop = 0
+        if self.ttl is not None:
+            min_created = time.time() - self.ttl
+            while drop < len(self._created) and self._created[drop] < min_created:
+                drop += 1
+        if self.max_entries is not None:
+            drop = max(drop, len(self._answers) - self.max_entries)
+        if drop <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM answers WHERE namespace = ? AND id <= ?",
+            (self.namespace, self._ids[drop - 1]),
+        )
+        self._conn.commit()
+        for column in (
+            self._ids, self._created, self._questions, self._rows, self._answers, self._references,
+        ):
+            del column[:drop]
+        self._index_exact()
+        self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def lookup(
+        self, question: str, threshold: float | None = None
+    ) -> tuple[str | None, list[float] | None]:
+        """
+        Busca una respuesta para ``question``.
+
+        :param threshold: Umbral para esta consulta; por defecto ``self.threshold``.
+        :return: ``(respuesta, None)`` si hay acierto; ``(None, embedding)``
+            si no, para pasárselo a ``store`` sin volver a vectorizar.
+        """
+        with self._lock:
+            self._evict()
+            exact = self._exact.get(_normalize_question(question))
+            if exact is not None:
+                self.hits += 1
+                return self._answers[exact], None
+
+        vector = self.embeddings.embed_query(question)
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            if self._rows:
+                if self._matrix is None or len(self._matrix) != len(self._rows):
+                    # Las filas solo crecen por el final; un desalojo anula la matriz
+                    self._matrix = np.vstack(self._rows)
+                similarities = self._matrix @ query
+                limit = self.threshold if threshold is None else threshold
+                candidates = np.flatnonzero(similarities >= limit)
+                if len(candidates):
+                    references = _references(question)
+                    # De mayor a menor similitud, la primera que cite lo mismo
+                    for i in candidates[np.argsort(-similarities[candidates])]:
+                        if self._references[i] == references:
+                            self.hits += 1
+                            return self._answers[i], None
+            self.misses += 1
+        return None, vector
+
+    def store(self, question: str, answer: str, vector: list[float] | None = None) -> None:
+        """
+        Guarda la respuesta de ``question``.
+
+        :param vector: Embedding devuelto por ``lookup``; si falta se calcula.
+        """
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        row = np.asarray(vector, dtype=np.float32)
+        row = row / (np.linalg.norm(row) or 1.0)
+        now = time.time()
+        with self._lock:
+            row_id = self._conn.execute(
+                "INSERT INTO answers (namespace, question, vector, answer, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, question, sqlite3.Binary(row.tobytes()), answer, now),
+            ).lastrowid
+            self._conn.commit()
+            self._exact[_normalize_question(question)] = len(self._answers)
+            self._ids.append(row_id)
+            self._created.append(now)
+            self._questions.append(question)
+            self._rows.append(row)
+            self._answers.append(answer)
+            self._references.append(_references(question))
+            self._evict()
+
+    def stats(self) -> dict:
+        """Aciertos, fallos y entradas de la caché."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self) -> None:
+        """Cierra la conexión con el fichero."""
+        with self._lock:
+            self._conn.close()
@@ -1,29 +1,112 @@
 from __future__ import annotations
 
+import json
 import os
-from typing import Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Tuple
+
+from cd_modules.core.disk_cache import DiskCache, hash_key
+from cd_modules.core.llm_scheduler import shared_scheduler
+from cd_modules.core.reasoning_tracker import (
+    ReasoningTracker,
+    count_tokens,
+    trace,
+    truncate_tokens,
+)
+
+# Instrucciones fijas del juez: prefijo estable, reutilizable por la caché
+# de prompts del proveedor; la afirmación y la evidencia van detrás.
+_VERDICT_SYSTEM = """Actúa como un juez jurídico que audita la coherencia de una afirmación con el texto legal provisto. Tu tarea es decidir si la afirmación está directamente respaldada por el fragmento de texto. Responde únicamente con VALIDADA si la afirmación coincide literalmente con lo que dice el texto, o NO VALIDADA si no hay correspondencia.
+
+Respuesta en una palabra (VALIDADA o NO VALIDADA)."""
+
+# Tokens de la respuesta: "NO VALIDADA" ocupa varios tokens
+_VERDICT_MAX_TOKENS = 5
+# Versión del formato de veredicto; forma parte de la clave de la caché para
+# descartar los veredictos guardados por versiones anteriores
+_VERDICT_VERSION = 2
+
+_client_lock = threading.Lock()
+_shared_clients: dict[str, "OpenAI"] = {}
+
+
+def _openai_class():
+    """Importa ``openai.OpenAI`` en el primer uso; ``None`` si no está instalado."""
+    try:
+        from openai import OpenAI
+    except Exception:
+        return None
+    return OpenAI
+
+
+def _pooled_client(api_key: str) -> "OpenAI":
+    """
+    Devuelve un cliente OpenAI compartido por API Key.
 
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None  # type: ignore
+    El cliente mantiene su propio pool de conexiones HTTP, así que
+    reutilizarlo evita el coste de abrir conexiones en cada veredicto.
+    """
+    with _client_lock:
+        client = _shared_clients.get(api_key)
+        if client is None:
+            # Sin reintentos propios: los gestiona el planificador
+            client = _openai_class()(api_key=api_key, max_retries=0)
+            _shared_clients[api_key] = client
+        return client
 
 
 class EroteticEvaluator:
     """Juez Algorítmico que audita la solidez de cada nodo del árbol."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        max_concurrency: int = 4,
+        cache_path: str | None = "./verdict_cache.sqlite",
+        tracker: ReasoningTracker | None = None,
+        client=None,
+        evidence_budget: int = 800,
+        scheduler=None,
+        priority: str = "interactive",
+    ) -> None:
         """
         Inicializa el evaluador. Carga la API Key de OpenAI de las
         variables de entorno si está disponible. Si no se encuentra una
         ``OPENAI_API_KEY``, el evaluador funcionará en modo degradado y
         considerará que toda afirmación con alguna evidencia es válida.
+
+        :param model: Modelo que actúa como juez.
+        :param max_concurrency: Veredictos simultáneos en ``audit_many``.
+        :param cache_path: Fichero SQLite donde se guardan los veredictos,
+            indexados por hash de (afirmación, evidencia, modelo). ``None``
+            desactiva la caché.
+        :param tracker: ``ReasoningTracker`` opcional donde se registran
+            latencia y tokens de cada veredicto.
+        :param client: Cliente compatible con ``OpenAI`` a usar en lugar del
+            compartido por API Key.
+        :param evidence_budget: Tokens máximos de evidencia por veredicto;
+            el resto del fragmento se recorta antes de enviarlo.
+        :param scheduler: ``LLMScheduler`` por el que pasan los veredictos;
+            por defecto el compartido del proceso.
+        :param priority: Clase de prioridad de los veredictos
+            (``"interactive"`` o ``"batch"``).
         """
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.evidence_budget = evidence_budget
         api_key = os.getenv("OPENAI_API_KEY")
-        if OpenAI and api_key:
-            self.client = OpenAI(api_key=api_key)
+        if client is not None:
+            self.client = client
+        elif api_key and _openai_class():
+            self.client = _pooled_client(api_key)
         else:
             self.client = None
+        self.cache = DiskCache(cache_path) if cache_path else None
+        self.tracker = tracker
+        self.scheduler = scheduler or shared_scheduler()
+        self.priority = priority
 
     def audit_claim(self, claim: str, evidence_text: str) -> Tuple[str, str]:
         """
@@ -31,7 +114,8 @@ class EroteticEvaluator:
 
         :param claim: La pregunta o afirmación generada por el motor de indagación.
         :param evidence_text: Texto recuperado por RAGA que supuestamente respalda la afirmación.
-        :return: Tuple con estado (``"VALIDADA"`` o ``"NO VALIDADA"``) y una breve justificación.
+        :return: Tuple con estado (``"VALIDADA"``, ``"NO VALIDADA"`` o, si el
+            modelo no llega a responder, ``"SIN AUDITAR"``) y una breve justificación.
         """
         # Si no hay evidencia, la respuesta no puede validarse
         if not evidence_text:
@@ -41,38 +125,94 @@ class EroteticEvaluator:
         if not self.client:
             return "VALIDADA", "Se encontró evidencia y no hay servicio de auditoría; se asume válida."
 
-        # Construimos un prompt para que el modelo actúe como juez
-        prompt = f"""
-        Actúa como un juez jurídico que audita la coherencia de una afirmación
-        con el texto legal provisto. Tu tarea es decidir si la afirmación está
-        directamente respaldada por el fragmento de texto. Responde únicamente
-        con VALIDADA si la afirmación coincide literalmente con lo que dice el texto,
-        o NO VALIDADA si no hay correspondencia.
-
-        AFIRMACIÓN A AUDITAR:
-        "{claim}"
+        if count_tokens(evidence_text, self.model) > self.evidence_budget:
+            evidence_text = truncate_tokens(evidence_text, self.evidence_budget, self.model)
 
-        EVIDENCIA DEL PDF:
-        "{evidence_text}"
+        # La clave usa la evidencia ya recortada: es la que ve el juez, así
+        # que cambiar ``evidence_budget`` no reutiliza veredictos de otra
+        key = hash_key(_VERDICT_VERSION, hash_key(_VERDICT_SYSTEM), self.model, claim, evidence_text)
+        if self.cache is not None:
+            stored = self.cache.get(key)
+            if stored is not None:
+                judgement, explanation = json.loads(stored)
+                return judgement, explanation
 
-        Respuesta en una palabra (VALIDADA o NO VALIDADA).
-        """
+        # Construimos un prompt para que el modelo actúe como juez
+        prompt = (
+            f'AFIRMACIÓN A AUDITAR:\n"{claim}"\n\n'
+            f'EVIDENCIA DEL PDF:\n"{evidence_text}"'
+        )
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=1,
-            )
-            judgement = response.choices[0].message.content.strip().upper()
+            start = time.perf_counter()
+            with trace(self.tracker, "verdict"):
+                response = self.scheduler.chat(
+                    self.client,
+                    priority=self.priority,
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": _VERDICT_SYSTEM},
+                        {"role": "user", "content": prompt},
+                    ],
+                    temperature=0,
+                    max_tokens=_VERDICT_MAX_TOKENS,
+                )
+            content = response.choices[0].message.content
+            if self.tracker is not None:
+                self.tracker.record_llm(
+                    "verdict",
+                    self.model,
+                    _VERDICT_SYSTEM + prompt,
+                    content,
+                    time.perf_counter() - start,
+                )
+            judgement = " ".join(content.strip().strip(".").upper().split())
             if judgement not in {"VALIDADA", "NO VALIDADA"}:
                 judgement = "NO VALIDADA"
             explanation = "La evaluación se ha realizado mediante modelo de lenguaje."
-            return judgement, explanation
-        except Exception:
-            # En caso de error con la API, degradamos a heurística simple
-            return "VALIDADA", "Se asumió válida por falta de respuesta del evaluador externo."
+        except Exception as e:
+            # Sin veredicto del modelo no se presume nada: la cuestión queda
+            # sin auditar (y fuera de la caché) para repetirla más tarde
+            print(f"⚠️ Veredicto no disponible: {e}")
+            return "SIN AUDITAR", f"El evaluador externo no respondió: {e}"
+
+        # Solo se persisten los veredictos emitidos por el modelo
+        if self.cache is not None:
+            self.cache.put(key, json.dumps([judgement, explanation]).encode("utf-8"))
+        return judgement, explanation
+
+    def audit_many(self, pairs: Iterable[Tuple[str, str]]) -> list[Tuple[str, str]]:
+        """
+        Audita muchos pares (afirmación, evidencia) reutilizando el cliente.
+
+        Los pares repetidos se evalúan una sola vez y los ya juzgados en
+        auditorías anteriores salen de la caché en disco; el resto se envía
+        en paralelo con un máximo de ``max_concurrency`` peticiones.
+
+        :param pairs: Pares ``(claim, evidence_text)``.
+        :return: Lista de tuplas (estado, explicación) en el mismo orden.
+        """
+        pairs = list(pairs)
+        unique = list(dict.fromkeys(pairs))
+        if len(unique) <= 1 or not self.client:
+            verdicts = {pair: self.audit_claim(*pair) for pair in unique}
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(unique))) as pool:
+                verdicts = dict(zip(unique, pool.map(lambda p: self.audit_claim(*p), unique)))
+        return [verdicts[pair] for pair in pairs]
+
+
+_default_evaluator: EroteticEvaluator | None = None
+_default_lock = threading.Lock()
+
+
+def _get_default_evaluator() -> EroteticEvaluator:
+    """Evaluador compartido por ``auditor`` (un solo cliente y una sola caché)."""
+    global _default_evaluator
+    with _default_lock:
+        if _default_evaluator is None:
+            _default_evaluator = EroteticEvaluator()
+        return _default_evaluator
 
 
 def auditor(claim: str, evidence_text: str) -> Tuple[str, str]:
@@ -81,7 +221,7 @@ def auditor(claim: str, evidence_text: str) -> Tuple[str, str]:
 
     Este helper existe para preservar la interfaz original utilizada en la
     aplicación Streamlit (``auditor`` como objeto llamable). Devuelve
-    tupla (estado, explicación).
+    tupla (estado, explicación). Reutiliza un evaluador compartido en lugar
+    de crear uno (y un cliente OpenAI) por cada afirmación.
     """
-    evaluator = EroteticEvaluator()
-    return evaluator.audit_claim(claim, evidence_text)
+    return _get_default_evaluator().audit_claim(claim, evidence_text)
@@ -2,26 +2,107 @@ import streamlit as st
 import os
 import shutil
 import json
-import pandas as pd
-import graphviz
+import io
 
 # --- IMPORTAMOS TUS MOTORES DEL SPRINT 1, 2 y 3 ---
-from cd_modules.core.raga_engine import RAGAEngine
+from cd_modules.core.raga_engine import RETRIEVAL_MODES, shared_engine
 from cd_modules.core.inquiry_engine import InquiryEngine
-from cd_modules.core.validador_epistemico import auditor  # Tu Juez Algorítmico
+from cd_modules.core.validador_epistemico import EroteticEvaluator  # Tu Juez Algorítmico
+from cd_modules.core.audit_stage import run_audit, tree_hash
+from cd_modules.core.audit_ledger import AuditLedger
+from cd_modules.core.llm_scheduler import LLMUnavailableError
+from cd_modules.core.reasoning_tracker import ReasoningTracker
 
 # Configuración de Página
 st.set_page_config(page_title="H-ANCHOR | Auditoría Jurídica", layout="wide")
 
+# Colores de los nodos según su estado de auditoría
+STATUS_COLORS = {
+    "VALIDADA": "#d4edda",     # Verde
+    "NO VALIDADA": "#f8d7da",  # Rojo
+    "SIN AUDITAR": "#fff3cd",  # Ámbar: el juez no respondió
+    "EN CURSO": "#e2e3e5",     # Gris: aún sin auditar
+}
+
+# Evidencia mínima para expandir una cuestión, por modo de recuperación.
+# En "vector" es la distancia máxima (2 − 2·coseno; 1.5 equivale a una
+# similitud de 0.25, por debajo de la cual el fragmento no trata del tema).
+# En "lexical" basta con que BM25 encuentre algún término (``None``). En
+# "hybrid" la puntuación RRF no es absoluta y la parte vectorial siempre
+# devuelve fragmentos, así que no se poda.
+PRUNE_CUTOFFS = {"vector": 1.5, "lexical": None}
+
+
+def draw_tree(tree_dict, status_by_question=None):
+    """Dibuja el árbol de indagación; los nodos sin estado salen «EN CURSO»."""
+    import graphviz  # Solo se carga cuando hay un árbol que dibujar
+
+    status_by_question = status_by_question or {}
+    graph = graphviz.Digraph()
+    graph.attr(rankdir='TB')
+    graph.attr('node', shape='box', style='filled', fontname="Arial")
+
+    edges = set()
+
+    def plot_nodes(branches, parent=None):
+        for question, children in branches.items():
+            node_id = str(hash(question)) # ID único
+            # Las cuestiones fusionadas cuelgan de varios padres: se dibujan una vez
+            if (parent, node_id) in edges:
+                continue
+            edges.add((parent, node_id))
+            status = status_by_question.get(question, "EN CURSO")
+            graph.node(node_id, f"{question}\n[{status}]", fillcolor=STATUS_COLORS[status])
+            if parent:
+                graph.edge(parent, node_id)
+            plot_nodes(children, node_id)
+
+    plot_nodes(tree_dict)
+    return graph
+
+
+def _ledger_export(audit_id, fmt):
+    """
+    Exporta una auditoría del registro (la de un árbol) a texto.
+
+    ``download_button`` guarda el contenido entero en cada ejecución, así
+    que se escribe en memoria: un fichero temporal quedaría abierto en
+    cada rerun.
+    """
+    export = io.StringIO(newline="")
+    if fmt == "csv":
+        st.session_state.ledger.export_csv(export, audit_id)
+    else:
+        st.session_state.ledger.export_jsonl(export, audit_id)
+    return export.getvalue()
+
+
+def _as_frame(records):
+    """Convierte filas del informe en ``DataFrame`` (pandas se importa aquí)."""
+    import pandas as pd
+
+    return pd.DataFrame(records)
+
+
 # --- GESTIÓN DE ESTADO (SESSION STATE) ---
 if "raga" not in st.session_state:
-    st.session_state.raga = RAGAEngine() # Inicializamos el motor RAGA una sola vez
+    # Un único índice por proceso; cada sesión tiene su vista (tracker y modo propios)
+    st.session_state.raga = shared_engine().session()
 
 if "audit_tree" not in st.session_state:
     st.session_state.audit_tree = {}
 
-if "audit_log" not in st.session_state:
-    st.session_state.audit_log = [] # Aquí guardaremos el historial para el informe
+if "audit_results" not in st.session_state:
+    st.session_state.audit_results = {} # Resultado de auditoría por hash de árbol
+
+if "audit_profiles" not in st.session_state:
+    st.session_state.audit_profiles = {} # Perfil de coste/latencia por hash de árbol
+
+if "evaluator" not in st.session_state:
+    st.session_state.evaluator = EroteticEvaluator() # Un solo juez (y cliente) por sesión
+
+if "ledger" not in st.session_state:
+    st.session_state.ledger = AuditLedger() # Registro de veredictos en disco (solo anexado)
 
 # --- SIDEBAR: INGESTA DE DATOS (LA VERDAD MATERIAL) ---
 with st.sidebar:
@@ -40,11 +121,81 @@ with st.sidebar:
         with open(temp_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
         
+        document_name = st.text_input(
+            "Nombre del documento",
+            os.path.splitext(uploaded_file.name)[0],
+            help="Volver a ingerir con el mismo nombre sustituye solo ese documento del corpus.",
+        )
+
         if st.button("📥 Ingestar y Vectorizar"):
-            with st.spinner("Troceando ley y creando índices vectoriales..."):
-                st.session_state.raga.ingest_document(temp_path)
-            st.success("Base de conocimientos actualizada.")
-            os.remove(temp_path) # Limpieza
+            ingest_tracker = ReasoningTracker()
+            st.session_state.raga.tracker = ingest_tracker
+            ingested = False
+            try:
+                with st.spinner("Troceando ley y creando índices vectoriales..."):
+                    progress = st.progress(0.0, text="Leyendo PDF...")
+                    for event in st.session_state.raga.ingest_document_stream(
+                        temp_path, document=document_name or None
+                    ):
+                        if event["stage"] == "error":
+                            st.error(event["message"])
+                            break
+                        total_pages = event["total_pages"] or 1
+                        progress.progress(
+                            event["pages_done"] / total_pages,
+                            text=f"{event['pages_done']}/{event['total_pages']} páginas · {event['chunks']} fragmentos",
+                        )
+                        ingested = event["stage"] == "done"
+            except Exception as e:
+                st.error(f"⚠️ No se pudo ingerir el documento: {e}")
+            finally:
+                st.session_state.raga.tracker = None
+                os.remove(temp_path) # Limpieza, también si la ingesta falla
+            if ingested:
+                st.session_state.ingest_profile = ingest_tracker.profile()
+                stats = st.session_state.raga.ingest_stats
+                st.success(
+                    f"Base de conocimientos actualizada: {stats.get('chunks', 0)} fragmentos "
+                    f"({stats.get('reused', 0)} reutilizados, {stats.get('embedded', 0)} vectorizados)."
+                )
+
+    corpus = st.session_state.raga.list_documents()
+    if corpus:
+        with st.expander(f"📚 Corpus ({len(corpus)} documentos)"):
+            for doc in corpus:
+                col_name, col_remove = st.columns([4, 1])
+                col_name.markdown(f"**{doc['name']}** · {doc.get('chunks', '?')} fragmentos")
+                if col_remove.button("🗑️", key=f"remove_{doc['name']}"):
+                    st.session_state.raga.remove_document(doc["name"])
+                    st.rerun()
+        names = [doc["name"] for doc in corpus]
+        selected = st.multiselect(
+            "Documentos a consultar",
+            names,
+            default=[n for n in (st.session_state.raga.documents or names) if n in names],
+        )
+        # Sin selección explícita (o con todos) se consulta el corpus entero
+        st.session_state.raga.documents = (
+            selected if selected and set(selected) != set(names) else None
+        )
+
+    st.session_state.raga.retrieval_mode = st.selectbox(
+        "Modo de recuperación",
+        RETRIEVAL_MODES,
+        index=RETRIEVAL_MODES.index(st.session_state.raga.retrieval_mode),
+        help="«lexical» resuelve citas como «Artículo 5» y términos exactos sin llamar a la API.",
+    )
+
+    with st.expander("⚡ Caché de recuperación"):
+        st.json(st.session_state.raga.cache_stats())
+
+    if "inquiry_stats" in st.session_state:
+        with st.expander("🔀 Expansión del último árbol"):
+            st.json(st.session_state.inquiry_stats)
+
+    if "ingest_profile" in st.session_state:
+        with st.expander("⏱️ Perfil de la última ingesta"):
+            st.json(st.session_state.ingest_profile)
 
 # --- PÁGINA PRINCIPAL ---
 st.title("🕵️ Auditoría Forense con RAGA")
@@ -59,91 +210,129 @@ with col1:
     depth = st.slider("Profundidad de Indagación", 1, 3, 1)
     
     if st.button("🚀 Iniciar Auditoría Deliberativa", type="primary"):
-        if not st.session_state.raga.vector_store:
+        if not st.session_state.raga.has_documents:
             st.error("⚠️ Primero debes subir e ingestar un PDF en la barra lateral.")
         else:
+            # Un rastreador por auditoría: tiempos, tokens y coste de cada etapa
+            tracker = ReasoningTracker()
+            st.session_state.tracker = tracker
+            st.session_state.raga.tracker = tracker
+
+            # 1. INICIALIZAR MOTOR CON RAGA CONECTADO (Sprint 2)
+            # En la interfaz el árbol es un DAG sin cuestiones repetidas y,
+            # salvo en modo "hybrid", sin ramas que el PDF no respalda
+            mode = st.session_state.raga.retrieval_mode
+            engine = InquiryEngine(
+                topic, max_depth=depth, max_width=2,
+                raga_engine=st.session_state.raga, tracker=tracker,
+                similarity_threshold=0.92,
+                prune_unsupported=mode in PRUNE_CUTOFFS,
+                relevance_cutoff=PRUNE_CUTOFFS.get(mode),
+            )
+
+            # 2. GENERAR ÁRBOL EN STREAMING: redibujamos con cada nodo nuevo
+            live_graph = st.empty()
+            live_table = st.empty()
+            tree = {}
+            nodes = {None: tree}
+            rows = []
             with st.spinner("El Motor de Indagación está consultando la Ley..."):
-                # 1. INICIALIZAR MOTOR CON RAGA CONECTADO (Sprint 2)
-                engine = InquiryEngine(topic, max_depth=depth, max_width=2, raga_engine=st.session_state.raga)
-                
-                # 2. GENERAR ÁRBOL
-                st.session_state.audit_tree = engine.generate()
-                st.session_state.audit_log = [] # Reiniciar log
-                st.rerun()
+                try:
+                    for event in engine.iter_generate():
+                        InquiryEngine.attach_event(nodes, event)
+                        rows.append({
+                            "Cuestión": event["question"],
+                            "Profundidad": event["depth"],
+                            "Derivada de": event["parent"] or "—",
+                        })
+                        live_graph.graphviz_chart(draw_tree(tree), use_container_width=True)
+                        live_table.dataframe(_as_frame(rows), use_container_width=True)
+                except LLMUnavailableError as e:
+                    # Un árbol a medias no se audita: se avisa y se puede relanzar
+                    st.error(f"⚠️ OpenAI no responde (límite de cuota o caída): {e}")
+                    st.stop()
+                except Exception as e:
+                    st.error(f"⚠️ No se pudo generar el árbol de indagación: {e}")
+                    st.stop()
+
+            engine.tree = tree
+            st.session_state.audit_tree = tree
+            st.session_state.inquiry_stats = engine.stats
+            st.rerun()
+
+# --- ETAPA DE AUDITORÍA (una sola vez por árbol) ---
+if st.session_state.audit_tree:
+    current_hash = tree_hash(st.session_state.audit_tree)
+    if current_hash not in st.session_state.audit_results:
+        tracker = st.session_state.get("tracker") or ReasoningTracker()
+        st.session_state.raga.tracker = tracker
+        st.session_state.evaluator.tracker = tracker
+        with st.spinner("El Juez Algorítmico está auditando cada cuestión..."):
+            st.session_state.audit_results[current_hash] = run_audit(
+                st.session_state.audit_tree,
+                st.session_state.raga,
+                st.session_state.evaluator,
+                ledger=st.session_state.ledger,
+            )
+        # Cerramos el perfil: lo que ocurra después ya no es de esta auditoría
+        st.session_state.audit_profiles[current_hash] = tracker.profile()
+        st.session_state.raga.tracker = None
+        st.session_state.evaluator.tracker = None
 
 # --- VISUALIZACIÓN Y AUDITORÍA ---
 if st.session_state.audit_tree:
-    
+    # Solo lectura: el resultado se calculó una vez en la etapa anterior
+    audit = st.session_state.audit_results[tree_hash(st.session_state.audit_tree)]
+    profile = st.session_state.audit_profiles.get(audit.tree_hash)
+
     st.markdown("---")
     col_graph, col_details = st.columns([2, 1.5])
     
     with col_graph:
         st.subheader("🗺️ Mapa de Razonamiento")
-        
-        # Construcción del Gráfico
-        graph = graphviz.Digraph()
-        graph.attr(rankdir='TB')
-        graph.attr('node', shape='box', style='filled', fontname="Arial")
-        
-        def plot_nodes(tree_dict, parent=None):
-            for question, children in tree_dict.items():
-                node_id = str(hash(question)) # ID único
-                
-                # AUDITORÍA EN TIEMPO REAL (Sprint 3)
-                # Recuperamos la evidencia para esta pregunta específica
-                evidence_list = st.session_state.raga.retrieve(question, k=1)
-                evidence_text = evidence_list[0]['content'] if evidence_list else ""
-                source_ref = evidence_list[0]['source'] if evidence_list else "Sin fuente"
-                
-                # El Juez audita: ¿La pregunta tiene sentido con esta evidencia?
-                # (Simplificación visual: si hay evidencia sólida, es verde)
-                if evidence_text:
-                    color = "#d4edda" # Verde
-                    status = "VALIDADA"
-                else:
-                    color = "#f8d7da" # Rojo
-                    status = "NO VALIDADA"
-                
-                # Guardamos en el log para el informe
-                st.session_state.audit_log.append({
-                    "Cuestión": question,
-                    "Estado": status,
-                    "Evidencia (Grounding)": source_ref
-                })
-
-                # Dibujamos nodo
-                label = f"{question}\n[{status}]"
-                graph.node(node_id, label, fillcolor=color)
-                
-                if parent:
-                    graph.edge(parent, node_id)
-                
-                plot_nodes(children, node_id)
-
-        plot_nodes(st.session_state.audit_tree)
+        graph = draw_tree(st.session_state.audit_tree, audit.status_by_question())
         st.graphviz_chart(graph, use_container_width=True)
 
     with col_details:
         st.subheader("📝 Reasoning Tracker (Informe)")
         
-        if st.session_state.audit_log:
-            df = pd.DataFrame(st.session_state.audit_log)
-            # Eliminar duplicados causados por la recursión visual
-            df = df.drop_duplicates(subset=["Cuestión"])
+        if audit.rows:
+            st.dataframe(_as_frame(audit.to_records()), use_container_width=True)
             
-            st.dataframe(df, use_container_width=True)
-            
-            # Cálculo EEE Real
-            total = len(df)
-            validas = len(df[df["Estado"] == "VALIDADA"])
-            eee_score = (validas / total) * 100 if total > 0 else 0
-            
-            st.metric("Índice EEE (Solidez)", f"{eee_score:.1f}%")
+            # Cálculo EEE Real: contadores del registro, sin recorrer las filas
+            st.metric("Índice EEE (Solidez)", f"{st.session_state.ledger.eee(audit.tree_hash):.1f}%")
+            if audit.unaudited:
+                st.warning(
+                    f"⚠️ {audit.unaudited} cuestiones quedaron sin auditar (OpenAI no respondió); "
+                    "no cuentan en el EEE."
+                )
+
+            # Perfil de coste y latencia de esta auditoría
+            if profile:
+                m_time, m_cost, m_p95 = st.columns(3)
+                m_time.metric("Tiempo total", f"{profile['wall_seconds']:.1f}s")
+                m_cost.metric("Coste estimado", f"${profile['cost_usd']:.4f}")
+                m_p95.metric("LLM p95", f"{profile['llm']['p95_ms']:.0f} ms")
+                with st.expander("⏱️ Perfil por etapa"):
+                    st.json(profile)
+                    st.download_button(
+                        "Descargar perfil (JSON)",
+                        json.dumps(profile, ensure_ascii=False, indent=2).encode("utf-8"),
+                        "perfil_auditoria.json",
+                        "application/json",
+                    )
             
             # EXPORTACIÓN
-            st.download_button(
+            col_csv, col_jsonl = st.columns(2)
+            col_csv.download_button(
                 "📄 Descargar Informe Forense (CSV)",
-                df.to_csv(index=False).encode('utf-8'),
+                _ledger_export(audit.tree_hash, "csv"),
                 "auditoria_h_anchor.csv",
                 "text/csv"
             )
+            col_jsonl.download_button(
+                "🧾 Descargar registro (JSONL)",
+                _ledger_export(audit.tree_hash, "jsonl"),
+                "auditoria_h_anchor.jsonl",
+                "application/json",
+            )
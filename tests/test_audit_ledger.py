@@ -0,0 +1,76 @@
+"""Pruebas del registro de auditoría de solo anexado."""
+
+import io
+import json
+import sqlite3
+
+import pytest
+
+from cd_modules.core.audit_ledger import AuditLedger, question_id
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = AuditLedger(str(tmp_path / "ledger.sqlite"))
+    yield ledger
+    ledger.close()
+
+
+def test_steps_cannot_be_updated_or_deleted(ledger):
+    ledger.append("a1", "¿Es patentable el software?", "VALIDADA", source="boe.pdf")
+    # Incluso desde otra conexión, fuera de la API del registro
+    conn = sqlite3.connect(ledger.path)
+    try:
+        with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+            conn.execute("UPDATE steps SET status = 'RECHAZADA'")
+        with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+            conn.execute("DELETE FROM steps")
+        assert conn.execute("SELECT status FROM steps").fetchall() == [("VALIDADA",)]
+    finally:
+        conn.close()
+
+
+def test_reaudit_replaces_latest_verdict_and_keeps_history(ledger):
+    ledger.append_many("a1", [
+        {"question": "¿Es patentable el software?", "status": "RECHAZADA"},
+        {"question": "¿Protege la marca un sonido?", "status": "VALIDADA", "source": "oepm.pdf"},
+    ])
+    # Misma cuestión con otras mayúsculas y espacios: es un nuevo veredicto, no otra cuestión
+    ledger.append("a1", "¿Es  patentable el SOFTWARE?", "VALIDADA", evidence="Art. 4")
+
+    stats = ledger.stats("a1")
+    assert stats == {"questions": 2, "validated": 2, "sourced": 2, "steps": 3, "eee": 100.0}
+
+    latest = list(ledger.iter_steps("a1"))
+    assert [s["status"] for s in latest] == ["VALIDADA", "VALIDADA"]
+    history = list(ledger.iter_steps("a1", history=True))
+    assert [s["status"] for s in history] == ["RECHAZADA", "VALIDADA", "VALIDADA"]
+    assert history[0]["question_id"] == history[2]["question_id"] == question_id(
+        "¿es patentable el software?"
+    )
+
+
+def test_audits_are_counted_separately(ledger):
+    ledger.append("a1", "¿Es patentable el software?", "VALIDADA")
+    ledger.append("a2", "¿Es patentable el software?", "RECHAZADA")
+    assert ledger.eee("a1") == 100.0
+    assert ledger.eee("a2") == 0.0
+    assert ledger.stats()["questions"] == 2
+
+
+def test_failed_batch_leaves_no_partial_rows(ledger):
+    with pytest.raises(KeyError):
+        ledger.append_many("a1", [
+            {"question": "¿Es patentable el software?", "status": "VALIDADA"},
+            {"question": "sin veredicto"},
+        ])
+    assert ledger.stats("a1")["steps"] == 0
+    assert list(ledger.iter_steps(history=True)) == []
+
+
+def test_export_jsonl_streams_latest_verdicts(ledger):
+    ledger.append("a1", "¿Es patentable el software?", "RECHAZADA")
+    ledger.append("a1", "¿Es patentable el software?", "VALIDADA")
+    out = io.StringIO()
+    assert ledger.export_jsonl(out, "a1") == 1
+    assert json.loads(out.getvalue())["status"] == "VALIDADA"
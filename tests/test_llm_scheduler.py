@@ -0,0 +1,152 @@
+"""Pruebas del planificador de llamadas a OpenAI contra el servidor simulado con cuota."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.fakes import FakeChatClient, FakeRateLimitError
+from cd_modules.core.llm_scheduler import LLMScheduler, LLMUnavailableError, TokenBucket
+
+REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "hola"}]}
+
+
+def test_token_bucket_delays_requests_beyond_capacity():
+    bucket = TokenBucket(per_minute=600, burst=1.0)  # 10/s, capacidad 10
+    now = time.monotonic()
+    assert bucket.delay(10, now) == 0.0
+    bucket.take(10, now)
+    assert bucket.delay(1, now) == pytest.approx(0.1, abs=0.01)
+
+
+def test_scheduler_keeps_a_rate_limited_server_from_rejecting_calls():
+    client = FakeChatClient(requests_per_second=50)
+    # Un margen por debajo de la cuota real, como se configura en producción
+    scheduler = LLMScheduler(
+        limits={"chat": (45 * 60, 10**9)}, max_concurrency=8, base_delay=0.01, burst=1.0
+    )
+
+    def call(i):
+        request = {**REQUEST, "messages": [{"role": "user", "content": f"pregunta {i}"}]}
+        return scheduler.chat(client, priority="batch", **request)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(call, range(70)))
+    elapsed = time.perf_counter() - start
+
+    assert len(results) == 70
+    assert client.rejected == 0
+    # 45 caben en la ráfaga; las 25 restantes esperan a que se rellene el cubo
+    assert elapsed >= 0.5
+    assert scheduler.stats()["throttled_s"] > 0
+
+
+def test_same_server_rejects_calls_without_scheduler():
+    client = FakeChatClient(requests_per_second=50)
+    rejected = 0
+    for _ in range(70):
+        try:
+            client.chat.completions.create(**REQUEST)
+        except FakeRateLimitError:
+            rejected += 1
+    assert rejected > 0
+
+
+def test_identical_calls_in_flight_are_coalesced():
+    scheduler = LLMScheduler(limits={})
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "respuesta"
+
+    futures = [scheduler.submit(slow, key="misma") for _ in range(5)]
+    release.set()
+
+    assert [f.result(5) for f in futures] == ["respuesta"] * 5
+    assert len(calls) == 1
+    assert scheduler.stats()["coalesced"] == 4
+
+
+def test_chat_coalesces_concurrent_identical_requests():
+    client = FakeChatClient(latency=0.2)
+    scheduler = LLMScheduler(limits={})
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(lambda _: scheduler.chat(client, **REQUEST), range(6)))
+    assert client.calls == 1
+
+
+def test_interactive_calls_jump_ahead_of_queued_batch_calls():
+    scheduler = LLMScheduler(limits={}, max_concurrency=1)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    first = scheduler.submit(blocker)
+    assert started.wait(5)
+    futures = [
+        scheduler.submit(lambda i=i: order.append(f"batch{i}"), priority="batch") for i in range(3)
+    ]
+    futures.append(scheduler.submit(lambda: order.append("interactive"), priority="interactive"))
+    release.set()
+    for future in [first, *futures]:
+        future.result(5)
+
+    assert order == ["interactive", "batch0", "batch1", "batch2"]
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        LLMScheduler(limits={}).submit(lambda: None, priority="urgente")
+
+
+def test_transient_errors_are_retried():
+    scheduler = LLMScheduler(limits={}, max_retries=3, base_delay=0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeRateLimitError("429")
+        return "ok"
+
+    assert scheduler.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert scheduler.stats()["retried"] == 2
+
+
+def test_exhausted_retries_raise_llm_unavailable_error():
+    scheduler = LLMScheduler(limits={}, max_retries=2, base_delay=0.01)
+    attempts = []
+
+    def always_429():
+        attempts.append(1)
+        raise FakeRateLimitError("429")
+
+    with pytest.raises(LLMUnavailableError) as excinfo:
+        scheduler.call(always_429)
+
+    assert len(attempts) == 3  # el intento original y dos reintentos
+    assert isinstance(excinfo.value.__cause__, FakeRateLimitError)
+    assert scheduler.stats()["failed"] == 1
+
+
+def test_non_transient_errors_propagate_without_retry():
+    scheduler = LLMScheduler(limits={}, max_retries=3, base_delay=0.01)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("petición mal formada")
+
+    with pytest.raises(ValueError):
+        scheduler.call(broken)
+    assert len(attempts) == 1
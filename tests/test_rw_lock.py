@@ -0,0 +1,88 @@
+"""Pruebas del cerrojo lectores/escritor que protege los índices publicados."""
+
+import threading
+import time
+
+from cd_modules.core.rw_lock import RWLock
+
+
+def _start(target) -> threading.Thread:
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_the_lock():
+    lock = RWLock()
+    # Solo se supera la barrera si los tres lectores están dentro a la vez
+    barrier = threading.Barrier(3, timeout=5)
+
+    def reader():
+        with lock.read():
+            barrier.wait()
+
+    threads = [_start(reader) for _ in range(3)]
+    for thread in threads:
+        thread.join(5)
+    assert not barrier.broken
+
+
+def test_writer_excludes_readers():
+    lock = RWLock()
+    inside_writer = threading.Event()
+    release = threading.Event()
+    events = []
+
+    def writer():
+        with lock.write():
+            inside_writer.set()
+            release.wait(5)
+            events.append("write done")
+
+    def reader():
+        with lock.read():
+            events.append("read")
+
+    _start(writer)
+    assert inside_writer.wait(5)
+    reader_thread = _start(reader)
+    time.sleep(0.05)
+    assert events == []  # El lector espera a que salga el escritor
+
+    release.set()
+    reader_thread.join(5)
+    assert events == ["write done", "read"]
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = RWLock()
+    first_reader_in = threading.Event()
+    release_first = threading.Event()
+    events = []
+
+    def first_reader():
+        with lock.read():
+            first_reader_in.set()
+            release_first.wait(5)
+        events.append("first read done")
+
+    def writer():
+        with lock.write():
+            events.append("write")
+
+    def late_reader():
+        with lock.read():
+            events.append("late read")
+
+    _start(first_reader)
+    assert first_reader_in.wait(5)
+    writer_thread = _start(writer)
+    time.sleep(0.05)  # El escritor ya espera al primer lector
+    late_thread = _start(late_reader)
+    time.sleep(0.05)
+    assert events == []  # El lector tardío no se cuela delante del escritor
+
+    release_first.set()
+    writer_thread.join(5)
+    late_thread.join(5)
+    assert events.index("write") < events.index("late read")